@@ -0,0 +1,207 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app import metrics
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control; maps to an HTTP status with a Retry-After header."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Global limit on concurrent agent runs with a bounded FIFO wait queue.
+
+    At most `max_concurrent` runs execute at once; up to `max_queue` more wait for a slot for at
+    most `queue_timeout` seconds. Anything beyond that is rejected right away (503 + Retry-After)
+    instead of slowing every request down, so latency stays bounded under overload.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32, queue_timeout: float = 30):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_count = 0  # admitted after queueing
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_avg = 1.0  # EWMA of seconds per run, for Retry-After estimates
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a retry has a fair chance: the time to drain the queue at current speed."""
+        drain = self.service_avg * (self.queue_depth / self.max_concurrent + 1)
+        return max(1, min(60, math.ceil(drain)))
+
+    def _gauges(self) -> None:
+        if metrics.METRICS_ENABLED:
+            metrics.ADMISSION_ACTIVE.set(self.active)
+            metrics.ADMISSION_QUEUE.set(self.queue_depth)
+
+    def _reject(self, reason: str) -> Overloaded:
+        if metrics.METRICS_ENABLED:
+            metrics.ADMISSION_REJECTED.inc(1, reason)
+        return Overloaded(503, self.retry_after(), f"server busy ({reason}), retry later")
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """Wait for a slot; returns the seconds spent queueing. Raises Overloaded when rejected.
+
+        `timeout` shortens the queue wait for one request (its deadline's queue budget)."""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            self._gauges()
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        self._gauges()
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)):
+                await future
+        except BaseException as exception:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed to us just as we gave up: pass it on
+            else:
+                future.cancel()
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            self._gauges()
+            if isinstance(exception, TimeoutError):
+                self.rejected_timeout += 1
+                raise self._reject("queue_timeout")
+            raise
+        waited = time.perf_counter() - start
+        self.admitted += 1
+        self.wait_count += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        if metrics.METRICS_ENABLED:
+            metrics.ADMISSION_WAIT.observe(waited)
+        self._gauges()
+        return waited
+
+    def release(self, started: Optional[float] = None) -> None:
+        """Give the slot back; `started` (perf_counter at admission) feeds the Retry-After estimate."""
+        if started is not None:
+            self.service_avg = 0.8 * self.service_avg + 0.2 * (time.perf_counter() - started)
+        # Hand the slot straight to the oldest waiter so nobody can overtake the queue
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._gauges()
+                return
+        self.active -= 1
+        self._gauges()
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[float]:
+        waited = await self.acquire(timeout)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.release(started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_queue_timeout": self.rejected_timeout,
+            "queue_wait_ms_avg": round(self.wait_total / self.wait_count * 1000, 1) if self.wait_count else 0.0,
+            "queue_wait_ms_max": round(self.wait_max * 1000, 1),
+            "service_ms_avg": round(self.service_avg * 1000, 1),
+        }
+
+
+class ClientRateLimiter:
+    """Per-client token buckets: `per_minute` requests with bursts of up to `burst`.
+
+    Clients are tracked LRU-first up to `max_clients`; a forgotten client simply starts again
+    with a full bucket.
+    """
+
+    def __init__(self, per_minute: float = 0, burst: int = 10, max_clients: int = 10_000):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # client -> (level, updated)
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, client: str) -> None:
+        """Take one request from the client's bucket or raise Overloaded (429)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        level, updated = self._buckets.pop(client, (float(self.burst), now))
+        level = min(self.burst, level + (now - updated) * self.rate)
+        if level < 1:
+            self._buckets[client] = (level, now)
+            self.rejected += 1
+            if metrics.METRICS_ENABLED:
+                metrics.ADMISSION_REJECTED.inc(1, "client_rate_limit")
+            raise Overloaded(429, max(1, math.ceil((1 - level) / self.rate)), "rate limit exceeded for this client")
+        self._buckets[client] = (level - 1, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "clients": len(self._buckets),
+            "rejected": self.rejected,
+        }
+
+
+def admission_from_env() -> AdmissionController:
+    """CHAT_MAX_CONCURRENCY runs, CHAT_MAX_QUEUE waiting, CHAT_QUEUE_TIMEOUT seconds in the queue."""
+    return AdmissionController(
+        max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENCY", "8")),
+        max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "30")),
+    )
+
+
+def rate_limiter_from_env() -> ClientRateLimiter:
+    """CHAT_RATE_LIMIT requests/minute per client (0 = off), CHAT_RATE_BURST."""
+    return ClientRateLimiter(
+        per_minute=float(os.getenv("CHAT_RATE_LIMIT", "0")),
+        burst=int(os.getenv("CHAT_RATE_BURST", "10")),
+    )
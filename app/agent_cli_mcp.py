@@ -1,8 +1,9 @@
 import os
 import sys
+import shlex
 import asyncio
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 from dotenv import load_dotenv
 from agents import Agent, FileSearchTool, Runner
@@ -10,6 +11,13 @@ from agents.model_settings import ModelSettings
 from agents.mcp import MCPServerStreamableHttp
 from agents.mcp import MCPServerStdio
 
+from app.mcp_cache import CachingMCPServer, FilesystemPolicy, SqlitePolicy
+from app.mcp_pool import MCPServerPool
+from app.fs_index import get_fs_index, make_fs_tools
+from app.mcp_startup import ManagedMCPServer, start_all
+from app.sqlite_native import NativeSQLiteServer, native_sqlite_from_env
+from app.telemetry import TELEMETRY, TELEMETRY_DB_PATH, TELEMETRY_INSTRUCTIONS, TelemetryReader, make_telemetry_tools
+
 load_dotenv()
 
 MODEL = os.getenv("OPENAI_MODEL")  # e.g., "gpt-4.1"
@@ -41,97 +49,292 @@ else:
     samples_dir.mkdir(exist_ok=True)
     FS_ROOTS = [str(samples_dir)]  # default demo root
 
+# Vector store holding the project concept PDF (see rag/create_vector_store.py)
+VECTOR_STORE_ID = os.getenv("OPENAI_VECTOR_STORE_ID", "vs_69160490a5b08191a4ecd657e91a65ec")
+
+# "hosted" = OpenAI FileSearchTool (vector store above), "local" = in-process index over rag/ (app/local_rag.py)
+RAG_MODE = os.getenv("RAG_MODE", "hosted").strip().lower()
+
 SQLITE_DB_PATH = Path(os.getenv("SQLITE_DB_PATH", "data/demo.db"))
 SQLITE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)  # ensure parent dir exists
 
+# FS_INDEX=1: in-process full-text index over FS_ROOTS with search_file_contents / read_file_lines tools (app/fs_index.py)
+FS_INDEX = os.getenv("FS_INDEX", "1").strip().lower() not in ("0", "false", "off", "no")
+FS_INDEX_INSTRUCTIONS = (
+    "- To find something inside files, call search_file_contents first and read_file_lines for the "
+    "matching line ranges instead of listing folders and reading whole files.\n"
+)
+
+# "mcp" = mcp-server-sqlite-npx over stdio, "native" = in-process tools with a read-only connection pool (app/sqlite_native.py)
+SQLITE_MODE = os.getenv("SQLITE_MODE", "mcp").strip().lower()
+
+# Stdio MCP servers run as a pool of N subprocesses so concurrent requests don't share one pipe.
+# MCP_POOL_SIZE applies to both; MCP_FS_POOL_SIZE / MCP_SQLITE_POOL_SIZE override per server.
+MCP_POOL_STRATEGY = os.getenv("MCP_POOL_STRATEGY", "least_busy")  # or "round_robin"
+MCP_POOL_MAX_INFLIGHT = int(os.getenv("MCP_POOL_MAX_INFLIGHT", "4"))  # concurrent calls per session
+# Per-request timeout of filesystem/SQLite MCP sessions (initialize included, which is slow when
+# many stdio processes start at once, e.g. several workers on a small machine)
+MCP_CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "30"))
+
+# Results of read-only filesystem/SQLite tools are cached (LRU of MCP_CACHE_SIZE entries) and
+# revalidated against file mtimes / the database change counter; MCP_CACHE=0 turns it off.
+MCP_CACHE = os.getenv("MCP_CACHE", "1").strip().lower() not in ("0", "false", "off", "no")
+MCP_CACHE_SIZE = int(os.getenv("MCP_CACHE_SIZE", "256"))
+MCP_CACHE_TREE_TTL = float(os.getenv("MCP_CACHE_TREE_TTL", "5"))  # seconds, directory_tree / search_files
+
+# Endpoints/commands of the MCP servers; overridable so benchmarks can point the app at local fakes
+SPORT_MCP_URL = os.getenv("SPORT_MCP_URL", "http://localhost:8000/mcp")
+
+# With several uvicorn workers, MCP_GATEWAY_URL (e.g. http://127.0.0.1:8100) points every worker at
+# one shared gateway process (mcp_server/gateway.py) that hosts the filesystem/SQLite servers,
+# instead of each worker spawning its own stdio subprocesses.
+MCP_GATEWAY_URL = os.getenv("MCP_GATEWAY_URL", "").strip().rstrip("/")
+GATEWAY_SERVERS = ("filesystem", "sqlite")
+
+def _stdio_params(env_var: str, default_args: List[str]) -> Dict[str, Any]:
+    """npx + default_args, or the full command line given in env_var (e.g. MCP_FS_COMMAND)."""
+    raw = os.getenv(env_var, "").strip()
+    if raw:
+        command, *args = shlex.split(raw)
+        return {"command": command, "args": args}
+    return {"command": "npx", "args": default_args}
+
+def _pool_size(var: str) -> int:
+    return int(os.getenv(var) or os.getenv("MCP_POOL_SIZE") or "1")
+
+# Startup: all servers connect concurrently, each with its own deadline (seconds).
+# MCP_STARTUP_TIMEOUT sets the default, MCP_STARTUP_TIMEOUT_<NAME> overrides it per server.
+# MCP_LAZY=all (or e.g. "filesystem,sqlite") connects those servers on first tool use instead.
+DEFAULT_STARTUP_TIMEOUTS = {"sport_recommender": 10, "filesystem": 60, "sqlite": 60}
+_raw_lazy = os.getenv("MCP_LAZY", "").strip().lower()
+MCP_LAZY = {n.strip() for n in _raw_lazy.replace(";", ",").split(",") if n.strip()}
+
+def _startup_timeout(name: str) -> float:
+    value = os.getenv(f"MCP_STARTUP_TIMEOUT_{name.upper()}") or os.getenv("MCP_STARTUP_TIMEOUT")
+    return float(value) if value else DEFAULT_STARTUP_TIMEOUTS.get(name, 30)
+
+def _is_lazy(name: str) -> bool:
+    return bool(MCP_LAZY & {"1", "true", "all", name})
+
 # Keep a reference so we can disconnect on exit
-sport_server: Optional[MCPServerStreamableHttp] = None
-filesystem_server: Optional[MCPServerStdio] = None
-sqlite_server: Optional[MCPServerStdio] = None
+sport_server: Optional[ManagedMCPServer] = None
+filesystem_server: Optional[ManagedMCPServer] = None
+sqlite_server: Optional[ManagedMCPServer] = None
+# Every server we tried to start (including failed ones), for readiness reporting
+MCP_SERVERS: Dict[str, ManagedMCPServer] = {}
+_startup_task: Optional[asyncio.Task] = None
+_fs_index_task: Optional[asyncio.Task] = None
 
-async def build_agent():
-    global sport_server, filesystem_server, sqlite_server
+# Tool name -> MCP server name, filled while connecting (used to label tool events)
+TOOL_SERVERS: Dict[str, str] = {}
 
-    if not os.getenv("OPENAI_API_KEY"):
-        print("Missing OPENAI_API_KEY in environment/.env", file=sys.stderr)
-        raise SystemExit(1)
+def _register_tools(server_name: str, tools: list) -> None:
+    TOOL_SERVERS.update({t.name: server_name for t in tools})
 
-    # --- Sport Recommender MCP via Streamable HTTP ---
-    try:
-        sport_server = MCPServerStreamableHttp(
-            name="sport_recommender",
-            params={
-                "url": "http://localhost:8000/mcp",
-                "timeout": 10,
-            },
-            cache_tools_list=True,
-            max_retry_attempts=10,
-        )
-        await sport_server.connect()
-        print("[mcp] sport recommender server connected successfully")
-        sport_tools = await sport_server.list_tools()
-        print("[mcp] sport recommender tools:", ", ".join(getattr(t, "name", str(t)) for t in sport_tools[:8]) or "(none)")
-    except Exception as e:
-        print(f"Error connecting to sport recommender server: {e}", file=sys.stderr)
-        sport_server = None
+def make_sport_server() -> MCPServerStreamableHttp:
+    """Sport Recommender MCP via Streamable HTTP."""
+    return MCPServerStreamableHttp(
+        name="sport_recommender",
+        params={
+            "url": SPORT_MCP_URL,
+            "timeout": 10,
+        },
+        cache_tools_list=True,
+        max_retry_attempts=10,
+    )
 
-    # --- Filesystem MCP via stdio (Node package, runs with npx) ---
+def make_filesystem_server() -> MCPServerPool:
+    """Filesystem MCP via stdio (Node package, runs with npx)."""
     fs_args: List[str] = ["-y", "@modelcontextprotocol/server-filesystem", *FS_ROOTS]
-    try:
-        filesystem_server = MCPServerStdio(
+    return MCPServerPool(
+        name="filesystem",
+        factory=lambda: MCPServerStdio(
             name="filesystem",
-            params={
-                "command": "npx",
-                "args": fs_args
-            },
-        )
-        await filesystem_server.connect()
-        print("[mcp] filesystem server connected successfully")
-        fs_tools = await filesystem_server.list_tools()
-        print("[mcp] filesystem tools:", ", ".join(getattr(t, "name", str(t)) for t in fs_tools[:8]) or "(none)")
-    except Exception as e:
-        print(f"Error connecting to filesystem server: {e}", file=sys.stderr)
-        filesystem_server = None
+            params=_stdio_params("MCP_FS_COMMAND", fs_args),
+            client_session_timeout_seconds=MCP_CALL_TIMEOUT,
+        ),
+        size=_pool_size("MCP_FS_POOL_SIZE"),
+        max_inflight=MCP_POOL_MAX_INFLIGHT,
+        strategy=MCP_POOL_STRATEGY,
+    )
 
-    # --- SQLite MCP via stdio ---
+def make_sqlite_server():
+    """SQLite MCP via stdio, or the same tools in-process with SQLITE_MODE=native."""
+    if SQLITE_MODE == "native":
+        return native_sqlite_from_env(SQLITE_DB_PATH)
+    return MCPServerPool(
+        name="sqlite",
+        factory=lambda: MCPServerStdio(
+            name="sqlite",
+            params=_stdio_params("MCP_SQLITE_COMMAND", ["-y", "mcp-server-sqlite-npx", str(SQLITE_DB_PATH)]),
+            client_session_timeout_seconds=MCP_CALL_TIMEOUT,
+        ),
+        size=_pool_size("MCP_SQLITE_POOL_SIZE"),
+        max_inflight=MCP_POOL_MAX_INFLIGHT,
+        strategy=MCP_POOL_STRATEGY,
+    )
+
+def make_gateway_server(name: str) -> MCPServerStreamableHttp:
+    """Connection to a server hosted by the shared MCP gateway (streamable HTTP at /<name>/mcp)."""
+    return MCPServerStreamableHttp(
+        name=name,
+        params={
+            "url": f"{MCP_GATEWAY_URL}/{name}/mcp",
+            "timeout": 10,
+        },
+        cache_tools_list=True,
+        client_session_timeout_seconds=MCP_CALL_TIMEOUT,
+        max_retry_attempts=3,
+    )
+
+def _cached(server, policy):
+    return CachingMCPServer(server, policy, max_entries=MCP_CACHE_SIZE) if MCP_CACHE else server
+
+def _managed(server) -> ManagedMCPServer:
+    return ManagedMCPServer(
+        server,
+        startup_timeout=_startup_timeout(server.name),
+        lazy=_is_lazy(server.name),
+        on_tools=_register_tools,
+    )
+
+def make_stdio_servers() -> Dict[str, ManagedMCPServer]:
+    """Filesystem + SQLite as local stdio pools behind the result cache (also what the gateway hosts)."""
+    servers = {"filesystem": _managed(_cached(make_filesystem_server(), FilesystemPolicy(MCP_CACHE_TREE_TTL)))}
     if not SQLITE_DB_PATH:
         print("Warning: SQLITE_DB_PATH is empty; skipping SQLite MCP.", file=sys.stderr)
     else:
-        try:
-            sqlite_server = MCPServerStdio(
-                name="sqlite",
-                params={
-                    "command": "npx",
-                    "args": ["-y", "mcp-server-sqlite-npx", str(SQLITE_DB_PATH)],
-                },
-            )
-            await sqlite_server.connect()
-            print("[mcp] SQLite server connected successfully")
-            sql_tools = await sqlite_server.list_tools()
-            print("[mcp] SQLite tools:", ", ".join(getattr(t, "name", str(t)) for t in sql_tools[:8]) or "(none)")
-        except Exception as e:
-            print(f"Error connecting to SQLite server: {e}", file=sys.stderr)
-            sqlite_server = None
+        servers["sqlite"] = _managed(_cached(make_sqlite_server(), SqlitePolicy(SQLITE_DB_PATH)))
+    return servers
+
+def make_rag_tool():
+    """Retrieval tool for the project concept documents (hosted or local, see RAG_MODE)."""
+    if RAG_MODE == "local":
+        from app.local_rag import get_index, make_search_tool
+        get_index()  # load (or build) the index now instead of on the first question
+        return make_search_tool(max_num_results=3)
+    return FileSearchTool(
+        max_num_results=3,
+        vector_store_ids=[VECTOR_STORE_ID],
+    )
 
-    # Build the agent with both servers (sqlite may be None if skipped)
-    mcp_servers = ([sport_server] if sport_server else []) + ([filesystem_server] if filesystem_server else []) + ([sqlite_server] if sqlite_server else [])
+def rag_stats() -> Optional[Dict[str, Any]]:
+    """Build time, index size and query latency of the local RAG index (None in hosted mode)."""
+    if RAG_MODE != "local":
+        return None
+    from app.local_rag import local_rag_stats
+    return local_rag_stats()
+
+async def build_agent(wait: bool = True):
+    """Connect the MCP servers and build the agent.
+
+    With wait=False the agent is returned right away and the servers keep connecting in the
+    background; their tools show up in the agent as soon as each server is ready.
+    """
+    global sport_server, filesystem_server, sqlite_server, _startup_task, _fs_index_task
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Missing OPENAI_API_KEY in environment/.env", file=sys.stderr)
+        raise SystemExit(1)
+
+    if FS_INDEX and _fs_index_task is None:
+        # Initial indexing runs in a worker thread; searches made before it finishes wait for it
+        _fs_index_task = asyncio.create_task(asyncio.to_thread(get_fs_index(FS_ROOTS).refresh))
+
+    MCP_SERVERS.clear()
+    MCP_SERVERS["sport_recommender"] = _managed(make_sport_server())
+    if MCP_GATEWAY_URL:
+        # Pooling and result caching happen once, inside the gateway, for all workers
+        MCP_SERVERS.update({name: _managed(make_gateway_server(name)) for name in GATEWAY_SERVERS})
+    else:
+        MCP_SERVERS.update(make_stdio_servers())
+
+    async def _start_and_list() -> Dict[str, ManagedMCPServer]:
+        # Connect everything concurrently: cold start takes as long as the slowest server, not the sum
+        started = await start_all(MCP_SERVERS)
+
+        async def _print_tools(server: ManagedMCPServer) -> None:
+            try:
+                tools = await server.list_tools()
+                print(f"[mcp] {server.name} tools:", ", ".join(getattr(t, "name", str(t)) for t in tools[:8]) or "(none)")
+            except Exception as e:
+                print(f"Error listing {server.name} tools: {e}", file=sys.stderr)
+
+        await asyncio.gather(*(_print_tools(s) for s in started.values() if s.ready))
+        return started
+
+    if wait:
+        started = await _start_and_list()
+    else:
+        _startup_task = asyncio.create_task(_start_and_list())
+        started = dict(MCP_SERVERS)
+    sport_server = started.get("sport_recommender")
+    filesystem_server = started.get("filesystem")
+    sqlite_server = started.get("sqlite")
+
+    # Build the agent with the servers that came up (or will connect lazily)
+    return make_agent([s for s in (sport_server, filesystem_server, sqlite_server) if s is not None])
+
+def make_agent(mcp_servers: List[ManagedMCPServer]) -> Agent:
+    """The agent over the given MCP servers; the supervisor rebuilds it when servers go down or come back."""
+    tools = [make_rag_tool()]
+    if FS_INDEX:
+        tools += make_fs_tools(get_fs_index(FS_ROOTS))
+    if TELEMETRY:
+        tools += make_telemetry_tools(TelemetryReader(TELEMETRY_DB_PATH))
     agent_kwargs = {
         "name": "Dev Copilot",
-        "instructions": INSTRUCTIONS,
+        "instructions": INSTRUCTIONS + (FS_INDEX_INSTRUCTIONS if FS_INDEX else "") + (TELEMETRY_INSTRUCTIONS if TELEMETRY else ""),
         "model_settings": MODEL_SETTINGS,
         "mcp_servers": mcp_servers,
-        "tools": [
-            FileSearchTool(
-                max_num_results=3,
-                vector_store_ids=["vs_69160490a5b08191a4ecd657e91a65ec"],
-            )
-        ],
+        "tools": tools,
     }
     if MODEL:
         agent_kwargs["model"] = MODEL
 
     return Agent(**agent_kwargs)
 
+def mcp_server_status() -> Dict[str, Any]:
+    """Readiness of every MCP server (ready / lazy / starting / failed / timeout)."""
+    return {name: server.status() for name, server in MCP_SERVERS.items()}
+
+def _unwrap(server):
+    return server.inner if isinstance(server, CachingMCPServer) else server
+
+def mcp_pool_stats() -> Dict[str, Any]:
+    """Pool size, in-flight calls and queue-wait metrics of the stdio MCP server pools."""
+    return {
+        name: _unwrap(server.inner).stats()
+        for name, server in MCP_SERVERS.items()
+        if isinstance(_unwrap(server.inner), MCPServerPool)
+    }
+
+def native_sqlite_stats() -> Optional[Dict[str, Any]]:
+    """Reader pool, query counts, timeouts and truncated pages of the in-process SQLite tools."""
+    server = MCP_SERVERS.get("sqlite")
+    inner = _unwrap(server.inner) if server is not None else None
+    return inner.stats() if isinstance(inner, NativeSQLiteServer) else None
+
+def mcp_cache_stats() -> Dict[str, Any]:
+    """Entries, hits/misses/stale lookups and hit ratio of the MCP tool result caches."""
+    return {
+        name: server.inner.stats()
+        for name, server in MCP_SERVERS.items()
+        if isinstance(server.inner, CachingMCPServer)
+    }
+
+async def cleanup_servers():
+    """Disconnect every MCP server started by build_agent()."""
+    if _startup_task is not None and not _startup_task.done():
+        _startup_task.cancel()
+        await asyncio.gather(_startup_task, return_exceptions=True)
+    for server in MCP_SERVERS.values():
+        try:
+            await asyncio.wait_for(server.cleanup(), timeout=5)
+        except Exception as e:
+            print(f"Error during cleanup: {e}", file=sys.stderr)
+    print("[mcp] disconnected")
+
 async def main():
     agent = None
     try:
@@ -143,7 +346,7 @@ async def main():
         print("=== Agent SDK + MCP (FS + SQLite) ===")
         print("Persona:", agent.name)
         print("Tools: filesystem via MCP (root:", FS_ROOTS, ")")
-        print("Tools: SQLite via MCP (db file path:", SQLITE_DB_PATH, ")")
+        print("Tools: SQLite via", "in-process tools" if SQLITE_MODE == "native" else "MCP", "(db file path:", SQLITE_DB_PATH, ")")
         print("Commands: /quit, /exit")
         print()
 
@@ -170,13 +373,7 @@ async def main():
         print(f"Fatal error: {e}", file=sys.stderr)
     finally:
         if agent:
-            for server in (sport_server, sqlite_server, filesystem_server):
-                if server is not None:
-                    try:
-                        await asyncio.wait_for(server.cleanup(), timeout=5)
-                    except Exception as e:
-                        print(f"Error during cleanup: {e}", file=sys.stderr)
-            print("[mcp] disconnected")
+            await cleanup_servers()
 
 if __name__ == "__main__":
     try:
@@ -1,8 +1,15 @@
+import argparse
 import json
+import math
 import os
+import struct
 import sys
+import threading
 import time
-from typing import Optional
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
 
 try:
     # optional: load .env if available
@@ -16,6 +23,17 @@ except ImportError:
     print("Missing dependency: requests. Install with `uv add requests` (or `pip install requests`).")
     sys.exit(1)
 
+# One keep-alive connection pool for all requests (interactive and batch)
+HTTP = requests.Session()
+
+def make_http(pool_size: int) -> requests.Session:
+    """Session whose connection pool holds `pool_size` keep-alive connections."""
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
@@ -35,7 +53,7 @@ def check_health(base_url: str, timeout: float = 5.0) -> None:
         health_url = base_url.rstrip("/") + "/health"
 
     try:
-        r = requests.get(health_url, timeout=timeout)
+        r = HTTP.get(health_url, timeout=timeout)
         if r.ok:
             eprint(f"[health] {r.json()}")
         else:
@@ -43,29 +61,319 @@ def check_health(base_url: str, timeout: float = 5.0) -> None:
     except Exception as ex:
         eprint(f"[health] Could not reach server at {health_url}: {ex}")
 
-def post_chat(server_url: str, message: str, timeout: float = 30.0) -> Optional[str]:
+def chat_payload(message: str, session_id: Optional[str] = None) -> bytes:
+    payload = {"message": message}
+    if session_id:
+        payload["session_id"] = session_id
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+def deadline_headers(timeout: float) -> Dict[str, str]:
+    """Tell the server how long we wait: it answers 504 a little before that and stops the agent run."""
+    return {"X-Request-Timeout": f"{max(1.0, timeout - min(2.0, timeout * 0.1)):g}"}
+
+def new_session_id() -> Optional[str]:
+    # CHAT_SESSION=off sends stateless requests (no server-side history)
+    if os.getenv("CHAT_SESSION", "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    return uuid.uuid4().hex
+
+def send_chat(
+    server_url: str,
+    message: str,
+    timeout: float = 30.0,
+    session_id: Optional[str] = None,
+    http: Optional[requests.Session] = None,
+) -> Dict[str, Any]:
+    """POST one message; returns {"ok", "status", "reply" | "error", "latency_ms", ...}."""
+    result: Dict[str, Any] = {"ok": False, "status": None}
+    start = time.perf_counter()
     try:
-        r = requests.post(
+        r = (http or HTTP).post(
             server_url,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps({"message": message}, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json", **deadline_headers(timeout)},
+            data=chat_payload(message, session_id),
             timeout=timeout,
         )
+        result["status"] = r.status_code
         if r.ok:
-            # Expected shape: {"reply": "..."}
+            # Expected shape: {"reply": "...", "usage": {...}}
+            result["ok"] = True
             try:
                 data = r.json()
-                return str(data.get("reply", "")).strip()
+                result["reply"] = str(data.get("reply", "")).strip()
+                if data.get("usage"):
+                    result["usage"] = data["usage"]
             except json.JSONDecodeError:
-                return r.text.strip()
+                result["reply"] = r.text.strip()
+            if "X-Cache" in r.headers:
+                result["cache"] = r.headers["X-Cache"]
         else:
-            return f"[error] HTTP {r.status_code}: {r.text.strip()}"
+            result["error"] = f"HTTP {r.status_code}: {r.text.strip()}"
+    except requests.exceptions.Timeout:
+        result["error"] = "Request timed out."
+    except requests.exceptions.ConnectionError as ce:
+        result["error"] = f"Connection error: {ce}"
+    except Exception as ex:
+        result["error"] = str(ex)
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def post_chat(server_url: str, message: str, timeout: float = 30.0, session_id: Optional[str] = None) -> Optional[str]:
+    result = send_chat(server_url, message, timeout=timeout, session_id=session_id)
+    if result["ok"]:
+        return result["reply"]
+    return f"[error] {result['error']}"
+
+def get_stream_default() -> bool:
+    return os.getenv("CHAT_STREAM", "").strip().lower() in ("1", "true", "yes", "on")
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data_lines = "message", []
+    for raw in response.iter_lines(decode_unicode=True):
+        if raw is None:
+            continue
+        if raw == "":
+            if data_lines:
+                yield event, "\n".join(data_lines)
+            event, data_lines = "message", []
+        elif raw.startswith("event:"):
+            event = raw[6:].strip()
+        elif raw.startswith("data:"):
+            data_lines.append(raw[5:].lstrip())
+    if data_lines:
+        yield event, "\n".join(data_lines)
+
+def stream_chat(server_url: str, message: str, timeout: float = 30.0, session_id: Optional[str] = None) -> Optional[str]:
+    """POST to <server_url>/stream and print reply tokens as they arrive. Returns the full reply."""
+    stream_url = server_url.rstrip("/") + "/stream"
+    return _post_stream(
+        stream_url,
+        headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+        data=chat_payload(message, session_id),
+        timeout=timeout,
+    )
+
+def iter_audio(path: str, realtime: bool = True, chunk_ms: int = 100) -> Iterator[bytes]:
+    """Chunks of a 16-bit mono WAV file (header first), paced like a live microphone if `realtime`."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"{path}: expected 16-bit mono WAV")
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    header = speech_wav_header(rate)
+    yield header
+    step = rate * chunk_ms // 1000 * 2
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, len(frames), step)):
+        if realtime:
+            time.sleep(max(0.0, start + i * chunk_ms / 1000 - time.perf_counter()))
+        yield frames[offset:offset + step]
+
+def speech_wav_header(sample_rate: int) -> bytes:
+    """WAV header for a stream of unknown length (data size left at its maximum)."""
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVEfmt " +
+            struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16) +
+            b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+def speech_chat(server_url: str, path: str, timeout: float = 60.0, session_id: Optional[str] = None,
+                realtime: bool = True) -> Optional[str]:
+    """Upload a WAV file in chunks to <server_url>/speech and print the transcript and the reply."""
+    speech_url = server_url.rstrip("/") + "/speech"
+    params = {"session_id": session_id} if session_id else None
+    return _post_stream(
+        speech_url,
+        headers={"Content-Type": "audio/wav", "Accept": "text/event-stream"},
+        data=iter_audio(path, realtime),
+        params=params,
+        timeout=timeout,
+    )
+
+def _post_stream(url: str, timeout: float, **kwargs) -> Optional[str]:
+    """POST and print the SSE reply stream (deltas, tool and usage events). Returns the full reply."""
+    reply_parts = []
+    first_token = None
+    start = time.time()
+    try:
+        headers = {**kwargs.pop("headers", {}), **deadline_headers(timeout)}
+        with HTTP.post(url, timeout=timeout, stream=True, headers=headers, **kwargs) as r:
+            if not r.ok:
+                return f"[error] HTTP {r.status_code}: {r.text.strip()}"
+            r.encoding = "utf-8"
+            prompt_shown = False
+            for event, data in iter_sse(r):
+                payload = json.loads(data) if data else {}
+                if event == "transcript":
+                    timing = payload.get("timing_ms", {})
+                    eprint(f"[speech] \"{payload.get('text')}\" ({payload.get('segments')} segment(s), ended by "
+                           f"{payload.get('ended_by')}, transcript ready {timing.get('speech_tail')} ms after speech end)")
+                    continue
+                if not prompt_shown:
+                    print("Assistant> ", end="", flush=True)
+                    prompt_shown = True
+                if event == "delta":
+                    if first_token is None:
+                        first_token = time.time() - start
+                    text = payload.get("text", "")
+                    reply_parts.append(text)
+                    print(text, end="", flush=True)
+                elif event == "tool_start":
+                    eprint(f"\n[tool] {payload.get('server')}.{payload.get('tool')} ...")
+                elif event == "tool_end":
+                    elapsed = payload.get("elapsed_ms")
+                    suffix = f" ({elapsed} ms)" if elapsed is not None else ""
+                    eprint(f"[tool] {payload.get('server')}.{payload.get('tool')} done{suffix}")
+                elif event == "usage":
+                    history = f" history={payload['history_tokens']}" if "history_tokens" in payload else ""
+                    eprint(f"\n[usage] in={payload.get('input_tokens')} out={payload.get('output_tokens')} "
+                           f"requests={payload.get('requests')}{history}")
+                elif event == "error":
+                    print()
+                    return f"[error] {payload.get('detail', 'stream error')}"
+                elif event == "done" and not reply_parts:
+                    # No deltas were streamed (e.g. empty answer); print the final reply
+                    reply_parts.append(payload.get("reply", ""))
+                    print(reply_parts[-1], end="", flush=True)
+            print()
     except requests.exceptions.Timeout:
         return "[error] Request timed out."
     except requests.exceptions.ConnectionError as ce:
         return f"[error] Connection error: {ce}"
     except Exception as ex:
         return f"[error] {ex}"
+    if first_token is not None:
+        eprint(f"[first token] {first_token:.2f}s")
+    return "".join(reply_parts).strip()
+
+def read_prompts(lines) -> Iterator[Dict[str, Any]]:
+    """Parse JSONL prompts: {"message": "...", "id": ..., "session_id": ...} or a bare JSON string per line."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e})")
+        if isinstance(item, str):
+            item = {"message": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"line {number}: expected an object with a non-empty \"message\"")
+        # A blank "message" falls back to "prompt" rather than sending an empty request
+        message = next((text for text in (item.get("message"), item.get("prompt")) if str(text or "").strip()), None)
+        if message is None:
+            raise ValueError(f"line {number}: expected an object with a non-empty \"message\"")
+        item["message"] = message
+        yield item
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, min(len(ordered), math.ceil(p / 100 * len(ordered)))) - 1]
+
+def run_batch(
+    server_url: str,
+    prompts: List[Dict[str, Any]],
+    out,
+    concurrency: int = 4,
+    timeout: float = 120.0,
+) -> Dict[str, Any]:
+    """Send prompts with at most `concurrency` requests in flight over one pooled connection set.
+
+    Replies are written to `out` as JSONL in input order as soon as all earlier ones are done,
+    so a long run can be followed with `tail -f` and a crash keeps the finished prefix.
+    """
+    http = make_http(concurrency)
+    done: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+
+    def work(index: int, item: Dict[str, Any]) -> None:
+        nonlocal next_index, errors
+        result = send_chat(server_url, item["message"], timeout=timeout, session_id=item.get("session_id"), http=http)
+        record = {"index": index}
+        if "id" in item:
+            record["id"] = item["id"]
+        record["message"] = item["message"]
+        record.update(result)
+        with lock:
+            if result["ok"]:
+                latencies.append(result["latency_ms"])
+            else:
+                errors += 1
+            done[index] = record
+            # Flush the contiguous prefix that is complete
+            while next_index in done:
+                out.write(json.dumps(done.pop(next_index), ensure_ascii=False) + "\n")
+                next_index += 1
+            out.flush()
+            finished = len(latencies) + errors
+            if finished % 10 == 0 or finished == len(prompts):
+                eprint(f"[batch] {finished}/{len(prompts)} done, {errors} errors")
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(work, i, item) for i, item in enumerate(prompts)]:
+                future.result()
+    finally:
+        http.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(prompts),
+        "ok": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(prompts) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0,
+        },
+    }
+
+def batch_main(args) -> int:
+    server_url = args.url or get_server_url()
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    try:
+        prompts = list(read_prompts(source))
+    except ValueError as e:
+        eprint(f"[batch] {e}")
+        return 2
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    eprint(f"[batch] {len(prompts)} prompts -> {server_url} (concurrency {args.concurrency})")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        summary = run_batch(server_url, prompts, out, concurrency=max(1, args.concurrency), timeout=args.timeout)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    lat = summary["latency_ms"]
+    eprint(
+        f"[batch] {summary['ok']}/{summary['requests']} ok, {summary['errors']} errors in {summary['elapsed_s']}s "
+        f"({summary['throughput_rps']} req/s)"
+    )
+    eprint(f"[batch] latency ms: p50 {lat['p50']}  p90 {lat['p90']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    return 0 if summary["errors"] == 0 else 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chat client for the agent server (interactive or batch)")
+    parser.add_argument("--batch", metavar="FILE", help="send the JSONL prompts in FILE ('-' = stdin) instead of chatting interactively")
+    parser.add_argument("--out", default="-", help="batch: JSONL file for the replies, in input order (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CHAT_CONCURRENCY", "4")), help="batch: requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0, help="batch/--speech: per-request timeout in seconds (the server is told via X-Request-Timeout)")
+    parser.add_argument("--url", default=None, help="chat endpoint (default: CHAT_SERVER_URL)")
+    parser.add_argument("--speech", metavar="WAV", help="send one spoken question (16-bit mono WAV) to /chat/speech and exit")
+    return parser.parse_args(argv)
 
 def main():
     # Ensure stdout prints UTF-8 on Windows if possible
@@ -75,11 +383,24 @@ def main():
         pass
 
     load_env()
-    server_url = get_server_url()
+    args = parse_args()
+    if args.batch:
+        sys.exit(batch_main(args))
+    server_url = args.url or get_server_url()
+    if args.speech:
+        reply = speech_chat(server_url, args.speech, timeout=args.timeout)
+        if reply and reply.startswith("[error]"):
+            eprint(reply)
+            sys.exit(1)
+        return
+    streaming = get_stream_default()
+    session_id = new_session_id()
 
     eprint("=== Chat Client ===")
     eprint(f"Server: {server_url}")
-    eprint("Type your message and press Enter. Commands: /quit, /exit, /health, /set <url>")
+    eprint(f"Streaming: {'on' if streaming else 'off'}")
+    eprint(f"Session: {session_id or 'off (stateless)'}")
+    eprint("Type your message and press Enter. Commands: /quit, /exit, /health, /set <url>, /stream on|off, /new, /speech <file.wav>")
     eprint("Press Ctrl-C to exit.\n")
 
     # quick health check
@@ -114,9 +435,38 @@ def main():
             eprint(f"[set] Server set to: {server_url}")
             continue
 
+        if line.lower() == "/new":
+            session_id = new_session_id()
+            eprint(f"[session] New conversation: {session_id or 'off (stateless)'}")
+            continue
+
+        if line.lower().startswith("/speech "):
+            start = time.time()
+            reply = speech_chat(server_url, line[8:].strip(), session_id=session_id)
+            if reply and reply.startswith("[error]"):
+                print(f"Assistant> {reply}")
+            eprint(f"[elapsed] {time.time() - start:.2f}s")
+            continue
+
+        if line.lower().startswith("/stream"):
+            arg = line[7:].strip().lower()
+            streaming = (not streaming) if not arg else arg in ("on", "1", "true", "yes")
+            eprint(f"[stream] Streaming {'on' if streaming else 'off'}")
+            continue
+
         # send to server
         start = time.time()
-        reply = post_chat(server_url, line)
+        if streaming:
+            reply = stream_chat(server_url, line, session_id=session_id)
+            elapsed = time.time() - start
+            if reply is None or reply == "":
+                print("Assistant> [empty response]")
+            elif reply.startswith("[error]"):
+                print(f"Assistant> {reply}")
+            eprint(f"[elapsed] {elapsed:.2f}s")
+            continue
+
+        reply = post_chat(server_url, line, session_id=session_id)
         elapsed = time.time() - start
 
         if reply is None or reply == "":
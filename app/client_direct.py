@@ -1,7 +1,12 @@
 import os
 import sys
 import json
+import math
 import time
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
 
 try:
     from dotenv import load_dotenv  # pip install python-dotenv
@@ -9,7 +14,8 @@ except Exception:
     load_dotenv = None
 
 try:
-    from openai import OpenAI  # pip install openai>=1.51
+    from openai import OpenAI, AsyncOpenAI  # pip install openai>=1.51
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 except Exception as exc:
     print("Missing dependency: openai. Install with `uv add openai` (or `pip install openai`).", file=sys.stderr)
     raise
@@ -25,21 +31,37 @@ def get_env(name: str, default: str = "") -> str:
     v = os.getenv(name)
     return v.strip() if v else default
 
-def make_client():
+def make_client(async_client: bool = False, max_retries: Optional[int] = None):
     api_key = os.getenv("OPENAI_API_KEY")
     base_url = os.getenv("OPENAI_BASE_URL")  # optional (Azure/custom)
     if not api_key:
         raise RuntimeError("Missing OPENAI_API_KEY. Put it in a .env file or the environment.")
+    kwargs: Dict[str, Any] = {"api_key": api_key, "base_url": base_url}
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
     # The new SDK accepts base_url=... if you use Azure/custom endpoints.
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return AsyncOpenAI(**kwargs) if async_client else OpenAI(**kwargs)
+
+def is_quota_error(ex: Exception) -> bool:
+    """Out of credit (not a temporary rate limit): retrying will not help."""
+    return isinstance(ex, APIStatusError) and getattr(ex, "code", None) == "insufficient_quota"
+
+def describe_error(ex: Exception) -> str:
+    if is_quota_error(ex):
+        return "Insufficient quota/billing for this key. Check your plan or try another key/model."
+    if isinstance(ex, RateLimitError):
+        return f"Rate limited: {ex}"
+    return str(ex)
 
 def create_reply(client: OpenAI, model: str, message: str) -> str:
     """
     Calls the Responses API with a simple text input.
     Returns the best-effort text reply or raises a RuntimeError.
     """
-    resp = client.responses.create(model=model, input=message)
+    return reply_text(client.responses.create(model=model, input=message))
 
+def reply_text(resp) -> str:
+    """Best-effort text of a Responses API result."""
     # Preferred helper:
     text = getattr(resp, "output_text", "") or ""
     if text:
@@ -61,6 +83,329 @@ def create_reply(client: OpenAI, model: str, message: str) -> str:
         pass
     raise RuntimeError("Empty response from model.")
 
+# ---------------------------------------------------------------------------
+# Batch mode: async, rate-limited, resumable (see `--batch` below)
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, continuously.
+
+    Bursts are capped at `burst_s` seconds' worth: the API enforces limits over short windows,
+    so a bucket holding a full minute would let the first second overrun them. A `per_minute`
+    of 0 means no limit: the bucket never makes anyone wait.
+    """
+
+    def __init__(self, per_minute: float, burst_s: float = 1.0):
+        self.limit = per_minute / 60.0
+        self.burst_s = burst_s
+        self.rate = self.limit
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_rate(self, per_second: float) -> None:
+        if self.limit <= 0:
+            return  # unlimited stays unlimited; 429s still pause via RateLimiter.pause
+        self._refill()
+        self.rate = max(self.limit / 64, min(self.limit, per_second))
+        self.capacity = max(1.0, self.rate * self.burst_s)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # A single request larger than the bucket only has to wait for a full bucket
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount  # may go negative when charging actual usage afterwards
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget shared by all batch workers.
+
+    Token cost is estimated before the call and corrected with the reported usage after it.
+    A 429 pauses every worker until the server's Retry-After has passed and halves the request
+    rate; successes raise it again step by step up to the configured RPM (AIMD), so a too
+    optimistic --rpm converges to what the account actually allows.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        async with self._lock:  # FIFO: workers are admitted in order
+            while True:
+                delay = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        self.tokens.take(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def rate_limited(self, seconds: float) -> None:
+        self.pause(seconds)
+        if time.monotonic() - self._last_decrease > seconds:  # one decrease per 429 burst
+            self._last_decrease = time.monotonic()
+            self.requests.set_rate(self.requests.rate / 2)
+            self.requests.level = 0.0
+
+    def succeeded(self) -> None:
+        if self.requests.rate < self.requests.limit:
+            self.requests.set_rate(self.requests.rate + self.requests.limit / 100)
+
+def retry_after(ex: Exception) -> Optional[float]:
+    """Seconds from the Retry-After / retry-after-ms headers of an API error, if present."""
+    response = getattr(ex, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form: fall back to our own backoff
+    return None
+
+def is_retryable(ex: Exception) -> bool:
+    if is_quota_error(ex):
+        return False
+    if isinstance(ex, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(ex, APIStatusError) and ex.status_code >= 500
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def estimate_tokens(message: str, max_output_tokens: Optional[int]) -> int:
+    return len(message) // 4 + 1 + (max_output_tokens or 256)
+
+def load_prompts(path: str) -> List[Dict[str, Any]]:
+    """JSONL: {"message": "...", "id": ...} or a bare JSON string per line ('-' reads stdin)."""
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    prompts = []
+    try:
+        for number, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"message": item}
+            message = str(item.get("message") or item.get("prompt") or item.get("input") or "").strip()
+            if not message:
+                raise ValueError(f"line {number}: expected a non-empty \"message\"")
+            prompts.append({"id": item.get("id", len(prompts)), "message": message})
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return prompts
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """Finished (model, id) results from an earlier run of the same output file."""
+    done: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line of an interrupted run
+            if record.get("ok"):
+                done[f"{record['model']}\x00{record['id']}"] = record
+    return done
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, min(len(ordered), math.ceil(p / 100 * len(ordered)))) - 1]
+
+def model_report(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    report: Dict[str, Dict[str, Any]] = {}
+    for model in sorted({r["model"] for r in records}):
+        rows = [r for r in records if r["model"] == model]
+        ok = [r for r in rows if r.get("ok")]
+        latencies = [r["latency_ms"] for r in ok]
+        report[model] = {
+            "requests": len(rows),
+            "ok": len(ok),
+            "failed": len(rows) - len(ok),
+            "retries": sum(r.get("retries", 0) for r in rows),
+            "input_tokens": sum(r.get("input_tokens", 0) for r in ok),
+            "output_tokens": sum(r.get("output_tokens", 0) for r in ok),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "max": max(latencies) if latencies else 0.0,
+            },
+        }
+    return report
+
+async def run_batch(
+    client: AsyncOpenAI,
+    prompts: List[Dict[str, Any]],
+    models: List[str],
+    out_path: str,
+    concurrency: int = 8,
+    rpm: float = 500,
+    tpm: float = 200_000,
+    max_output_tokens: Optional[int] = None,
+    max_retries: int = 6,
+) -> List[Dict[str, Any]]:
+    """Run every prompt against every model; results are appended to out_path as they finish.
+
+    Entries already completed in out_path are skipped, so an interrupted run can be resumed
+    by starting it again with the same arguments.
+    """
+    done = load_checkpoint(out_path)
+    jobs = [(model, p) for model in models for p in prompts if f"{model}\x00{p['id']}" not in done]
+    eprint(f"[batch] {len(jobs)} to run, {len(done)} already done ({out_path})")
+    limiter = RateLimiter(rpm, tpm)
+    queue: "asyncio.Queue" = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    records: List[Dict[str, Any]] = list(done.values())
+    finished = 0
+    out = open(out_path, "a", encoding="utf-8")
+
+    async def call(model: str, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"id": prompt["id"], "model": model, "ok": False, "retries": 0}
+        estimate = estimate_tokens(prompt["message"], max_output_tokens)
+        for attempt in range(max_retries + 1):
+            await limiter.acquire(estimate)
+            start = time.perf_counter()
+            try:
+                kwargs: Dict[str, Any] = {"model": model, "input": prompt["message"]}
+                if max_output_tokens:
+                    kwargs["max_output_tokens"] = max_output_tokens
+                resp = await client.responses.create(**kwargs)
+            except Exception as ex:
+                limiter.settle(estimate, 0)  # a failed request does not use tokens
+                if attempt >= max_retries or not is_retryable(ex):
+                    record["error"] = describe_error(ex)
+                    return record
+                wait = retry_after(ex)
+                delay = wait if wait is not None else backoff_delay(attempt)
+                if isinstance(ex, RateLimitError):
+                    limiter.rate_limited(delay)  # everyone backs off (in acquire), not just this worker
+                else:
+                    await asyncio.sleep(delay)
+                record["retries"] += 1
+                continue
+            latency = time.perf_counter() - start
+            usage = getattr(resp, "usage", None)
+            input_tokens = getattr(usage, "input_tokens", 0) or 0
+            output_tokens = getattr(usage, "output_tokens", 0) or 0
+            limiter.settle(estimate, input_tokens + output_tokens)
+            limiter.succeeded()
+            record.update({
+                "ok": True,
+                "reply": reply_text(resp),
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "latency_ms": round(latency * 1000, 1),
+            })
+            return record
+        return record
+
+    async def worker() -> None:
+        nonlocal finished
+        while True:
+            try:
+                model, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await call(model, prompt)
+            records.append(record)
+            # Checkpoint: one line per finished request, flushed immediately
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            finished += 1
+            if not record["ok"]:
+                eprint(f"[batch] {model} #{prompt['id']}: {record['error']}")
+            if finished % 10 == 0 or finished == len(jobs):
+                eprint(f"[batch] {finished}/{len(jobs)} done")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        out.close()
+    return records
+
+def batch_main(args) -> int:
+    try:
+        client = make_client(async_client=True, max_retries=0)  # retries are handled by run_batch
+        prompts = load_prompts(args.batch)
+    except Exception as ex:
+        eprint(f"[init] {ex}")
+        return 2
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    eprint(f"[batch] {len(prompts)} prompts x {len(models)} model(s), concurrency {args.concurrency}, "
+           f"{args.rpm:g} RPM / {args.tpm:g} TPM")
+    start = time.perf_counter()
+    records = asyncio.run(run_batch(
+        client, prompts, models, args.out,
+        concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+        max_output_tokens=args.max_output_tokens, max_retries=args.max_retries,
+    ))
+    elapsed = time.perf_counter() - start
+    report = model_report(records)
+    eprint(f"[batch] finished in {elapsed:.1f}s")
+    eprint(f"{'model':<24} {'ok':>6} {'failed':>6} {'retries':>7} {'in tok':>9} {'out tok':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for model, row in report.items():
+        lat = row["latency_ms"]
+        eprint(f"{model:<24} {row['ok']:>6} {row['failed']:>6} {row['retries']:>7} {row['input_tokens']:>9} "
+               f"{row['output_tokens']:>9} {lat['p50']:>8} {lat['p95']:>8}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_s": round(elapsed, 2), "models": report}, f, indent=2)
+    return 0 if all(row["failed"] == 0 for row in report.values()) else 1
+
+def non_negative(value: str) -> float:
+    number = float(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be >= 0 (0 = unlimited), got {value}")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Direct Responses API client (interactive or batch)")
+    parser.add_argument("--batch", metavar="FILE", help="run the JSONL prompts in FILE ('-' = stdin) instead of chatting")
+    parser.add_argument("--out", default="batch_results.jsonl", help="batch: JSONL results/checkpoint file (re-run to resume)")
+    parser.add_argument("--models", default=get_env("OPENAI_MODEL", "gpt-4o-mini"), help="batch: comma-separated models to compare")
+    parser.add_argument("--concurrency", type=int, default=8, help="batch: requests in flight")
+    parser.add_argument("--rpm", type=non_negative, default=get_env("OPENAI_RPM", "500"), help="batch: requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=non_negative, default=get_env("OPENAI_TPM", "200000"), help="batch: tokens per minute (0 = unlimited)")
+    parser.add_argument("--max-output-tokens", type=int, default=None, help="batch: cap on reply length")
+    parser.add_argument("--max-retries", type=int, default=6, help="batch: retries per request (429/5xx/timeouts)")
+    parser.add_argument("--report", default=None, help="batch: write the per-model summary as JSON")
+    return parser.parse_args(argv)
+
 def main():
     # Ensure UTF-8 prints nicely on Windows
     try:
@@ -69,6 +414,9 @@ def main():
         pass
 
     load_env()
+    args = parse_args()
+    if args.batch:
+        sys.exit(batch_main(args))
     model = get_env("OPENAI_MODEL", "gpt-4o-mini")
 
     eprint("=== ChatGPT Direct Client ===")
@@ -117,11 +465,7 @@ def main():
             reply = create_reply(client, model, line)
             print(f"Assistant> {reply}")
         except Exception as ex:
-            s = str(ex)
-            if "insufficient_quota" in s or "You exceeded your current quota" in s:
-                eprint("[error] Insufficient quota/billing for this key. Check your plan or try another key/model.")
-            else:
-                eprint(f"[error] {s}")
+            eprint(f"[error] {describe_error(ex)}")
         finally:
             eprint(f"[elapsed] {time.time() - start:.2f}s")
 
@@ -0,0 +1,232 @@
+"""Per-request deadlines with stage budgets, and cancellation of agent runs nobody waits for.
+
+A client sends how long it will wait (X-Request-Timeout, in seconds); the server caps it at
+CHAT_DEADLINE_MAX and uses CHAT_DEADLINE when the header is missing. Within that deadline,
+the admission queue, each model turn and each tool call have their own budgets. When the
+deadline or an active budget runs out, or the client disconnects, the run is cancelled: no
+further model turns, and pending MCP calls are cancelled on the server too
+(see call_tool_cancellable in app/mcp_pool.py).
+"""
+import asyncio
+import math
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+from agents import RunHooks
+
+from app import metrics
+
+DEADLINE = "deadline"
+DISCONNECT = "client_disconnect"
+ABANDONED = "abandoned"  # every request waiting for a coalesced run left
+HEADER = "x-request-timeout"
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, reason: str, seconds: float):
+        super().__init__(f"{reason.replace('_', ' ')} exceeded (request deadline {seconds:g}s)")
+        self.reason = reason
+
+
+class Deadline:
+    """Time limit of one request. While a model turn or tool call runs, its stage budget can
+    bring the cut-off forward; one timer tracks the earliest of them."""
+
+    def __init__(self, seconds: float, budgets: Dict[str, float]):
+        self.loop = asyncio.get_running_loop()
+        self.seconds = seconds
+        self.expires = self.loop.time() + seconds
+        self.budgets = budgets
+        self.reason: Optional[str] = None  # why the request was cancelled
+        self.context = None  # RunContextWrapper of the run (usage so far), set by DeadlineHooks
+        self.coalesced = False  # waits for a shared run, which has a Deadline (and accounting) of its own
+        self._active: Dict[Any, Tuple[str, float]] = {}
+        self._cancel: Optional[Callable[[], Any]] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def for_run(self) -> "Deadline":
+        """A Deadline for a run shared by several requests: same budgets and cut-off as this one."""
+        run = Deadline(self.seconds, self.budgets)
+        run.expires = self.expires
+        return run
+
+    def extend(self, expires: float) -> None:
+        """Move the cut-off to `expires` (loop time) if that is later, e.g. for a new waiter."""
+        if expires > self.expires:
+            self.seconds += expires - self.expires
+            self.expires = expires
+            self._schedule()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - self.loop.time())
+
+    def budget(self, stage: str) -> float:
+        return min(self.budgets.get(stage, math.inf), self.remaining())
+
+    def arm(self, cancel: Callable[[], Any]) -> None:
+        """Call `cancel` once the deadline or an active stage budget runs out."""
+        self._cancel = cancel
+        self._schedule()
+
+    def disarm(self) -> None:
+        self._cancel = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def cancel(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+        cancel = self._cancel
+        self.disarm()
+        if cancel is not None:
+            cancel()
+
+    def enter(self, key: Any, stage: str) -> None:
+        if stage in self.budgets:
+            self._active[key] = (stage, self.loop.time() + self.budgets[stage])
+            self._schedule()
+
+    def leave(self, key: Any) -> None:
+        if self._active.pop(key, None) is not None:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._cancel is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        when, reason = self.expires, DEADLINE
+        for stage, expires in self._active.values():
+            if expires < when:
+                when, reason = expires, f"{stage}_budget"
+        self._timer = self.loop.call_at(when, self.cancel, reason)
+
+    def tokens_spent(self) -> int:
+        return self.context.usage.total_tokens if self.context is not None else 0
+
+    def error(self) -> DeadlineExceeded:
+        return DeadlineExceeded(self.reason or DEADLINE, self.seconds)
+
+
+class DeadlineHooks(RunHooks):
+    """Applies the model/tool budgets of a Deadline and remembers the run's usage and the names
+    of the tools it started (for the model router); other callbacks go to `inner` (the metrics hooks)."""
+
+    def __init__(self, deadline: Deadline, inner: Optional[RunHooks] = None, tools_started: Optional[Set[str]] = None):
+        self.deadline = deadline
+        self.inner = inner
+        self.tools_started = tools_started if tools_started is not None else set()
+        self._tools: Dict[str, Deque[object]] = {}
+
+    async def on_agent_start(self, context, agent) -> None:
+        self.deadline.context = context
+        if self.inner is not None:
+            await self.inner.on_agent_start(context, agent)
+
+    async def on_agent_end(self, context, agent, output) -> None:
+        if self.inner is not None:
+            await self.inner.on_agent_end(context, agent, output)
+
+    async def on_handoff(self, context, from_agent, to_agent) -> None:
+        if self.inner is not None:
+            await self.inner.on_handoff(context, from_agent, to_agent)
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self.deadline.enter("model", "model")
+        if self.inner is not None:
+            await self.inner.on_llm_start(context, agent, system_prompt, input_items)
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        self.deadline.leave("model")
+        if self.inner is not None:
+            await self.inner.on_llm_end(context, agent, response)
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self.tools_started.add(tool.name)
+        key = object()
+        self._tools.setdefault(tool.name, deque()).append(key)
+        self.deadline.enter(key, "tool")
+        if self.inner is not None:
+            await self.inner.on_tool_start(context, agent, tool)
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        keys = self._tools.get(tool.name)
+        if keys:
+            self.deadline.leave(keys.popleft())
+        if self.inner is not None:
+            await self.inner.on_tool_end(context, agent, tool, result)
+
+
+class DeadlinePolicy:
+    """Default/maximum deadline and stage budgets, plus counts of cancelled runs for /stats."""
+
+    def __init__(self, default_s: float = 60.0, max_s: float = 120.0, budgets: Optional[Dict[str, float]] = None):
+        self.default_s = default_s
+        self.max_s = max_s
+        self.budgets = budgets or {}
+        self.completed_runs = 0
+        self.completed_tokens = 0
+        self.cancelled: Dict[str, int] = {}
+        self.tokens_spent = 0
+        self.tokens_saved = 0
+
+    def start(self, requested: Optional[str] = None) -> Deadline:
+        """Deadline for a request; `requested` is the client's X-Request-Timeout header."""
+        seconds = self.default_s
+        if requested:
+            try:
+                seconds = float(requested)
+            except ValueError:
+                pass
+        if not math.isfinite(seconds) or seconds <= 0:
+            seconds = self.default_s
+        return Deadline(min(seconds, self.max_s), self.budgets)
+
+    def completed(self, usage) -> None:
+        """Tokens of a finished run; their average estimates what a cancelled run would have used."""
+        if usage is not None:
+            self.completed_runs += 1
+            self.completed_tokens += usage.total_tokens
+
+    def record_cancelled(self, deadline: Deadline, endpoint: str) -> None:
+        reason = deadline.reason or DEADLINE
+        self.cancelled[reason] = self.cancelled.get(reason, 0) + 1
+        spent = deadline.tokens_spent()
+        # Only runs this request started count as savings (not a queued or coalesced wait)
+        saved = 0
+        if deadline.context is not None and self.completed_runs:
+            saved = max(0, round(self.completed_tokens / self.completed_runs) - spent)
+        self.tokens_spent += spent
+        self.tokens_saved += saved
+        if metrics.METRICS_ENABLED:
+            metrics.CANCELLED_RUNS.inc(1, endpoint, reason)
+            metrics.CANCELLED_TOKENS.inc(spent, "spent")
+            metrics.CANCELLED_TOKENS.inc(saved, "saved_estimate")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_s": self.default_s,
+            "max_s": self.max_s,
+            "budgets_s": dict(self.budgets),
+            "cancelled": dict(self.cancelled),
+            "cancelled_tokens_spent": self.tokens_spent,
+            "cancelled_tokens_saved_estimate": self.tokens_saved,
+            "avg_tokens_per_completed_run": round(self.completed_tokens / self.completed_runs, 1) if self.completed_runs else 0.0,
+        }
+
+
+def deadlines_from_env() -> DeadlinePolicy:
+    """CHAT_DEADLINE (default 60 s), CHAT_DEADLINE_MAX (120 s); CHAT_BUDGET_QUEUE, CHAT_BUDGET_MODEL
+    and CHAT_BUDGET_TOOL limit the admission wait, each model turn and each tool call (0 = no limit)."""
+    budgets = {}
+    for stage, default in (("queue", "0"), ("model", "60"), ("tool", "30")):
+        seconds = float(os.getenv(f"CHAT_BUDGET_{stage.upper()}", default))
+        if seconds > 0:
+            budgets[stage] = seconds
+    return DeadlinePolicy(
+        default_s=float(os.getenv("CHAT_DEADLINE", "60")),
+        max_s=float(os.getenv("CHAT_DEADLINE_MAX", "120")),
+        budgets=budgets,
+    )
@@ -0,0 +1,472 @@
+"""Inverted index over the filesystem roots (MCP_FS_ROOTS), exposed to the agent as search tools.
+
+Instead of listing directories and reading whole files through the filesystem MCP server one
+call at a time, the agent calls `search_file_contents` once and gets ranked snippets with line
+numbers, then `read_file_lines` for just the ranges it needs. The index is updated from file
+mtimes (changed files are re-read, deleted ones dropped) at most every FS_INDEX_REFRESH seconds.
+
+    uv run python -m app.fs_index query "heart rate threshold"
+    uv run python -m app.fs_index bench
+"""
+import argparse
+import asyncio
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"[^\W_]{2,}")
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".index"}
+CHECKPOINT_LINES = 1024  # byte offsets of lines 1, 1025, 2049, ... for range reads in large files
+MAX_OCCURRENCES = 32     # line positions kept per term and file (the term frequency is exact)
+K1, B = 1.2, 0.75        # BM25
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _is_binary(head: bytes) -> bool:
+    return b"\0" in head
+
+
+class _File:
+    __slots__ = ("path", "mtime_ns", "size", "length", "terms", "checkpoints")
+
+    def __init__(self, path: str, mtime_ns: int, size: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.length = 0           # tokens, for BM25 length normalization
+        self.terms: List[str] = []
+        self.checkpoints: List[int] = [0]
+
+
+def _lines(mm, start_offset: int = 0) -> Iterator[Tuple[int, int]]:
+    """(start, end) byte offsets of the lines of a mapped file, from `start_offset`."""
+    size = len(mm)
+    offset = start_offset
+    while offset < size:
+        end = mm.find(b"\n", offset)
+        if end == -1:
+            end = size
+        yield offset, end
+        offset = end + 1
+
+
+class FileIndex:
+    """BM25 over whole files, with the line positions of each term for snippets.
+
+    Postings map term -> {file id -> [term frequency, [line numbers]]}. Files are
+    memory-mapped while being indexed and when snippets or line ranges are read, so a large
+    log or CSV file is never loaded whole.
+    """
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        refresh_interval: float = 2,
+        max_file_bytes: int = 50 * 1024 * 1024,
+        max_read_bytes: int = 64 * 1024,
+    ):
+        self.roots = [Path(r).resolve() for r in roots]
+        self.refresh_interval = refresh_interval
+        self.max_file_bytes = max_file_bytes
+        self.max_read_bytes = max_read_bytes
+        self.files: Dict[int, _File] = {}
+        self.ids: Dict[str, int] = {}
+        self._skipped: Dict[str, Tuple[int, int]] = {}  # path -> (mtime_ns, size) of non-text files
+        self.postings: Dict[str, Dict[int, list]] = {}
+        self.total_length = 0
+        self.total_bytes = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()  # one refresh at a time
+        self._last_refresh = 0.0
+        # stats
+        self.refreshes = 0
+        self.reindexed = 0
+        self.last_refresh_ms = 0.0
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    # --- indexing ---------------------------------------------------------------------------
+
+    def _walk(self) -> Iterator[os.DirEntry]:
+        stack = [str(r) for r in self.roots if r.is_dir()]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry
+            except OSError:
+                continue
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-read files whose mtime or size changed and drop deleted ones.
+
+        The walk and the reading of changed files happen outside the index lock; only putting
+        each file's postings in place holds it, so searches keep using the current snapshot."""
+        with self._refreshing:
+            start = time.perf_counter()
+            changed = removed = 0
+            with self._lock:
+                known = {path: (self.files[i].mtime_ns, self.files[i].size) for path, i in self.ids.items()}
+            seen = set()
+            for entry in self._walk():
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if st.st_size > self.max_file_bytes:
+                    continue
+                seen.add(entry.path)
+                version = (st.st_mtime_ns, st.st_size)
+                if self._skipped.get(entry.path) == version or known.get(entry.path) == version:
+                    continue  # unchanged (binary or unreadable ones are remembered in _skipped)
+                scanned = self._scan(entry.path, *version)
+                with self._lock:
+                    file_id = self.ids.get(entry.path)
+                    if file_id is not None:
+                        self._remove(file_id)
+                    if scanned is not None:
+                        self._insert(*scanned)
+                if scanned is not None:
+                    self._skipped.pop(entry.path, None)
+                    changed += 1
+                else:
+                    self._skipped[entry.path] = version
+            with self._lock:
+                for path in [p for p in self.ids if p not in seen]:
+                    self._remove(self.ids[path])
+                    removed += 1
+                self._skipped = {p: v for p, v in self._skipped.items() if p in seen}
+                self._last_refresh = time.monotonic()
+                self.refreshes += 1
+                self.reindexed += changed
+                self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+                files = len(self.files)
+        return {"changed": changed, "removed": removed, "files": files}
+
+    def maybe_refresh(self) -> None:
+        """Start a background refresh once refresh_interval has passed; only the very first
+        refresh (nothing indexed yet) is waited for."""
+        if not self.refreshes:
+            self.refresh()
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_interval or self._refreshing.locked():
+            return
+        threading.Thread(target=self._background_refresh, name="fs-index-refresh", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        if not self._refreshing.locked():  # another thread may have started one meanwhile
+            try:
+                self.refresh()
+            except Exception as exception:
+                print(f"[fs_index] refresh failed: {exception}", file=sys.stderr)
+
+    def _scan(self, path: str, mtime_ns: int, size: int) -> Optional[Tuple[_File, Dict[str, list]]]:
+        """Record and term counts of a text file; None for binary or unreadable files."""
+        record = _File(path, mtime_ns, size)
+        counts: Dict[str, list] = {}
+        # The file name counts as content, so "which file is about X" finds it by name too
+        for term in tokenize(Path(path).stem):
+            counts.setdefault(term, [0, []])[0] += 1
+        try:
+            with open(path, "rb") as f:
+                if size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if _is_binary(mm[:4096]):
+                            return None
+                        for line_no, (begin, end) in enumerate(_lines(mm), start=1):
+                            if line_no > 1 and (line_no - 1) % CHECKPOINT_LINES == 0:
+                                record.checkpoints.append(begin)
+                            for term in tokenize(mm[begin:end].decode("utf-8", "replace")):
+                                entry = counts.get(term)
+                                if entry is None:
+                                    entry = counts[term] = [0, []]
+                                entry[0] += 1
+                                if len(entry[1]) < MAX_OCCURRENCES and (not entry[1] or entry[1][-1] != line_no):
+                                    entry[1].append(line_no)
+        except (OSError, ValueError):
+            return None
+        return record, counts
+
+    def _insert(self, record: _File, counts: Dict[str, list]) -> None:
+        file_id = self._next_id
+        self._next_id += 1
+        for term, entry in counts.items():
+            self.postings.setdefault(term, {})[file_id] = entry
+            record.terms.append(term)
+            record.length += entry[0]
+        self.files[file_id] = record
+        self.ids[record.path] = file_id
+        self.total_length += record.length
+        self.total_bytes += record.size
+
+    def _remove(self, file_id: int) -> None:
+        record = self.files.pop(file_id)
+        del self.ids[record.path]
+        self.total_length -= record.length
+        self.total_bytes -= record.size
+        for term in record.terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(file_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    # --- reading ----------------------------------------------------------------------------
+
+    def _within_roots(self, path: Path) -> bool:
+        return any(path == root or root in path.parents for root in self.roots)
+
+    def _resolve(self, path: str) -> str:
+        """Absolute path of a file in the roots; relative paths are taken relative to the roots
+        (the first one holding the file), never to the working directory."""
+        given = Path(path)
+        candidates = [given.resolve()] if given.is_absolute() else [(root / given).resolve() for root in self.roots]
+        allowed = [c for c in candidates if self._within_roots(c)]
+        if not allowed:
+            raise PermissionError(f"{path} is outside the indexed roots")
+        return str(next((c for c in allowed if c.exists()), allowed[0]))
+
+    def read_lines(self, path: str, start_line: int, end_line: int) -> Dict[str, Any]:
+        """Lines start_line..end_line (1-based, inclusive) via mmap, at most max_read_bytes."""
+        path = self._resolve(path)
+        start_line = max(1, start_line)
+        with self._lock:
+            file_id = self.ids.get(path)
+            record = self.files[file_id] if file_id is not None else None
+            indexed = (record.mtime_ns, record.size, list(record.checkpoints)) if record is not None else None
+        lines: List[str] = []
+        truncated = False
+        size = 0
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return {"path": path, "start_line": start_line, "end_line": start_line - 1, "text": ""}
+            # Line offsets are only valid for the version that was indexed; a file changed since
+            # the last refresh is scanned from the start
+            checkpoints = [0]
+            if indexed is not None and indexed[:2] == (st.st_mtime_ns, st.st_size):
+                checkpoints = indexed[2]
+            # Jump to the closest known line offset at or before start_line, then scan forward
+            index = min((start_line - 1) // CHECKPOINT_LINES, len(checkpoints) - 1)
+            line_no = index * CHECKPOINT_LINES + 1
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for begin, end in _lines(mm, checkpoints[index]):
+                    if line_no > end_line:
+                        break
+                    if line_no >= start_line:
+                        if size + end - begin > self.max_read_bytes and lines:
+                            truncated = True
+                            break
+                        lines.append(mm[begin:end].decode("utf-8", "replace").rstrip("\r"))
+                        size += end - begin + 1
+                    line_no += 1
+        result = {
+            "path": path,
+            "start_line": start_line,
+            "end_line": start_line + len(lines) - 1,
+            "text": "\n".join(lines),
+        }
+        if truncated:
+            result["truncated"] = True
+        return result
+
+    # --- search -----------------------------------------------------------------------------
+
+    def search(self, query: str, k: int = 5, snippets: int = 2, context: int = 1) -> List[Dict[str, Any]]:
+        """Top-k files for the query, each with up to `snippets` line ranges around the best matches."""
+        start = time.perf_counter()
+        self.maybe_refresh()
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n = len(self.files)
+            if not n or not terms:
+                self.searches += 1
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for file_id, (tf, _) in postings.items():
+                    norm = K1 * (1 - B + B * self.files[file_id].length / avg_length)
+                    scores[file_id] = scores.get(file_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            hits = []
+            for file_id, score in top:
+                # Lines holding the most distinct query terms (within +-context lines) make the snippets
+                matched: Dict[int, set] = {}
+                for term in terms:
+                    entry = self.postings.get(term, {}).get(file_id)
+                    for line_no in (entry[1] if entry else ()):
+                        matched.setdefault(line_no, set()).add(term)
+                ranked = sorted(
+                    matched,
+                    key=lambda line: (-len(set().union(*(matched.get(l, ()) for l in range(line - context, line + context + 1)))), line),
+                )
+                chosen: List[int] = []
+                for line in ranked:
+                    if all(abs(line - other) > 2 * context for other in chosen):
+                        chosen.append(line)
+                    if len(chosen) == snippets:
+                        break
+                hits.append((self.files[file_id].path, score, sorted(chosen)))
+        results = []
+        for path, score, lines in hits:
+            spans = []
+            for line in lines:
+                try:
+                    span = self.read_lines(path, line - context, line + context)
+                except OSError:
+                    continue
+                spans.append({"lines": f"{span['start_line']}-{span['end_line']}", "text": span["text"][:1000]})
+            results.append({"path": path, "score": round(score, 3), "snippets": spans})
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - start
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "roots": [str(r) for r in self.roots],
+            "files": len(self.files),
+            "terms": len(self.postings),
+            "indexed_bytes": self.total_bytes,
+            "refreshes": self.refreshes,
+            "files_reindexed": self.reindexed,
+            "last_refresh_ms": self.last_refresh_ms,
+            "searches": self.searches,
+            "search_ms_avg": round(self.search_seconds / self.searches * 1000, 2) if self.searches else 0.0,
+        }
+
+
+_index: Optional[FileIndex] = None
+
+
+def get_fs_index(roots: Sequence[str]) -> FileIndex:
+    """One index per process (FS_INDEX_REFRESH seconds between mtime checks, FS_INDEX_MAX_FILE_MB)."""
+    global _index
+    if _index is None:
+        _index = FileIndex(
+            roots,
+            refresh_interval=float(os.getenv("FS_INDEX_REFRESH", "2")),
+            max_file_bytes=int(float(os.getenv("FS_INDEX_MAX_FILE_MB", "50")) * 1024 * 1024),
+        )
+    return _index
+
+
+def fs_index_stats() -> Optional[Dict[str, Any]]:
+    return _index.stats() if _index is not None else None
+
+
+def make_fs_tools(index: FileIndex) -> list:
+    """Function tools over the index; they run in a worker thread so the event loop stays free."""
+    from agents import function_tool
+
+    @function_tool
+    async def search_file_contents(query: str, max_results: int = 5) -> str:
+        """Full-text search over the files in the allowed folders. Returns the best matching files
+        with snippets and their line ranges; use this before reading whole files.
+
+        Args:
+            query: Words to look for.
+            max_results: Number of files to return (1-20).
+        """
+        hits = await asyncio.to_thread(index.search, query, max(1, min(20, max_results)))
+        return json.dumps(hits, ensure_ascii=False)
+
+    @function_tool
+    async def read_file_lines(path: str, start_line: int, end_line: int) -> str:
+        """Read a range of lines of a file (e.g. around a search snippet) without loading the whole file.
+
+        Args:
+            path: File path as returned by search_file_contents.
+            start_line: First line (1-based).
+            end_line: Last line (inclusive).
+        """
+        try:
+            result = await asyncio.to_thread(index.read_lines, path, start_line, end_line)
+        except OSError as exception:
+            return f"Error: {exception}"
+        return json.dumps(result, ensure_ascii=False)
+
+    return [search_file_contents, read_file_lines]
+
+
+def _crawl(roots: Sequence[Path], terms: List[str]) -> int:
+    """What the agent does without the index: read every file and look for the words."""
+    matches = 0
+    for root in roots:
+        for path in root.rglob("*"):
+            if path.is_file():
+                try:
+                    text = path.read_text(encoding="utf-8", errors="replace").lower()
+                except OSError:
+                    continue
+                matches += any(t in text for t in terms)
+    return matches
+
+
+def main():
+    from app.agent_cli_mcp import FS_ROOTS
+
+    parser = argparse.ArgumentParser(description="Inverted index over MCP_FS_ROOTS")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query = sub.add_parser("query", help="search the files")
+    query.add_argument("text", nargs="+")
+    query.add_argument("-k", type=int, default=5)
+    bench = sub.add_parser("bench", help="index build / refresh time and search latency vs. reading every file")
+    bench.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    index = get_fs_index(FS_ROOTS)
+    start = time.perf_counter()
+    index.refresh()
+    build_s = time.perf_counter() - start
+    if args.command == "query":
+        print(json.dumps(index.search(" ".join(args.text), k=args.k), indent=2, ensure_ascii=False))
+        return
+    terms = sorted(index.postings, key=lambda t: len(index.postings[t]), reverse=True)[:args.queries] or ["iot"]
+    start = time.perf_counter()
+    index.refresh()
+    refresh_ms = (time.perf_counter() - start) * 1000
+    latencies = []
+    for term in terms:
+        t = time.perf_counter()
+        index.search(term)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    crawl = []
+    for term in terms[:5]:
+        t = time.perf_counter()
+        _crawl(index.roots, [term])
+        crawl.append((time.perf_counter() - t) * 1000)
+    print(json.dumps({
+        **index.stats(),
+        "build_s": round(build_s, 3),
+        "refresh_unchanged_ms": round(refresh_ms, 2),
+        "search_ms_p50": round(latencies[len(latencies) // 2], 3),
+        "search_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "crawl_ms_per_query": round(sum(crawl) / len(crawl), 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Local, in-process retrieval over the documents in rag/ (alternative to the hosted FileSearchTool).
+
+Build the index once (it is also built automatically on first use):
+    uv run python -m app.local_rag build
+    uv run python -m app.local_rag query "Which sensors does the SmartDevice use?"
+    uv run python -m app.local_rag bench
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    print("Missing dependency: numpy. Install with `uv sync --extra local-rag` (or `pip install numpy pypdf`).",
+          file=sys.stderr)
+    raise
+
+RAG_DIR = Path(os.getenv("LOCAL_RAG_DOCS_DIR", Path(__file__).resolve().parent.parent / "rag"))
+INDEX_DIR = Path(os.getenv("LOCAL_RAG_INDEX_DIR", RAG_DIR / ".index"))
+CHUNK_WORDS = int(os.getenv("LOCAL_RAG_CHUNK_WORDS", "180"))
+CHUNK_OVERLAP = int(os.getenv("LOCAL_RAG_CHUNK_OVERLAP", "40"))
+DOC_SUFFIXES = (".pdf", ".txt", ".md")
+SEARCH_BLOCK_ROWS = 8192  # rows of the memory-mapped matrix scored at a time
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+# --- Embedders ---------------------------------------------------------------------------
+
+class Embedder:
+    """Turns texts into L2-normalized float32 vectors (one row per text)."""
+
+    name = "base"
+    dim = 0
+
+    def fit(self, texts: Sequence[str]) -> None:
+        """Optional corpus statistics (e.g. IDF) computed at build time."""
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        raise NotImplementedError
+
+    def save(self, index_dir: Path) -> None:
+        pass
+
+    def load(self, index_dir: Path) -> None:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Offline TF-IDF embedder: unigrams + bigrams hashed into `dim` signed buckets.
+
+    Needs no network or model download, which makes it usable in tests and air-gapped setups.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _features(self, text: str) -> Iterable[str]:
+        tokens = tokenize(text)
+        yield from tokens
+        for a, b in zip(tokens, tokens[1:]):
+            yield a + " " + b
+
+    def _bucket_counts(self, text: str) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = h % self.dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def fit(self, texts: Sequence[str]) -> None:
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            for bucket in self._bucket_counts(text):
+                df[bucket] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, count in self._bucket_counts(text).items():
+                # sublinear term frequency, sign kept to reduce hash collisions' bias
+                out[row, bucket] = math.copysign(1 + math.log(abs(count)), count) if count else 0.0
+        out *= self.idf
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def save(self, index_dir: Path) -> None:
+        np.save(index_dir / "idf.npy", self.idf)
+
+    def load(self, index_dir: Path) -> None:
+        self.idf = np.load(index_dir / "idf.npy")
+        self.dim = int(self.idf.shape[0])
+
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings from the OpenAI API (better recall, needs network and OPENAI_API_KEY)."""
+
+    name = "openai"
+
+    def __init__(self, model: str = "text-embedding-3-small", batch_size: int = 128, client=None):
+        self.model = model
+        self.batch_size = batch_size
+        self._client = client
+        self.dim = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+        return self._client
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            response = self.client.embeddings.create(model=self.model, input=batch)
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        out = np.asarray(rows, dtype=np.float32)
+        self.dim = out.shape[1] if out.size else self.dim
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+EMBEDDERS = {"hashing": HashingEmbedder, "openai": OpenAIEmbedder}
+
+
+def make_embedder(name: Optional[str] = None) -> Embedder:
+    name = (name or os.getenv("LOCAL_RAG_EMBEDDER", "hashing")).strip().lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"unknown embedder {name!r}, expected one of {sorted(EMBEDDERS)}")
+    return EMBEDDERS[name]()
+
+
+# --- Parsing & chunking ------------------------------------------------------------------
+
+def read_pages(path: Path) -> List[str]:
+    """Text per page (PDF) or the whole file as one page (txt/md)."""
+    if path.suffix.lower() == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print("Missing dependency: pypdf. Install with `uv sync --extra local-rag` (or `pip install pypdf`).",
+                  file=sys.stderr)
+            raise
+        return [page.extract_text() or "" for page in PdfReader(str(path)).pages]
+    return [path.read_text(encoding="utf-8", errors="replace")]
+
+
+def chunk_pages(pages: List[str], source: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    chunks = []
+    step = max(1, words - overlap)
+    for page_no, text in enumerate(pages, start=1):
+        tokens = text.split()
+        for start in range(0, max(len(tokens), 1), step):
+            piece = " ".join(tokens[start:start + words])
+            if piece.strip():
+                chunks.append({"source": source, "page": page_no, "text": piece})
+            if start + words >= len(tokens):
+                break
+    return chunks
+
+
+def find_documents(docs_dir: Path = RAG_DIR) -> List[Path]:
+    return sorted(
+        p for p in docs_dir.rglob("*")
+        if p.is_file() and p.suffix.lower() in DOC_SUFFIXES and INDEX_DIR not in p.parents
+    )
+
+
+# --- Index -------------------------------------------------------------------------------
+
+class LocalIndex:
+    """Chunk texts plus a (memory-mapped) float16 matrix of their embeddings."""
+
+    def __init__(self, vectors: "np.ndarray", chunks: List[Dict[str, Any]], embedder: Embedder, meta: Dict[str, Any]):
+        self.vectors = vectors
+        self.chunks = chunks
+        self.embedder = embedder
+        self.meta = meta
+        self.queries = 0
+        self.query_time = 0.0
+
+    @classmethod
+    def build(cls, docs_dir: Path = RAG_DIR, index_dir: Path = INDEX_DIR, embedder: Optional[Embedder] = None) -> "LocalIndex":
+        embedder = embedder or make_embedder()
+        start = time.perf_counter()
+        started_at = time.time()  # files changed while building count as newer than the index
+        documents = find_documents(docs_dir)
+        chunks: List[Dict[str, Any]] = []
+        for path in documents:
+            chunks.extend(chunk_pages(read_pages(path), path.name))
+        texts = [c["text"] for c in chunks]
+        embedder.fit(texts)
+        vectors = embedder.embed(texts).astype(np.float16) if texts else np.zeros((0, embedder.dim), np.float16)
+
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.save(index_dir / "vectors.npy", vectors)
+        with open(index_dir / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        embedder.save(index_dir)
+        meta = {
+            "embedder": embedder.name,
+            "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "chunks": len(chunks),
+            "documents": sorted({c["source"] for c in chunks}),
+            "files": _relative(documents, docs_dir),
+            "build_s": round(time.perf_counter() - start, 3),
+            "built_at": started_at,
+        }
+        meta["index_bytes"] = index_size(index_dir)
+        (index_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        return cls.load(index_dir)
+
+    @classmethod
+    def load(cls, index_dir: Path = INDEX_DIR) -> "LocalIndex":
+        meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+        embedder = make_embedder(meta["embedder"])
+        embedder.load(index_dir)
+        vectors = np.load(index_dir / "vectors.npy", mmap_mode="r")
+        with open(index_dir / "chunks.jsonl", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f if line.strip()]
+        return cls(vectors, chunks, embedder, meta)
+
+    def search(self, queries: Sequence[str], k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Top-k chunks for each query; all queries are scored together, block by block."""
+        start = time.perf_counter()
+        n = self.vectors.shape[0]
+        k = min(k, n)
+        if not queries or k == 0:
+            return [[] for _ in queries]
+        q = self.embedder.embed(list(queries)).T  # (dim, nq)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for offset in range(0, n, SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[offset:offset + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores = (block @ q).T  # (nq, rows)
+            ids = np.broadcast_to(np.arange(offset, offset + block.shape[0]), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_ids = np.concatenate([best_ids, ids], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for row in range(len(queries)):
+            hits = []
+            for col in order[row]:
+                chunk = self.chunks[int(best_ids[row, col])]
+                hits.append({**chunk, "score": round(float(best_scores[row, col]), 4)})
+            results.append(hits)
+        self.queries += len(queries)
+        self.query_time += time.perf_counter() - start
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **{key: self.meta.get(key) for key in ("embedder", "dim", "chunks", "documents", "build_s", "index_bytes")},
+            "queries": self.queries,
+            "query_ms_avg": round(self.query_time / self.queries * 1000, 3) if self.queries else 0.0,
+        }
+
+
+def index_size(index_dir: Path) -> int:
+    return sum(p.stat().st_size for p in index_dir.iterdir() if p.is_file())
+
+
+def _relative(paths: List[Path], docs_dir: Path) -> List[str]:
+    return [p.relative_to(docs_dir).as_posix() for p in paths]
+
+
+def is_stale(docs_dir: Path = RAG_DIR, index_dir: Path = INDEX_DIR) -> bool:
+    """A document was added, changed or deleted since the index was built."""
+    meta_path = index_dir / "meta.json"
+    if not meta_path.exists():
+        return True
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    documents = find_documents(docs_dir)
+    if meta.get("files") != _relative(documents, docs_dir):
+        return True  # also rebuilds indexes from before the file list was stored
+    return any(p.stat().st_mtime > meta.get("built_at", 0) for p in documents)
+
+
+_index: Optional[LocalIndex] = None
+
+
+def get_index() -> LocalIndex:
+    """Load the index (building or rebuilding it if documents changed) once per process."""
+    global _index
+    if _index is None:
+        if is_stale():
+            print(f"[rag] building local index from {RAG_DIR} ...")
+            _index = LocalIndex.build()
+            print(f"[rag] indexed {_index.meta['chunks']} chunks in {_index.meta['build_s']}s "
+                  f"({_index.meta['index_bytes'] / 1024:.0f} KiB)")
+        else:
+            _index = LocalIndex.load()
+    return _index
+
+
+def local_rag_stats() -> Optional[Dict[str, Any]]:
+    return _index.stats() if _index is not None else None
+
+
+def make_search_tool(max_num_results: int = 3):
+    """Function tool that exposes the local index to the agent (replaces FileSearchTool)."""
+    from agents import function_tool
+
+    @function_tool
+    async def search_project_docs(query: str) -> str:
+        """Search the Integration Project BioMed IoT App concept documents.
+
+        Args:
+            query: What to look for, phrased as a short question or keywords.
+        """
+        # Off the event loop: the query embedding may be an HTTP call (LOCAL_RAG_EMBEDDER=openai)
+        hits = (await asyncio.to_thread(lambda: get_index().search([query], k=max_num_results)))[0]
+        return json.dumps(hits, ensure_ascii=False)
+
+    return search_project_docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local RAG index over the documents in rag/")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="(re)build the index")
+    build.add_argument("--embedder", choices=sorted(EMBEDDERS), default=None)
+    query = sub.add_parser("query", help="search the index")
+    query.add_argument("text", nargs="+")
+    query.add_argument("-k", type=int, default=3)
+    bench = sub.add_parser("bench", help="report build time, index size and query latency")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = LocalIndex.build(embedder=make_embedder(args.embedder))
+        print(json.dumps(index.stats(), indent=2))
+    elif args.command == "query":
+        for hit in get_index().search([" ".join(args.text)], k=args.k)[0]:
+            print(f"[{hit['score']:.3f}] {hit['source']} p.{hit['page']}: {hit['text'][:200]}")
+    elif args.command == "bench":
+        index = LocalIndex.build()
+        samples = [c["text"][:80] for c in index.chunks] or ["iot"]
+        queries = [samples[i % len(samples)] for i in range(args.queries)]
+        latencies = []
+        for q in queries:
+            t = time.perf_counter()
+            index.search([q], k=3)
+            latencies.append((time.perf_counter() - t) * 1000)
+        latencies.sort()
+        t = time.perf_counter()
+        for start in range(0, len(queries), args.batch):
+            index.search(queries[start:start + args.batch], k=3)
+        batched_ms = (time.perf_counter() - t) * 1000 / len(queries)
+        print(json.dumps({
+            **index.stats(),
+            "query_ms_p50": round(latencies[len(latencies) // 2], 3),
+            "query_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            f"query_ms_per_query_batched_{args.batch}": round(batched_ms, 3),
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
 import asyncio
+import json
 import sys
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict, Optional, Set
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
 from dotenv import load_dotenv
 
 try:
-    from app.agent_cli_mcp import build_agent, sport_server, filesystem_server, sqlite_server
-    from agents import Runner
+    from app.agent_cli_mcp import MCP_SERVERS, MODEL, build_agent, cleanup_servers, make_agent, mcp_cache_stats, mcp_pool_stats, mcp_server_status, native_sqlite_stats, rag_stats, TOOL_SERVERS
+    from app import metrics
+    from app.admission import Overloaded, admission_from_env, rate_limiter_from_env
+    from app.deadlines import ABANDONED, DEADLINE, DISCONNECT, HEADER, Deadline, DeadlineExceeded, DeadlineHooks, deadlines_from_env
+    from app.fs_index import fs_index_stats
+    from app.mcp_supervisor import supervisor_from_env
+    from app.model_router import ESCALATED, STRONG, router_from_env
+    from app.metrics import MetricsHooks, RequestTimings, record_error, start_request
+    from app.response_cache import cache_from_env, is_cacheable, make_key
+    from app.singleflight import singleflight_from_env
+    from app.tool_selector import selector_from_env
+    from app.sessions import ConversationSession, store_from_env
+    from app.speech import MAX_SAMPLE_RATE, MIN_SAMPLE_RATE, SpeechFormatError, SpeechHeaderError, speech_from_env
+    from app.telemetry import BINARY_TYPE, TelemetryBusy, TelemetryFormatError, parse_binary, parse_jsonl, telemetry_from_env
+    from agents import RunHooks, Runner
 except Exception as e:
     print("Failed to import from agent_cli_mcp / agents:", e, file=sys.stderr)
     raise
@@ -17,28 +36,91 @@ load_dotenv()
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None  # keep server-side conversation history under this id
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+
+def _usage_dict(usage, session: Optional[ConversationSession] = None) -> Dict[str, int]:
+    data = {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+    if session is not None:
+        data["history_tokens"] = session.last_history_tokens
+        data["session_input_tokens_total"] = session.input_tokens_total
+        data["session_output_tokens_total"] = session.output_tokens_total
+    return data
+
+def _stage(timings: Optional[RequestTimings], name: str):
+    return timings.stage(name) if timings is not None else nullcontext()
+
+def _hooks(timings: Optional[RequestTimings], deadline: Optional[Deadline] = None,
+           tools_started: Optional[Set[str]] = None) -> Optional[RunHooks]:
+    hooks = MetricsHooks(timings, TOOL_SERVERS) if timings is not None else None
+    return DeadlineHooks(deadline, hooks, tools_started) if deadline is not None else hooks
+
+async def _watch_disconnect(request: Request, deadline: Deadline) -> None:
+    """Cancel the request once the client hangs up (the body is read, so receive() only reports that)."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    deadline.cancel(DISCONNECT)
+
+def _client_id(request: Request) -> str:
+    """Key for per-client rate limits: X-Client-Id if the caller sends one, else its address."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+def _overloaded(exception: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=exception.status_code,
+        detail=exception.reason,
+        headers={"Retry-After": str(exception.retry_after)},
+    )
 
 @asynccontextmanager
 async def lifespan(server: FastAPI):
     """Startup/shutdown lifecycle for connecting & cleaning up MCP servers."""
     server.state.agent = None
+    server.state.response_cache = cache_from_env()
+    server.state.sessions = store_from_env()
+    server.state.admission = admission_from_env()
+    server.state.deadlines = deadlines_from_env()
+    server.state.rate_limiter = rate_limiter_from_env()
+    server.state.singleflight = singleflight_from_env()
+    server.state.router = router_from_env(MODEL)
+    server.state.tool_selector = selector_from_env()
+    server.state.speech = speech_from_env()
+    server.state.telemetry = telemetry_from_env()
+    server.state.mcp_supervisor = None
     try:
-        agent = await build_agent()
+        if server.state.telemetry is not None:
+            await server.state.telemetry.start()
+        # Don't block startup on MCP servers: the model is usable right away and each
+        # server's tools join the agent once it is connected (see /health)
+        agent = await build_agent(wait=False)
         server.state.agent = agent
+        # Health-check the MCP servers, reconnect dead ones and swap in a rebuilt agent
+        # (one plain attribute assignment, so running requests keep the agent they started with)
+        supervisor = supervisor_from_env(
+            MCP_SERVERS, rebuild=make_agent, publish=lambda new_agent: setattr(server.state, "agent", new_agent)
+        )
+        if supervisor is not None:
+            supervisor.start()
+            server.state.mcp_supervisor = supervisor
         yield
     finally:
         # Graceful cleanup of any MCP servers started inside build_agent()
         try:
-            for server in (sport_server, sqlite_server, filesystem_server):
-                if server is not None:
-                    try:
-                        await asyncio.wait_for(server.cleanup(), timeout=5)
-                    except Exception as exception:
-                        print(f"[mcp] cleanup error: {exception}", file=sys.stderr)
-            print("[mcp] disconnected")
+            if server.state.mcp_supervisor is not None:
+                await server.state.mcp_supervisor.stop()
+            await cleanup_servers()
+            server.state.response_cache.close()
+            if server.state.telemetry is not None:
+                await server.state.telemetry.close()
         except Exception as exception:
             print(f"[shutdown] error: {exception}", file=sys.stderr)
 
@@ -50,18 +132,554 @@ app = FastAPI(
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    agent_ready = getattr(app.state, "agent", None) is not None
+    return {"status": "ok" if agent_ready else "starting", "servers": mcp_server_status()}
+
+@app.get("/stats")
+async def stats():
+    return {
+        "mcp_pools": mcp_pool_stats(),
+        "mcp_cache": mcp_cache_stats(),
+        "sqlite_native": native_sqlite_stats(),
+        "mcp_supervisor": app.state.mcp_supervisor.stats() if app.state.mcp_supervisor else None,
+        "model_routing": app.state.router.stats(),
+        "tool_selection": app.state.tool_selector.stats(),
+        "speech": app.state.speech.stats(),
+        "telemetry": app.state.telemetry.stats() if app.state.telemetry else None,
+        "response_cache": app.state.response_cache.stats(),
+        "sessions": app.state.sessions.stats(),
+        "coalescing": app.state.singleflight.stats(),
+        "admission": {**app.state.admission.stats(), "client_rate_limit": app.state.rate_limiter.stats()},
+        "deadlines": app.state.deadlines.stats(),
+        "local_rag": rag_stats(),
+        "fs_index": fs_index_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request/stage/tool/MCP latency histograms, token and error counters."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="metrics are disabled (METRICS_ENABLED=0)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = app.state.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="unknown session")
+    return session.stats()
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not app.state.sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="unknown session")
+    return {"deleted": session_id}
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request, response: Response):
     if not req.message or not req.message.strip():
         raise HTTPException(status_code=400, detail="message must be non-empty")
     agent = getattr(app.state, "agent", None)
     if agent is None:
         raise HTTPException(status_code=503, detail="agent is not ready")
+    message = req.message.strip()
+    timings = start_request("/chat")
+    status = 200
+    # Give up (and stop the agent run) when the client's deadline passes or it disconnects
+    deadline = app.state.deadlines.start(request.headers.get(HEADER))
+    task = asyncio.current_task()
+    deadline.arm(task.cancel)
+    watcher = asyncio.create_task(_watch_disconnect(request, deadline))
+    try:
+        try:
+            app.state.rate_limiter.check(_client_id(request))
+        except Overloaded as exception:
+            raise _overloaded(exception)
+        try:
+            if req.session_id:
+                session = app.state.sessions.get_or_create(req.session_id)
+                async with session.lock:
+                    return await _chat_turn(agent, message, response, session, timings, deadline)
+            return await _chat_turn(agent, message, response, timings=timings, deadline=deadline)
+        except asyncio.CancelledError:
+            if deadline.reason is None or task.uncancel() > 0:
+                raise  # shutdown, not ours
+            if not deadline.coalesced:
+                app.state.deadlines.record_cancelled(deadline, "/chat")
+            if deadline.reason == DISCONNECT:
+                status = 499  # nobody is left to read it
+                return Response(status_code=status)
+            raise HTTPException(status_code=504, detail=str(deadline.error()))
+    except HTTPException as exception:
+        status = exception.status_code
+        raise
+    finally:
+        deadline.disarm()
+        watcher.cancel()
+        if timings is not None:
+            # Breakdown of this request, e.g. "model;dur=812.4;desc="2 calls", mcp.sqlite;dur=31.0, total;dur=850.2"
+            response.headers["Server-Timing"] = timings.server_timing()
+            timings.finish(status)
+
+async def _chat_turn(
+    agent,
+    message: str,
+    response: Response,
+    session: Optional[ConversationSession] = None,
+    timings: Optional[RequestTimings] = None,
+    deadline: Optional[Deadline] = None,
+) -> ChatResponse:
+    sessions = app.state.sessions
+    session_id = session.id if session is not None else None
+    if deadline is None:
+        deadline = app.state.deadlines.start()
+
+    # Repeated questions (e.g. about the concept PDF) are answered from the response cache.
+    # With earlier turns in the session the answer depends on context, so skip the cache then.
+    cache = app.state.response_cache
+    fresh = session is None or not (session.turns or session.summary_lines)
+    key = make_key(agent, message) if fresh else None
+    cache_key = key if cache.enabled else None
+    if cache_key is not None:
+        with _stage(timings, "cache"):
+            cached = cache.get(cache_key)
+        if cached is not None:
+            response.headers["X-Cache"] = "hit"
+            if session is not None:
+                sessions.record(session, message, cached)
+            return ChatResponse(reply=cached, session_id=session_id)
+        response.headers["X-Cache"] = "miss"
+
+    with _stage(timings, "session"):
+        run_input = sessions.build_input(session, message) if session is not None else message
+    # Only the tool groups the conversation is about; fewer schemas in every model turn
+    selector = app.state.tool_selector
+    groups = selector.select(message, session.turns if session is not None else ())
+    response.headers["X-Tool-Groups"] = selector.label(groups)
+    selected = selector.agent_for(agent, groups)
+
+    async def run_agent(run_deadline: Deadline):
+        # Bounded concurrency: wait in the queue for a slot or get a fast 503
+        async with app.state.admission.slot(run_deadline.budget("queue")) as waited:
+            if timings is not None and waited:
+                timings.add("queue", waited)
+            with _stage(timings, "agent"):
+                # Fast or strong model per request; a failed fast run is retried on the strong one
+                return await app.state.router.run(
+                    selected,
+                    message,
+                    lambda variant, max_turns, tools: Runner.run(
+                        variant, run_input, hooks=_hooks(timings, run_deadline, tools), max_turns=max_turns
+                    ),
+                )
+
+    async def shared_run(run_deadline: Deadline):
+        # The run outlives the request that started it, so it accounts for its own cancellation
+        try:
+            return await run_agent(run_deadline)
+        except asyncio.CancelledError:
+            run_deadline.reason = run_deadline.reason or ABANDONED
+            app.state.deadlines.record_cancelled(run_deadline, "/chat")
+            raise
+
+    # Identical questions arriving at the same time share one agent run (same key as the cache);
+    # its deadline and budgets belong to the run and last as long as its latest waiter's
+    flights = app.state.singleflight
+    shared = False
     try:
-        result = await Runner.run(agent, req.message.strip())
+        if key is not None and flights.enabled:
+            with _stage(timings, "coalesced") if flights.in_flight(key) else nullcontext():
+                (result, tier, route), shared = await flights.do(key, shared_run, deadline)
+            response.headers["X-Coalesced"] = "follower" if shared else "leader"
+        else:
+            result, tier, route = await run_agent(deadline)
+        response.headers["X-Model-Tier"] = tier
+        response.headers["X-Route-Reason"] = route
         reply = result.final_output or ""
-        return ChatResponse(reply=reply)
+    except Overloaded as exception:
+        raise _overloaded(exception)
+    except DeadlineExceeded as exception:
+        raise HTTPException(status_code=504, detail=str(exception))
+    except Exception as exception:
+        record_error("/chat", "agent")
+        raise HTTPException(status_code=500, detail=f"Agent error: {exception}")
+
+    usage = result.context_wrapper.usage
+    if not shared:
+        selector.record(groups, usage)
+        app.state.deadlines.completed(usage)
+    if session is not None:
+        with _stage(timings, "session"):
+            # Tokens of a shared run are only charged to the session that started it
+            sessions.record(session, message, str(reply), None if shared else usage)
+    if cache_key is not None and reply and not shared:
+        # Never replay answers that wrote files / rows or used non-deterministic tools
+        if is_cacheable(result):
+            cache.put(cache_key, reply)
+        else:
+            cache.skipped += 1
+    return ChatResponse(reply=reply, session_id=session_id, usage=_usage_dict(usage, session))
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _tool_info(raw_item: Any) -> Dict[str, Any]:
+    """Describe a tool call item: tool name, owning server and call id."""
+    if isinstance(raw_item, dict):
+        get = raw_item.get
+    else:
+        get = lambda key: getattr(raw_item, key, None)
+    if get("type") == "file_search_call":
+        return {"tool": "file_search", "server": "openai_file_search", "call_id": get("id")}
+    name = get("name") or get("type") or "tool"
+    return {"tool": name, "server": TOOL_SERVERS.get(name, "local"), "call_id": get("call_id") or get("id")}
+
+async def _stream_events(agent, message: str, session: Optional[ConversationSession], release, queued_s: float, **options):
+    """Run the agent in streaming mode and translate SDK events to SSE frames."""
+    try:
+        if session is not None:
+            # One turn at a time per session; held until the stream is finished
+            async with session.lock:
+                async for frame in _stream_run(agent, message, session, queued_s, **options):
+                    yield frame
+        else:
+            async for frame in _stream_run(agent, message, None, queued_s, **options):
+                yield frame
+    finally:
+        release()
+
+async def _stream_until(result, stop: asyncio.Event):
+    """result.stream_events() until `stop` is set, then cancel the run. result.cancel() alone
+    doesn't wake a consumer that is already waiting for the next event, so every wait is raced
+    against `stop`."""
+    events = result.stream_events()
+    stopped = asyncio.ensure_future(stop.wait())
+    following = None
+    try:
+        while True:
+            following = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait((following, stopped), return_when=asyncio.FIRST_COMPLETED)
+            if not following.done():
+                result.cancel()
+                return
+            try:
+                event = following.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        stopped.cancel()
+        if following is not None and not following.done():
+            following.cancel()  # stream_events() ends quietly on that
+            await asyncio.gather(following, return_exceptions=True)
+        await events.aclose()
+
+async def _stream_run(
+    agent,
+    message: str,
+    session: Optional[ConversationSession] = None,
+    queued_s: float = 0.0,
+    endpoint: str = "/chat/stream",
+    started: Optional[float] = None,
+    stages: Optional[Dict[str, float]] = None,
+    deadline: Optional[Deadline] = None,
+):
+    """`started`/`stages` carry work done before the run (e.g. the speech upload) into its timings."""
+    sessions = app.state.sessions
+    deadlines = app.state.deadlines
+    if deadline is None:
+        deadline = deadlines.start()
+    router = app.state.router
+    timings = start_request(endpoint, started)
+    if timings is not None:
+        for name, seconds in (stages or {}).items():
+            timings.add(name, seconds)
+        if queued_s:
+            timings.add("queue", queued_s)
+    status = 200
+    run_input = sessions.build_input(session, message) if session is not None else message
+    tier, route = router.route(message)
+    router.record_route(tier, route)
+    served = tier
+    selector = app.state.tool_selector
+    groups = selector.select(message, session.turns if session is not None else ())
+    agent = selector.agent_for(agent, groups)
+    result = None
+    first_token = True
+    stop = asyncio.Event()
+    deadline.arm(stop.set)
+    try:
+        while True:
+            if deadline.reason is not None:
+                raise deadline.error()
+            result = Runner.run_streamed(
+                router.agent_for(agent, tier), run_input, hooks=_hooks(timings, deadline), max_turns=router.max_turns(tier)
+            )
+            run_start = time.perf_counter()
+            open_tools: Dict[str, Dict[str, Any]] = {}
+            failure = None
+            try:
+                async for event in _stream_until(result, stop):
+                    if event.type == "raw_response_event":
+                        if event.data.type == "response.output_text.delta" and event.data.delta:
+                            if first_token and timings is not None:
+                                timings.add("first_token", timings.elapsed())
+                            first_token = False
+                            yield _sse("delta", {"text": event.data.delta})
+                    elif event.type == "run_item_stream_event":
+                        if event.name == "tool_called":
+                            info = _tool_info(event.item.raw_item)
+                            yield _sse("tool_start", info)
+                            if info["server"] == "openai_file_search":
+                                # Hosted tool: the search already ran inside the model turn
+                                yield _sse("tool_end", info)
+                            else:
+                                open_tools[info["call_id"]] = {**info, "started": time.perf_counter()}
+                        elif event.name == "tool_output":
+                            call_id = _tool_info(event.item.raw_item)["call_id"]
+                            info = open_tools.pop(call_id, {"tool": "tool", "server": "local", "call_id": call_id})
+                            begin = info.pop("started", None)
+                            if begin is not None:
+                                info["elapsed_ms"] = round((time.perf_counter() - begin) * 1000, 1)
+                            yield _sse("tool_end", info)
+            except Exception as exception:
+                if deadline.reason is not None:
+                    raise deadline.error() from exception
+                router.record(tier, time.perf_counter() - run_start, result.context_wrapper.usage, error=True)
+                # Escalate only while no answer text has reached the client
+                if not first_token or not router.can_escalate(tier, result):
+                    raise
+                failure = type(exception).__name__
+            else:
+                if deadline.reason is not None:
+                    raise deadline.error()  # the run was cancelled mid-stream
+                if asyncio.current_task().cancelling():
+                    raise asyncio.CancelledError  # client gone: stream_events() swallows that and just stops
+                router.record(tier, time.perf_counter() - run_start, result.context_wrapper.usage)
+                if not result.final_output and first_token and router.can_escalate(tier, result):
+                    failure = "empty_output"
+            if failure is None:
+                break
+            router.record_escalation(failure)
+            yield _sse("escalated", {"from": tier, "to": STRONG, "reason": failure})
+            tier, served = STRONG, ESCALATED
+        usage = result.context_wrapper.usage
+        selector.record(groups, usage)
+        deadlines.completed(usage)
+        reply = str(result.final_output or "")
+        if session is not None:
+            sessions.record(session, message, reply, usage)
+        yield _sse("usage", _usage_dict(usage, session))
+        done: Dict[str, Any] = {
+            "reply": reply,
+            "session_id": session.id if session is not None else None,
+            "model_tier": served,
+            "tool_groups": selector.label(groups),
+        }
+        if timings is not None:
+            # Headers are gone by now, so the Server-Timing breakdown travels in the last event
+            done["timing_ms"] = timings.breakdown()
+        yield _sse("done", done)
+    except asyncio.CancelledError:
+        status = 499
+        raise
+    except DeadlineExceeded as exception:
+        status = 504
+        yield _sse("error", {"detail": str(exception), "reason": exception.reason})
+    except Exception as exception:
+        status = 500
+        record_error(endpoint, "agent")
+        yield _sse("error", {"detail": f"Agent error: {exception}"})
+    finally:
+        deadline.disarm()
+        # Client went away or the run failed: stop remaining model turns / tool calls
+        if result is not None and not result.is_complete:
+            result.cancel()
+            if status == 200:
+                status = 499  # client closed the connection
+        if status == 499:
+            deadline.reason = deadline.reason or DISCONNECT
+        if deadline.reason is not None:
+            deadlines.record_cancelled(deadline, endpoint)
+        if timings is not None:
+            timings.finish(status)
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """Same as /chat, but streams text deltas, tool events and usage as Server-Sent Events."""
+    if not req.message or not req.message.strip():
+        raise HTTPException(status_code=400, detail="message must be non-empty")
+    agent = getattr(app.state, "agent", None)
+    if agent is None:
+        raise HTTPException(status_code=503, detail="agent is not ready")
+    # Admission happens before the response starts, so rejections are still plain 429/503s
+    admission = app.state.admission
+    deadline = app.state.deadlines.start(request.headers.get(HEADER))
+    try:
+        app.state.rate_limiter.check(_client_id(request))
+        queued_s = await admission.acquire(deadline.budget("queue"))
+    except Overloaded as exception:
+        raise _overloaded(exception)
+    started = time.perf_counter()
+    released = False
+
+    def release() -> None:
+        # Called when the stream ends and again as a background task (covers streams that never start)
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(started)
+
+    session = app.state.sessions.get_or_create(req.session_id) if req.session_id else None
+    return StreamingResponse(
+        _stream_events(agent, req.message.strip(), session, release, queued_s, deadline=deadline),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+async def _speech_events(info: Dict[str, Any], agent, message: str, session: Optional[ConversationSession], release, queued_s: float, **options):
+    yield _sse("transcript", info)
+    async for frame in _stream_events(agent, message, session, release, queued_s, **options):
+        yield frame
+
+@app.post("/chat/speech")
+async def chat_speech(request: Request, sample_rate: int = 16000, session_id: Optional[str] = None):
+    """Chunked audio upload (16-bit mono PCM or a WAV file) in, streamed agent reply (SSE) out.
+
+    The body is processed while it arrives: VAD and transcription of finished segments overlap the
+    upload, and the agent run starts as soon as the end of speech is detected - the rest of the
+    upload is not waited for. Events: transcript (text + per-stage timing), then as /chat/stream.
+    """
+    started = time.perf_counter()
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise HTTPException(status_code=400, detail=f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+    agent = getattr(app.state, "agent", None)
+    if agent is None:
+        raise HTTPException(status_code=503, detail="agent is not ready")
+    try:
+        app.state.rate_limiter.check(_client_id(request))
+    except Overloaded as exception:
+        raise _overloaded(exception)
+    # The upload counts against the client's deadline too
+    deadline = app.state.deadlines.start(request.headers.get(HEADER))
+    speech = app.state.speech
+    pipeline = speech.pipeline(sample_rate, request.headers.get("x-speech-text"))
+    try:
+        transcript = await asyncio.wait_for(pipeline.listen(request.stream()), deadline.remaining())
+    except TimeoutError:
+        deadline.reason = DEADLINE
+        app.state.deadlines.record_cancelled(deadline, "/chat/speech")
+        raise HTTPException(status_code=504, detail=str(deadline.error()))
+    except SpeechHeaderError as exception:
+        raise HTTPException(status_code=400, detail=str(exception))
+    except SpeechFormatError as exception:
+        raise HTTPException(status_code=415, detail=str(exception))
+    except ClientDisconnect:
+        record_error("/chat/speech", "upload")
+        return Response(status_code=499)
     except Exception as exception:
-        raise HTTPException(status_code=500, detail=f"Agent error: {exception}")
\ No newline at end of file
+        record_error("/chat/speech", "transcribe")
+        raise HTTPException(status_code=502, detail=f"Transcription error: {exception}")
+    speech.record(pipeline, transcript)
+    if not transcript:
+        raise HTTPException(status_code=422, detail="no speech detected")
+
+    admission = app.state.admission
+    try:
+        queued_s = await admission.acquire(deadline.budget("queue"))
+    except Overloaded as exception:
+        raise _overloaded(exception)
+    run_started = time.perf_counter()
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(run_started)
+
+    stages = pipeline.stages()
+    session = app.state.sessions.get_or_create(session_id) if session_id else None
+    return StreamingResponse(
+        _speech_events(
+            {"text": transcript, **pipeline.info()}, agent, transcript, session, release, queued_s,
+            endpoint="/chat/speech", started=started, stages=stages, deadline=deadline,
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()),
+        },
+        background=BackgroundTask(release),
+    )
+
+def _telemetry_writer():
+    writer = getattr(app.state, "telemetry", None)
+    if writer is None:
+        raise HTTPException(status_code=404, detail="telemetry ingestion is disabled (set TELEMETRY=1)")
+    return writer
+
+@app.post("/telemetry")
+async def ingest_telemetry(request: Request, response: Response, wait: bool = True):
+    """Batched sensor readings (JSON lines or application/x-biot-telemetry) into SQLite.
+
+    With wait=true the reply comes after the group commit that wrote the batch; wait=false
+    answers 202 as soon as the batch is queued.
+    """
+    writer = _telemetry_writer()
+    if int(request.headers.get("content-length") or 0) > writer.max_body_bytes:
+        raise HTTPException(status_code=413, detail=f"telemetry batches are limited to {writer.max_body_bytes} bytes")
+    timings = start_request("/telemetry")
+    status = 200
+    try:
+        body = await request.body()
+        if len(body) > writer.max_body_bytes:
+            status = 413
+            raise HTTPException(status_code=413, detail=f"telemetry batches are limited to {writer.max_body_bytes} bytes")
+        binary = request.headers.get("content-type", "").split(";")[0].strip().lower() == BINARY_TYPE
+        parse = parse_binary if binary else parse_jsonl
+        with _stage(timings, "parse"):
+            try:
+                # Large bodies are parsed off the event loop
+                readings, rejected, errors = await asyncio.to_thread(parse, body) if len(body) > 65536 else parse(body)
+            except TelemetryFormatError as exception:
+                status = 400
+                raise HTTPException(status_code=400, detail=str(exception))
+        writer.record_rejected(rejected)
+        if not readings:
+            status = 400
+            raise HTTPException(status_code=400, detail={"message": "no valid readings", "rejected": rejected, "errors": errors})
+        try:
+            committed = writer.submit(readings)
+        except TelemetryBusy as exception:
+            status = 503
+            raise HTTPException(status_code=503, detail=str(exception), headers={"Retry-After": "1"})
+        if not wait:
+            status = response.status_code = 202
+            return {"queued": len(readings), "rejected": rejected, "errors": errors}
+        with _stage(timings, "commit"):
+            try:
+                written = await committed
+            except Exception as exception:
+                status = 500
+                record_error("/telemetry", "write")
+                raise HTTPException(status_code=500, detail=f"Telemetry write failed: {exception}")
+        return {"written": written, "rejected": rejected + len(readings) - written, "errors": errors}
+    finally:
+        if timings is not None:
+            response.headers["Server-Timing"] = timings.server_timing()
+            timings.finish(status)
+
+@app.get("/telemetry/{device_id}")
+async def telemetry_series(device_id: str, metric: Optional[str] = None, resolution: str = "minute",
+                           since: float = 0.0, limit: int = 500):
+    """Newest-first minute/hour aggregates (count, avg, min, max) or raw readings of one device."""
+    writer = _telemetry_writer()
+    try:
+        rows = await writer.series(device_id, metric, resolution, since, max(1, min(limit, 10000)))
+    except ValueError as exception:
+        raise HTTPException(status_code=400, detail=str(exception))
+    return {"device_id": device_id, "resolution": resolution, "rows": rows}
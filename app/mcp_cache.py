@@ -0,0 +1,233 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.mcp import MCPServer
+
+from app import metrics
+from app.mcp_pool import call_tool_cancellable, ping_server
+
+# Arguments of the filesystem server that name files or directories
+PATH_ARGS = ("path", "paths", "source", "destination")
+
+
+class CachePolicy:
+    """Decides which tool results may be cached and when they go stale."""
+
+    read_only: frozenset = frozenset()
+
+    def signature(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """Cheap local fingerprint of the data a call reads; the entry is stale once it changes."""
+        return None
+
+    def max_age(self, tool_name: str) -> Optional[float]:
+        return None
+
+    def paths(self, arguments: Dict[str, Any]) -> List[str]:
+        return []
+
+
+class FilesystemPolicy(CachePolicy):
+    """Filesystem MCP: entries are keyed to the mtime/size of every path the call touched."""
+
+    read_only = frozenset({
+        "read_file", "read_text_file", "read_media_file", "read_multiple_files",
+        "list_directory", "list_directory_with_sizes", "directory_tree",
+        "search_files", "get_file_info", "list_allowed_directories",
+    })
+    # A directory's mtime only changes with its direct entries, so results over a whole
+    # subtree are additionally limited in age
+    recursive = frozenset({"directory_tree", "search_files"})
+
+    def __init__(self, recursive_ttl: float = 5.0):
+        self.recursive_ttl = recursive_ttl
+
+    def paths(self, arguments: Dict[str, Any]) -> List[str]:
+        found: List[str] = []
+        for key in PATH_ARGS:
+            value = arguments.get(key)
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, str) and item:
+                    found.append(os.path.abspath(os.path.expanduser(item)))
+        return found
+
+    def signature(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        stamps = []
+        for path in self.paths(arguments):
+            try:
+                st = os.stat(path)
+                stamps.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append((path, None, None))  # missing now; creating it changes the signature
+        return tuple(stamps)
+
+    def max_age(self, tool_name: str) -> Optional[float]:
+        return self.recursive_ttl if tool_name in self.recursive else None
+
+
+class SqlitePolicy(CachePolicy):
+    """SQLite MCP: entries are keyed to the database's change counter.
+
+    `PRAGMA data_version` on our own read-only connection changes whenever another connection
+    (such as the MCP server process) commits, in rollback-journal and WAL mode alike.
+    """
+
+    read_only = frozenset({"read_query", "list_tables", "describe_table"})
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _version(self) -> Optional[int]:
+        if self._conn is None:
+            if not self.db_path.exists():
+                return None
+            self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def signature(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        try:
+            version = self._version()
+        except sqlite3.Error:
+            version = None
+        # data_version is per connection and only meaningful while it stays open; the file
+        # stats also catch a database file that was replaced
+        try:
+            st = os.stat(self.db_path)
+            file_stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            file_stamp = None
+        return (version, file_stamp)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class CachingMCPServer(MCPServer):
+    """Caches results of read-only tools of the wrapped MCP server (LRU, keyed by tool + arguments).
+
+    Tools count as read-only if the policy lists them or the server annotates them with
+    readOnlyHint. Before a cached result is returned, the policy's signature (file mtimes, DB
+    change counter) is compared with the one recorded when it was stored. Any other tool is
+    treated as a write: its call flushes the entries it may affect (for the filesystem, those
+    on the written path, its parent and ancestors; everything otherwise).
+    """
+
+    def __init__(self, server: MCPServer, policy: CachePolicy, max_entries: int = 256):
+        super().__init__(use_structured_content=server.use_structured_content)
+        self.inner = server
+        self.policy = policy
+        self.max_entries = max_entries
+        self._annotated_read_only: set = set()
+        # key -> (signature, created, paths, result)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float, List[str], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.flushed = 0
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    async def connect(self):
+        await self.inner.connect()
+
+    async def cleanup(self):
+        self._entries.clear()
+        await self.inner.cleanup()
+        close = getattr(self.policy, "close", None)
+        if close is not None:
+            close()
+
+    async def ping(self) -> None:
+        await ping_server(self.inner)
+
+    async def list_tools(self, run_context=None, agent=None):
+        tools = await self.inner.list_tools(run_context, agent)
+        self._annotated_read_only = {
+            t.name for t in tools if getattr(getattr(t, "annotations", None), "readOnlyHint", False)
+        }
+        return tools
+
+    def is_read_only(self, tool_name: str) -> bool:
+        return tool_name in self.policy.read_only or tool_name in self._annotated_read_only
+
+    def _count(self, result: str) -> None:
+        if metrics.METRICS_ENABLED:
+            metrics.MCP_CACHE.inc(1, self.name, result)
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]):
+        arguments = arguments or {}
+        if not self.is_read_only(tool_name):
+            try:
+                return await call_tool_cancellable(self.inner, tool_name, arguments)
+            finally:
+                self.flush(self.policy.paths(arguments))
+
+        key = (tool_name, json.dumps(arguments, sort_keys=True, default=str))
+        signature = self.policy.signature(tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            cached_signature, created, _, result = entry
+            max_age = self.policy.max_age(tool_name)
+            if cached_signature == signature and (max_age is None or time.monotonic() - created <= max_age):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._count("hit")
+                return result
+            del self._entries[key]
+            self.stale += 1
+            self._count("stale")
+        else:
+            self.misses += 1
+            self._count("miss")
+
+        result = await call_tool_cancellable(self.inner, tool_name, arguments)
+        if not getattr(result, "isError", False):
+            self._entries[key] = (signature, time.monotonic(), self.policy.paths(arguments), result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def flush(self, paths: Optional[List[str]] = None) -> None:
+        """Drop entries a write may have changed: those related to `paths`, or all of them."""
+        if not paths:
+            self.flushed += len(self._entries)
+            self._entries.clear()
+            return
+        touched = set(paths) | {os.path.dirname(p) for p in paths}
+
+        def affected(entry_paths: List[str]) -> bool:
+            # Same path, its parent listing, or an ancestor listing (recursive tools)
+            return not entry_paths or any(
+                p in touched or any(t.startswith(p.rstrip(os.sep) + os.sep) for t in touched) for p in entry_paths
+            )
+
+        for key in [k for k, e in self._entries.items() if affected(e[2])]:
+            del self._entries[key]
+            self.flushed += 1
+
+    async def list_prompts(self):
+        return await self.inner.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        return await self.inner.get_prompt(name, arguments)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "flushed": self.flushed,
+        }
@@ -0,0 +1,303 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from agents.mcp import MCPServer
+from mcp import ClientSession
+from mcp.types import CancelledNotification, CancelledNotificationParams, ClientNotification, InitializeRequest
+
+STRATEGIES = ("least_busy", "round_robin")
+
+
+async def ping_server(server: MCPServer) -> None:
+    """MCP ping through any wrapper: wrappers implement ping(), SDK clients answer via their session."""
+    ping = getattr(server, "ping", None)
+    if ping is not None:
+        await ping()
+        return
+    session = getattr(server, "session", None)
+    if session is None:
+        raise ConnectionError(f"MCP server {server.name} is not connected")
+    await session.send_ping()
+
+
+def _cancel_on_server(session: ClientSession, request_id: int) -> None:
+    notice = ClientNotification(CancelledNotification(
+        params=CancelledNotificationParams(requestId=request_id, reason="request cancelled")
+    ))
+    # The requesting task is being cancelled, so send from a task of its own
+    task = asyncio.ensure_future(session.send_notification(notice))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+def _track_requests(session: ClientSession) -> None:
+    """Wrap session.send_request so that a cancelled request is cancelled on the server too.
+
+    Relies on mcp's BaseSession (1.21): send_request numbers each request from `_request_id`
+    before its first await. Reading the id inside the wrapper covers every request actually
+    sent, including the Agents SDK's retries of a failed call_tool (max_retry_attempts)."""
+    send = session.send_request
+    if getattr(send, "cancels_on_server", False) or not isinstance(getattr(session, "_request_id", None), int):
+        return
+
+    async def send_request(request, *args, **kwargs):
+        request_id = session._request_id
+        try:
+            return await send(request, *args, **kwargs)
+        except asyncio.CancelledError:
+            # The spec forbids cancelling initialize; an id that was never sent has nothing to cancel
+            if session._request_id > request_id and not isinstance(getattr(request, "root", request), InitializeRequest):
+                _cancel_on_server(session, request_id)
+            raise
+
+    send_request.cancels_on_server = True
+    session.send_request = send_request
+
+
+async def call_tool_cancellable(server: MCPServer, tool_name: str, arguments: Optional[Dict[str, Any]]):
+    """server.call_tool, but when the caller is cancelled (deadline, client gone) the MCP server
+    is told to stop the request as well; the SDK client only stops waiting for the response."""
+    session = getattr(server, "session", None)
+    if isinstance(session, ClientSession):
+        _track_requests(session)
+    return await server.call_tool(tool_name, arguments)
+
+
+class SessionTask:
+    """Owns one MCP server session inside a dedicated background task.
+
+    The MCP stdio/HTTP clients are anyio context managers that must be entered and exited
+    by the same task. Running connect() and cleanup() in one long-lived task lets us start
+    many sessions concurrently and shut them down from anywhere.
+    """
+
+    def __init__(self, server: MCPServer):
+        self.server = server
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._stop = asyncio.Event()
+        self._aborted = False
+        self.connected = False
+
+    async def start(self) -> None:
+        """Connect the server; returns once the session is usable, raises if connecting failed."""
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session:{self.server.name}")
+        try:
+            await asyncio.shield(self._ready)
+        except asyncio.CancelledError:
+            # Startup deadline hit: abort the half-open connection inside its own task
+            self._aborted = True
+            self._task.cancel()
+            raise
+
+    async def _run(self) -> None:
+        try:
+            await self.server.connect()
+        except BaseException as exception:
+            if isinstance(exception, asyncio.CancelledError) and not self._aborted:
+                # The MCP HTTP client reports e.g. "connection refused" as a cancelled
+                # cancel scope; turn it into a normal connection error
+                task = asyncio.current_task()
+                while task is not None and task.cancelling():
+                    task.uncancel()
+                exception = ConnectionError(f"could not connect to MCP server {self.server.name}")
+            if not self._ready.done():
+                if isinstance(exception, asyncio.CancelledError):
+                    self._ready.cancel()
+                else:
+                    self._ready.set_exception(exception)
+            await self._safe_cleanup()
+            return
+        self.connected = True
+        self._ready.set_result(None)
+        try:
+            await self._stop.wait()
+        finally:
+            self.connected = False
+            await self._safe_cleanup()
+
+    async def _safe_cleanup(self) -> None:
+        try:
+            await self.server.cleanup()
+        except BaseException:
+            pass
+
+    async def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+
+
+class _PoolMember:
+    def __init__(self, session: SessionTask):
+        self.session = session
+        self.inflight = 0
+        self.calls = 0
+
+
+class MCPServerPool(MCPServer):
+    """N identical MCP sessions (e.g. N npx subprocesses) behind a single MCPServer.
+
+    Tool calls are dispatched to the least busy session (or round robin); each session
+    accepts at most `max_inflight` concurrent calls, further calls wait in a queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], MCPServer],
+        size: int = 1,
+        max_inflight: int = 4,
+        strategy: str = "least_busy",
+    ):
+        super().__init__()
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown pool strategy {strategy!r}, expected one of {STRATEGIES}")
+        self._name = name
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_inflight = max(1, max_inflight)
+        self.strategy = strategy
+        self.members: List[_PoolMember] = []
+        self._cond = asyncio.Condition()
+        self._next = 0
+        self._tools: Optional[list] = None
+        # queue metrics
+        self.calls = 0
+        self.queued_calls = 0
+        self.waiting = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.replaced = 0  # sessions restarted after failing a ping
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def _start_sessions(self, count: int) -> List[BaseException]:
+        sessions = [SessionTask(self.factory()) for _ in range(count)]
+        results = await asyncio.gather(*(s.start() for s in sessions), return_exceptions=True)
+        started = [_PoolMember(s) for s, r in zip(sessions, results) if not isinstance(r, BaseException)]
+        if started:
+            async with self._cond:
+                self.members = self.members + started
+                self._cond.notify_all()
+        return [r for r in results if isinstance(r, BaseException)]
+
+    async def connect(self):
+        errors = await self._start_sessions(self.size)
+        if not self.members:
+            raise errors[0]
+        if errors:
+            print(f"[mcp] pool {self.name}: {len(errors)} of {self.size} sessions failed to start: {errors[0]}")
+
+    async def ping(self, timeout: float = 5) -> None:
+        """Ping every session and restart the ones that stopped answering (e.g. a crashed npx process).
+
+        Raises only if no session is left, so one dead subprocess never takes the whole server down.
+        """
+        members = list(self.members)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(ping_server(m.session.server), timeout) for m in members), return_exceptions=True
+        )
+        dead = [m for m, r in zip(members, results) if isinstance(r, BaseException) or not m.session.connected]
+        if dead:
+            self.members = [m for m in self.members if m not in dead]
+            await asyncio.gather(*(m.session.stop() for m in dead), return_exceptions=True)
+            self.replaced += len(dead)
+            print(f"[mcp] pool {self.name}: restarting {len(dead)} unresponsive session(s)")
+        missing = self.size - len(self.members)
+        if missing > 0:
+            errors = await self._start_sessions(missing)
+            if errors and not self.members:
+                raise ConnectionError(f"MCP pool {self.name} has no live sessions: {errors[0]}")
+
+    async def cleanup(self):
+        members, self.members = self.members, []
+        await asyncio.gather(*(m.session.stop() for m in members), return_exceptions=True)
+
+    def _pick(self) -> Optional[_PoolMember]:
+        available = [m for m in self.members if m.inflight < self.max_inflight]
+        if not available:
+            return None
+        if self.strategy == "round_robin":
+            for offset in range(len(self.members)):
+                member = self.members[(self._next + offset) % len(self.members)]
+                if member.inflight < self.max_inflight:
+                    self._next = (self._next + offset + 1) % len(self.members)
+                    return member
+        return min(available, key=lambda m: (m.inflight, m.calls))
+
+    async def _acquire(self) -> _PoolMember:
+        if not self.members:
+            raise RuntimeError(f"MCP pool {self.name} has no connected sessions")
+        start = time.perf_counter()
+        async with self._cond:
+            member = self._pick()
+            if member is None:
+                self.queued_calls += 1
+                self.waiting += 1
+                try:
+                    while member is None:
+                        await self._cond.wait()
+                        member = self._pick()
+                finally:
+                    self.waiting -= 1
+            member.inflight += 1
+            member.calls += 1
+            self.calls += 1
+        waited = time.perf_counter() - start
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        return member
+
+    async def _release(self, member: _PoolMember) -> None:
+        async with self._cond:
+            member.inflight -= 1
+            self._cond.notify()
+
+    async def list_tools(self, run_context=None, agent=None):
+        if self._tools is None:
+            member = await self._acquire()
+            try:
+                self._tools = await member.session.server.list_tools(run_context, agent)
+            finally:
+                await self._release(member)
+        return self._tools
+
+    def invalidate_tools_cache(self):
+        self._tools = None
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]):
+        member = await self._acquire()
+        try:
+            return await call_tool_cancellable(member.session.server, tool_name, arguments)
+        finally:
+            await self._release(member)
+
+    async def list_prompts(self):
+        return await self.members[0].session.server.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        return await self.members[0].session.server.get_prompt(name, arguments)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "connected": sum(1 for m in self.members if m.session.connected),
+            "replaced": self.replaced,
+            "strategy": self.strategy,
+            "max_inflight": self.max_inflight,
+            "inflight": [m.inflight for m in self.members],
+            "calls_per_session": [m.calls for m in self.members],
+            "calls": self.calls,
+            "queued_calls": self.queued_calls,
+            "waiting": self.waiting,
+            "queue_wait_ms_avg": round(self.queue_wait_total / self.calls * 1000, 2) if self.calls else 0.0,
+            "queue_wait_ms_max": round(self.queue_wait_max * 1000, 2),
+        }
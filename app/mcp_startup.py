@@ -0,0 +1,199 @@
+import asyncio
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+
+from agents.mcp import MCPServer
+
+from app.metrics import record_mcp
+from app.mcp_pool import SessionTask, call_tool_cancellable, ping_server
+
+# Readiness states reported by /health
+LAZY = "lazy"            # not connected yet, connects on first use
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+TIMEOUT = "timeout"
+DOWN = "down"            # was ready, failed a health check; the supervisor is reconnecting it
+
+
+class ManagedMCPServer(MCPServer):
+    """Wraps an MCP server with a startup deadline, readiness state and optional lazy connect.
+
+    The wrapped server lives in its own SessionTask, so several servers can be connected
+    concurrently (asyncio.gather) and still be cleaned up from the app's shutdown hook.
+    In lazy mode connect() returns immediately and the real connection is opened the first
+    time the agent lists or calls the server's tools.
+    """
+
+    def __init__(
+        self,
+        server: MCPServer,
+        startup_timeout: float = 30,
+        lazy: bool = False,
+        on_tools: Optional[Callable[[str, list], None]] = None,
+        on_failure: Optional[Callable[["ManagedMCPServer"], None]] = None,
+    ):
+        super().__init__(use_structured_content=server.use_structured_content)
+        self.inner = server
+        self.on_tools = on_tools
+        self.on_failure = on_failure  # e.g. MCPSupervisor.poke: re-check this server now
+        self.startup_timeout = startup_timeout
+        self.lazy = lazy
+        self.state = LAZY if lazy else STARTING
+        self.error: Optional[str] = None
+        self.startup_ms: Optional[float] = None
+        self._session: Optional[SessionTask] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    async def connect(self):
+        if self.lazy:
+            return
+        await self._ensure_connected()
+
+    async def _ensure_connected(self) -> None:
+        if self.state == READY:
+            return
+        async with self._lock:
+            if self.state == READY:
+                return
+            self.state = STARTING
+            self.error = None
+            session = SessionTask(self.inner)
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(session.start(), timeout=self.startup_timeout)
+            except asyncio.TimeoutError:
+                self.state = TIMEOUT
+                self.error = f"not connected within {self.startup_timeout:g}s"
+                raise TimeoutError(f"MCP server {self.name} {self.error}")
+            except asyncio.CancelledError:
+                self.state = FAILED
+                self.error = "startup cancelled"
+                raise
+            except Exception as exception:
+                self.state = FAILED
+                self.error = str(exception) or type(exception).__name__
+                raise
+            finally:
+                self.startup_ms = round((time.perf_counter() - start) * 1000, 1)
+            self._session = session
+            self.state = READY
+
+    async def cleanup(self):
+        session, self._session = self._session, None
+        if session is not None:
+            await session.stop()
+        if self.state == READY:
+            self.state = LAZY if self.lazy else STARTING
+
+    async def ping(self) -> None:
+        if self.state != READY:
+            raise ConnectionError(f"MCP server {self.name} is {self.state}")
+        await ping_server(self.inner)
+
+    def mark_down(self, error: str) -> None:
+        """Take the server out of service until reconnect() succeeds; its tools disappear from runs."""
+        self.state = DOWN
+        self.error = error
+
+    async def reconnect(self) -> None:
+        """Close the current session (if any) and connect again, within the startup deadline."""
+        session, self._session = self._session, None
+        if session is not None:
+            await session.stop()
+        await self._ensure_connected()
+
+    def _failed(self) -> None:
+        if self.on_failure is not None:
+            self.on_failure(self)
+
+    async def list_tools(self, run_context=None, agent=None):
+        if self.state != READY:
+            if self.state != LAZY:
+                # Still starting in the background (or down): run without its tools for now
+                return []
+            try:
+                await self._ensure_connected()
+            except Exception as e:
+                # A lazy server that can't start should not break the whole agent run
+                print(f"[mcp] {self.name} unavailable, continuing without its tools: {e}", file=sys.stderr)
+                return []
+        start = time.perf_counter()
+        try:
+            tools = await self.inner.list_tools(run_context, agent)
+        except Exception as e:
+            record_mcp(self.name, "list_tools", time.perf_counter() - start, ok=False)
+            if self.on_failure is None:
+                raise
+            # Supervised: run without this server's tools while it is checked / reconnected
+            print(f"[mcp] {self.name} list_tools failed, continuing without its tools: {e}", file=sys.stderr)
+            self._failed()
+            return []
+        record_mcp(self.name, "list_tools", time.perf_counter() - start)
+        if self.on_tools is not None:
+            self.on_tools(self.name, tools)
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]):
+        if self.state == DOWN:
+            # Fail fast instead of waiting for a timeout; the supervisor is reconnecting it
+            raise ConnectionError(f"MCP server {self.name} is down ({self.error})")
+        await self._ensure_connected()
+        start = time.perf_counter()
+        try:
+            result = await call_tool_cancellable(self.inner, tool_name, arguments)
+        except Exception:
+            record_mcp(self.name, "call_tool", time.perf_counter() - start, ok=False)
+            self._failed()
+            raise
+        record_mcp(self.name, "call_tool", time.perf_counter() - start)
+        return result
+
+    async def list_prompts(self):
+        await self._ensure_connected()
+        return await self.inner.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        await self._ensure_connected()
+        return await self.inner.get_prompt(name, arguments)
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"state": self.state, "lazy": self.lazy}
+        if self.startup_ms is not None:
+            status["startup_ms"] = self.startup_ms
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+async def start_all(servers: Dict[str, ManagedMCPServer]) -> Dict[str, ManagedMCPServer]:
+    """Connect all eager servers concurrently; returns the ones usable by the agent.
+
+    Lazy servers are returned unconnected. Servers that fail or miss their startup deadline
+    are left out (their state stays visible in the readiness report).
+    """
+
+    async def _start(name: str, server: ManagedMCPServer) -> bool:
+        try:
+            await server.connect()
+        except Exception as e:
+            print(f"Error connecting to {name} server: {e}", file=sys.stderr)
+            return False
+        if server.lazy:
+            print(f"[mcp] {name} server will connect on first use (lazy)")
+        else:
+            print(f"[mcp] {name} server connected successfully in {server.startup_ms:.0f} ms")
+        return True
+
+    names = list(servers)
+    results = await asyncio.gather(*(_start(n, servers[n]) for n in names))
+    return {n: servers[n] for n, ok in zip(names, results) if ok}
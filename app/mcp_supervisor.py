@@ -0,0 +1,171 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.mcp_startup import DOWN, FAILED, LAZY, READY, STARTING, TIMEOUT, ManagedMCPServer
+
+
+class _Health:
+    def __init__(self):
+        self.checks = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.attempts = 0  # consecutive failed reconnects
+        self.next_attempt = 0.0
+        self.last_ok: Optional[float] = None
+        self.wake = asyncio.Event()
+
+
+class MCPSupervisor:
+    """Keeps the MCP servers of a running app alive.
+
+    One watcher task per server pings it every `interval` seconds. A server that stops answering
+    is marked down: its tools leave the agent right away and tool calls fail fast instead of
+    timing out. It is then reconnected in the background with jittered exponential backoff.
+    Whenever the set of usable servers changes, `rebuild(servers)` makes a new agent and
+    `publish(agent)` swaps it in; requests already running keep the agent they started with.
+    """
+
+    def __init__(
+        self,
+        servers: Dict[str, ManagedMCPServer],
+        rebuild: Optional[Callable[[List[ManagedMCPServer]], Any]] = None,
+        publish: Optional[Callable[[Any], None]] = None,
+        interval: float = 10,
+        timeout: float = 5,
+        backoff_base: float = 1,
+        backoff_max: float = 60,
+    ):
+        self.servers = servers
+        self.rebuild = rebuild
+        self.publish = publish
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._health: Dict[str, _Health] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._published = set(servers)  # the initial agent is built with every server
+        self.rebuilds = 0
+
+    def start(self) -> None:
+        for name, server in self.servers.items():
+            self._health[name] = _Health()
+            server.on_failure = self.poke
+            self._tasks.append(asyncio.create_task(self._watch(name, server), name=f"mcp-supervisor:{name}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def poke(self, server: ManagedMCPServer) -> None:
+        """Check a server now instead of at the next interval (called when one of its calls fails)."""
+        health = self._health.get(server.name)
+        if health is not None:
+            health.wake.set()
+
+    def _delay(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** attempts) * random.uniform(0.5, 1.0)
+
+    async def _watch(self, name: str, server: ManagedMCPServer) -> None:
+        health = self._health[name]
+        while True:
+            delay = self.interval
+            if server.state == READY:
+                await self._check(name, server, health)
+            if server.state in (DOWN, FAILED, TIMEOUT):
+                if time.monotonic() >= health.next_attempt:
+                    await self._reconnect(name, server, health)
+                if server.state != READY:
+                    delay = min(self.interval, max(0.0, health.next_attempt - time.monotonic()))
+            self._publish()
+            health.wake.clear()
+            try:
+                await asyncio.wait_for(health.wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, name: str, server: ManagedMCPServer, health: _Health) -> None:
+        health.checks += 1
+        try:
+            await asyncio.wait_for(server.ping(), timeout=self.timeout)
+        except Exception as e:
+            health.failures += 1
+            error = str(e) or type(e).__name__
+            server.mark_down(f"health check failed: {error}")
+            health.attempts = 0
+            health.next_attempt = 0.0  # first reconnect right away
+            print(f"[mcp] {name} failed its health check ({error}); removed from the agent, reconnecting")
+            self._publish()  # before reconnecting, which can take up to the startup deadline
+            return
+        health.last_ok = time.time()
+
+    async def _reconnect(self, name: str, server: ManagedMCPServer, health: _Health) -> None:
+        try:
+            await server.reconnect()
+        except Exception as e:
+            health.attempts += 1
+            delay = self._delay(health.attempts)
+            health.next_attempt = time.monotonic() + delay
+            server.mark_down(f"reconnect failed: {str(e) or type(e).__name__}")
+            print(f"[mcp] {name} reconnect attempt {health.attempts} failed; next try in {delay:.1f}s")
+            return
+        health.reconnects += 1
+        print(f"[mcp] {name} reconnected after {health.attempts + 1} attempt(s)")
+        health.attempts = 0
+
+    def _publish(self) -> None:
+        """Rebuild the agent when a server became usable or went away."""
+        usable = {
+            name for name, server in self.servers.items()
+            if server.state in (READY, LAZY) or (server.state == STARTING and name in self._published)
+        }
+        if usable == self._published or self.rebuild is None:
+            return
+        added, removed = sorted(usable - self._published), sorted(self._published - usable)
+        self._published = usable
+        agent = self.rebuild([server for name, server in self.servers.items() if name in usable])
+        if self.publish is not None:
+            self.publish(agent)
+        self.rebuilds += 1
+        changes = ", ".join([f"+{n}" for n in added] + [f"-{n}" for n in removed])
+        print(f"[mcp] agent rebuilt ({changes}); in-flight requests finish with the previous one")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "interval_s": self.interval,
+            "agent_rebuilds": self.rebuilds,
+            "servers_in_agent": sorted(self._published),
+            "servers": {
+                name: {
+                    "state": self.servers[name].state,
+                    "checks": health.checks,
+                    "failures": health.failures,
+                    "reconnects": health.reconnects,
+                    "failed_attempts": health.attempts,
+                    "next_attempt_in_s": round(max(0.0, health.next_attempt - now), 1) if health.attempts else None,
+                    "last_ok": health.last_ok,
+                }
+                for name, health in self._health.items()
+            },
+        }
+
+
+def supervisor_from_env(servers: Dict[str, ManagedMCPServer], rebuild=None, publish=None) -> Optional[MCPSupervisor]:
+    """MCP_HEALTH_INTERVAL seconds between checks (0 = no supervision), MCP_HEALTH_TIMEOUT, MCP_RECONNECT_MAX."""
+    interval = float(os.getenv("MCP_HEALTH_INTERVAL", "10"))
+    if interval <= 0:
+        return None
+    return MCPSupervisor(
+        servers,
+        rebuild=rebuild,
+        publish=publish,
+        interval=interval,
+        timeout=float(os.getenv("MCP_HEALTH_TIMEOUT", "5")),
+        backoff_max=float(os.getenv("MCP_RECONNECT_MAX", "60")),
+    )
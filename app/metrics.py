@@ -0,0 +1,302 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from agents import RunHooks
+
+# METRICS_ENABLED=0 turns off all recording, the /metrics endpoint and the Server-Timing header
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "off", "no")
+
+# Seconds; covers fast MCP calls (ms) up to long multi-turn agent runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {value:g}" for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Minimal in-process metrics registry rendered in the Prometheus text format.
+
+    Recording only updates a few dict entries (everything runs on the event loop), so the
+    cost per request is a few microseconds whether or not anything scrapes /metrics.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "chat_request_duration_seconds", "End-to-end duration of chat requests", ["endpoint", "status"]))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chat_stage_duration_seconds", "Time per request spent in each stage (model, tool, mcp, cache, session)", ["stage"]))
+TOOL_SECONDS = REGISTRY.register(Histogram(
+    "agent_tool_duration_seconds", "Duration of tool calls made by the agent", ["tool", "server"]))
+MCP_SECONDS = REGISTRY.register(Histogram(
+    "mcp_call_duration_seconds", "Duration of calls to MCP servers", ["server", "method"]))
+MODEL_SECONDS = REGISTRY.register(Histogram(
+    "agent_model_turn_duration_seconds", "Duration of single model calls (hosted file search runs inside them)", ["model"]))
+TOKENS = REGISTRY.register(Counter(
+    "agent_tokens_total", "Tokens reported by the model", ["type"]))
+HOSTED_TOOL_CALLS = REGISTRY.register(Counter(
+    "agent_hosted_tool_calls_total", "Tool calls executed by OpenAI inside a model turn (e.g. file_search)", ["tool"]))
+ERRORS = REGISTRY.register(Counter(
+    "chat_errors_total", "Errors by endpoint and stage", ["endpoint", "stage"]))
+MCP_ERRORS = REGISTRY.register(Counter(
+    "mcp_call_errors_total", "Failed calls to MCP servers", ["server", "method"]))
+MCP_CACHE = REGISTRY.register(Counter(
+    "mcp_cache_requests_total", "Lookups of cached read-only MCP tool results (hit, miss, stale)", ["server", "result"]))
+INFLIGHT = REGISTRY.register(Gauge(
+    "chat_requests_in_flight", "Chat requests currently being processed", ["endpoint"]))
+COALESCED = REGISTRY.register(Counter(
+    "chat_coalesced_requests_total", "Requests answered by sharing an identical in-flight agent run"))
+ROUTED = REGISTRY.register(Counter(
+    "chat_routed_requests_total", "Requests per model tier and routing reason (rule, keyword, short, long, ...)", ["tier", "reason"]))
+ESCALATIONS = REGISTRY.register(Counter(
+    "chat_router_escalations_total", "Fast-tier runs retried on the strong model", ["reason"]))
+ROUTER_SECONDS = REGISTRY.register(Histogram(
+    "chat_router_run_duration_seconds", "Duration of agent runs per model tier", ["tier", "outcome"]))
+TOOL_SELECTIONS = REGISTRY.register(Counter(
+    "chat_tool_selection_total", "Agent runs per selected tool groups (all = every tool)", ["groups"]))
+ADMISSION_ACTIVE = REGISTRY.register(Gauge(
+    "chat_admission_active", "Agent runs currently holding an admission slot"))
+ADMISSION_QUEUE = REGISTRY.register(Gauge(
+    "chat_admission_queue_depth", "Requests waiting for an admission slot"))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "chat_admission_wait_seconds", "Time queued requests waited for an admission slot"))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "chat_admission_rejected_total", "Requests rejected by admission control", ["reason"]))
+TELEMETRY_ROWS = REGISTRY.register(Counter(
+    "telemetry_rows_total", "Telemetry readings written or rejected (bad format)", ["result"]))
+TELEMETRY_COMMIT_SECONDS = REGISTRY.register(Histogram(
+    "telemetry_commit_duration_seconds", "Duration of telemetry group commits (raw rows plus minute/hour aggregates)"))
+SPEECH_UTTERANCES = REGISTRY.register(Counter(
+    "chat_speech_utterances_total", "Speech uploads per end-of-speech cause (silence, upload_end, max_length)", ["ended_by"]))
+CANCELLED_RUNS = REGISTRY.register(Counter(
+    "chat_cancelled_runs_total", "Agent requests cancelled by deadline, stage budget or client disconnect", ["endpoint", "reason"]))
+CANCELLED_TOKENS = REGISTRY.register(Counter(
+    "chat_cancelled_run_tokens_total", "Tokens of cancelled runs: spent before cancelling, saved (estimated from completed runs)", ["type"]))
+
+
+def _token(name: str) -> str:
+    """Server-Timing metric names must be HTTP tokens."""
+    return re.sub(r"[^A-Za-z0-9_.\-]", "_", name)
+
+
+class RequestTimings:
+    """Per-request latency breakdown; becomes the Server-Timing header and the stage histograms."""
+
+    def __init__(self, endpoint: str, start: Optional[float] = None):
+        self.endpoint = endpoint
+        self.start = start if start is not None else time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # stage -> [seconds, count]
+        INFLIGHT.inc(1, endpoint)
+
+    def add(self, stage: str, seconds: float) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def breakdown(self) -> Dict[str, float]:
+        data = {stage: round(seconds * 1000, 1) for stage, (seconds, _) in self.stages.items()}
+        data["total"] = round(self.elapsed() * 1000, 1)
+        return data
+
+    def server_timing(self) -> str:
+        parts = []
+        for stage, (seconds, count) in self.stages.items():
+            part = f"{_token(stage)};dur={seconds * 1000:.1f}"
+            if count > 1:
+                part += f';desc="{count} calls"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def finish(self, status: int) -> None:
+        INFLIGHT.dec(1, self.endpoint)
+        REQUEST_SECONDS.observe(self.elapsed(), self.endpoint, str(status))
+        for stage, (seconds, _) in self.stages.items():
+            STAGE_SECONDS.observe(seconds, stage)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request(endpoint: str, start: Optional[float] = None) -> Optional[RequestTimings]:
+    """Begin timing a request (None when metrics are disabled). Tool/MCP tasks inherit it via contextvars.
+
+    `start` (perf_counter) backdates the request, e.g. to include a speech upload before the run.
+    """
+    if not METRICS_ENABLED:
+        return None
+    timings = RequestTimings(endpoint, start)
+    _current.set(timings)
+    return timings
+
+
+def record_error(endpoint: str, stage: str) -> None:
+    if METRICS_ENABLED:
+        ERRORS.inc(1, endpoint, stage)
+
+
+def record_mcp(server: str, method: str, seconds: float, ok: bool = True) -> None:
+    """Called by ManagedMCPServer for every list_tools / call_tool."""
+    if not METRICS_ENABLED:
+        return
+    MCP_SECONDS.observe(seconds, server, method)
+    if not ok:
+        MCP_ERRORS.inc(1, server, method)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(f"mcp.{server}" if method == "call_tool" else "mcp_list_tools", seconds)
+
+
+class MetricsHooks(RunHooks):
+    """Times model turns and tool calls of one agent run."""
+
+    def __init__(self, timings: RequestTimings, tool_servers: Dict[str, str]):
+        self.timings = timings
+        self.tool_servers = tool_servers
+        self._llm_started: List[float] = []
+        self._tool_started: Dict[str, List[float]] = {}
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self._llm_started.append(time.perf_counter())
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        if not self._llm_started:
+            return
+        seconds = time.perf_counter() - self._llm_started.pop(0)
+        self.timings.add("model", seconds)
+        MODEL_SECONDS.observe(seconds, str(agent.model or os.getenv("OPENAI_MODEL") or "default"))
+        TOKENS.inc(response.usage.input_tokens, "input")
+        TOKENS.inc(response.usage.output_tokens, "output")
+        for item in response.output:
+            if getattr(item, "type", None) == "file_search_call":
+                HOSTED_TOOL_CALLS.inc(1, "file_search")
+                self.timings.add("file_search", 0.0)  # counted; its time is part of "model"
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._tool_started.setdefault(tool.name, []).append(time.perf_counter())
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        started = self._tool_started.get(tool.name)
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop(0)
+        TOOL_SECONDS.observe(seconds, tool.name, self.tool_servers.get(tool.name, "local"))
+        self.timings.add(f"tool.{tool.name}", seconds)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,270 @@
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from agents.run import DEFAULT_MAX_TURNS
+
+from app import metrics
+from app.response_cache import CACHEABLE_TOOLS, tool_names_used
+
+FAST = "fast"
+STRONG = "strong"
+ESCALATED = "escalated"  # started on the fast tier, answered by the strong one
+
+# Re-running a failed fast run is only safe if it did not write anything
+SIDE_EFFECT_FREE_TOOLS = CACHEABLE_TOOLS | {"recommend_sport", "recommend_sports"}
+
+# Word prefixes (keywords under 4 letters must match whole words); a strong keyword wins over a fast one
+DEFAULT_STRONG_KEYWORDS = (
+    "explain", "why", "analy", "compare", "design", "architect", "concept", "summar", "plan",
+    "write", "create", "update", "delete", "insert", "code", "sql", "query", "debug", "evaluat",
+)
+DEFAULT_FAST_KEYWORDS = (
+    "sport", "recommend", "workout", "list", "table", "file", "folder", "hello", "hi", "thanks", "show",
+)
+
+
+def match_keyword(word: str, keyword: str) -> bool:
+    """Prefix match; keywords under 4 letters must match the whole word ("hi" is not "history")."""
+    return word == keyword or (len(keyword) >= 4 and word.startswith(keyword))
+
+
+def _split(raw: Optional[str], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    if raw is None or not raw.strip():
+        return default
+    return tuple(k.strip().lower() for k in raw.split(",") if k.strip())
+
+
+def parse_rules(raw: str) -> List[Tuple[re.Pattern, str]]:
+    """ROUTER_RULES: "regex=tier;regex=tier", checked in order before the built-in classifier."""
+    rules = []
+    for part in raw.split(";"):
+        if "=" not in part:
+            continue
+        pattern, tier = part.rsplit("=", 1)
+        tier = tier.strip().lower()
+        if tier not in (FAST, STRONG):
+            raise ValueError(f"ROUTER_RULES: unknown tier {tier!r} in {part!r}")
+        rules.append((re.compile(pattern.strip(), re.IGNORECASE), tier))
+    return rules
+
+
+def parse_prices(raw: str) -> Dict[str, Tuple[float, float]]:
+    """ROUTER_PRICES: "model=input/output,..." in USD per 1M tokens."""
+    prices = {}
+    for part in raw.split(","):
+        if "=" not in part:
+            continue
+        model, price = part.split("=", 1)
+        price_in, _, price_out = price.partition("/")
+        prices[model.strip()] = (float(price_in), float(price_out or price_in))
+    return prices
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class _TierStats:
+    def __init__(self, model: str):
+        self.model = model
+        self.runs = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies: Deque[float] = deque(maxlen=1000)
+
+
+class ModelRouter:
+    """Sends each request to a fast, cheap model or the strong one.
+
+    The tier comes from ROUTER_RULES (regexes) if one matches, else from a small local classifier:
+    strong keywords, several questions, code or long messages go to the strong tier; fast
+    keywords and short messages to the fast one. A fast run that raises or returns nothing is
+    retried once on the strong tier, unless it already used a tool with side effects.
+    """
+
+    def __init__(
+        self,
+        fast_model: Optional[str],
+        strong_model: Optional[str],
+        rules: Optional[List[Tuple[re.Pattern, str]]] = None,
+        fast_keywords: Tuple[str, ...] = DEFAULT_FAST_KEYWORDS,
+        strong_keywords: Tuple[str, ...] = DEFAULT_STRONG_KEYWORDS,
+        short_words: int = 12,
+        max_fast_words: int = 40,
+        fast_max_turns: int = 6,
+        escalate: bool = True,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.rules = rules or []
+        self.fast_keywords = fast_keywords
+        self.strong_keywords = strong_keywords
+        self.short_words = short_words
+        self.max_fast_words = max_fast_words
+        self.fast_max_turns = fast_max_turns
+        self.escalate = escalate
+        self.prices = prices or {}
+        self.escalations: Dict[str, int] = {}
+        self.reasons: Dict[str, int] = {}
+        self._tiers = {FAST: _TierStats(fast_model or ""), STRONG: _TierStats(strong_model or "")}
+        self._variants: Dict[Tuple[int, str], Any] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.fast_model)
+
+    def route(self, message: str) -> Tuple[str, str]:
+        """(tier, reason) for a user message."""
+        if not self.enabled:
+            return STRONG, "routing_off"
+        for pattern, tier in self.rules:
+            if pattern.search(message):
+                return tier, f"rule:{pattern.pattern}"
+        text = message.lower()
+        words = re.findall(r"\w+", text)
+        if len(words) > self.max_fast_words:
+            return STRONG, "long"
+        if "```" in message or text.count("?") > 1:
+            return STRONG, "complex"
+        for keyword in self.strong_keywords:
+            if any(match_keyword(w, keyword) for w in words):
+                return STRONG, f"keyword:{keyword}"
+        for keyword in self.fast_keywords:
+            if any(match_keyword(w, keyword) for w in words):
+                return FAST, f"keyword:{keyword}"
+        return (FAST, "short") if len(words) <= self.short_words else (STRONG, "default")
+
+    def agent_for(self, agent, tier: str):
+        """The agent with the tier's model; variants are cached per base agent (rebuilt ones get new ones)."""
+        model = self.fast_model if tier == FAST else self.strong_model
+        if not model or model == agent.model:
+            return agent
+        key = (id(agent), tier)
+        variant = self._variants.get(key)
+        if variant is None or variant[0] is not agent:
+            if len(self._variants) > 64:
+                self._variants.clear()  # old agents from supervisor rebuilds
+            variant = self._variants[key] = (agent, agent.clone(model=model))
+        return variant[1]
+
+    def max_turns(self, tier: str) -> int:
+        """A fast model stuck in a tool loop is cut short and escalated instead of burning turns."""
+        return self.fast_max_turns if tier == FAST and self.escalate else DEFAULT_MAX_TURNS
+
+    def can_escalate(self, tier: str, run_data, tools_started: Optional[Set[str]] = None) -> bool:
+        """Whether a failed fast run may be re-run on the strong model: only if it wrote nothing.
+
+        `run_data` (a result, or an AgentsException's run_data) lists the tool calls; failures
+        without it (API or connection errors) are judged by `tools_started`, the names recorded
+        by the run hooks. With neither, the run might have written something, so no retry."""
+        if tier != FAST or not self.escalate:
+            return False
+        if run_data is not None:
+            return tool_names_used(run_data) <= SIDE_EFFECT_FREE_TOOLS
+        return tools_started is not None and tools_started <= SIDE_EFFECT_FREE_TOOLS
+
+    def record(self, tier: str, seconds: float, usage, error: bool = False) -> None:
+        stats = self._tiers[tier]
+        stats.runs += 1
+        stats.errors += int(error)
+        stats.latencies.append(seconds)
+        if usage is not None:
+            stats.input_tokens += usage.input_tokens
+            stats.output_tokens += usage.output_tokens
+        if metrics.METRICS_ENABLED:
+            metrics.ROUTER_SECONDS.observe(seconds, tier, "error" if error else "ok")
+
+    def record_route(self, tier: str, reason: str) -> None:
+        kind = reason.split(":", 1)[0]
+        self.reasons[f"{tier}/{reason}"] = self.reasons.get(f"{tier}/{reason}", 0) + 1
+        if metrics.METRICS_ENABLED:
+            metrics.ROUTED.inc(1, tier, kind)
+
+    def record_escalation(self, reason: str) -> None:
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        if metrics.METRICS_ENABLED:
+            metrics.ESCALATIONS.inc(1, reason)
+        print(f"[router] fast tier failed ({reason}); escalating to the strong model")
+
+    async def run(self, agent, message: str, run: Callable[[Any, int, Set[str]], Awaitable[Any]]) -> Tuple[Any, str, str]:
+        """Route and run; returns (result, served tier: fast/strong/escalated, route reason).
+
+        `run(agent_variant, max_turns, tools_started)` performs the actual Runner.run; its hooks
+        must add the name of every tool the run starts to `tools_started`.
+        """
+        tier, reason = self.route(message)
+        self.record_route(tier, reason)
+        start = time.perf_counter()
+        tools_started: Set[str] = set()
+        try:
+            result = await run(self.agent_for(agent, tier), self.max_turns(tier), tools_started)
+        except Exception as exception:
+            run_data = getattr(exception, "run_data", None)
+            self.record(tier, time.perf_counter() - start, run_data.context_wrapper.usage if run_data else None, error=True)
+            if not self.can_escalate(tier, run_data, tools_started):
+                raise
+            escalation = type(exception).__name__
+        else:
+            self.record(tier, time.perf_counter() - start, result.context_wrapper.usage)
+            if result.final_output or not self.can_escalate(tier, result):
+                return result, tier, reason
+            escalation = "empty_output"
+
+        self.record_escalation(escalation)
+        start = time.perf_counter()
+        try:
+            result = await run(self.agent_for(agent, STRONG), self.max_turns(STRONG), set())
+        except Exception as exception:
+            run_data = getattr(exception, "run_data", None)
+            self.record(STRONG, time.perf_counter() - start, run_data.context_wrapper.usage if run_data else None, error=True)
+            raise
+        self.record(STRONG, time.perf_counter() - start, result.context_wrapper.usage)
+        return result, ESCALATED, reason
+
+    def stats(self) -> Dict[str, Any]:
+        tiers = {}
+        for tier, stats in self._tiers.items():
+            latencies = list(stats.latencies)
+            entry: Dict[str, Any] = {
+                "model": stats.model or "(agent default)",
+                "runs": stats.runs,
+                "errors": stats.errors,
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+                "input_tokens": stats.input_tokens,
+                "output_tokens": stats.output_tokens,
+            }
+            price = self.prices.get(stats.model)
+            if price is not None:
+                entry["cost_usd"] = round((stats.input_tokens * price[0] + stats.output_tokens * price[1]) / 1e6, 4)
+            tiers[tier] = entry
+        return {
+            "enabled": self.enabled,
+            "tiers": tiers,
+            "routes": dict(sorted(self.reasons.items())),
+            "escalations": self.escalations,
+        }
+
+
+def router_from_env(default_model: Optional[str]) -> ModelRouter:
+    """ROUTER_FAST_MODEL (unset = routing off) and ROUTER_STRONG_MODEL (default: OPENAI_MODEL); see README."""
+    return ModelRouter(
+        fast_model=os.getenv("ROUTER_FAST_MODEL", "").strip() or None,
+        strong_model=os.getenv("ROUTER_STRONG_MODEL", "").strip() or default_model,
+        rules=parse_rules(os.getenv("ROUTER_RULES", "")),
+        fast_keywords=_split(os.getenv("ROUTER_FAST_KEYWORDS"), DEFAULT_FAST_KEYWORDS),
+        strong_keywords=_split(os.getenv("ROUTER_STRONG_KEYWORDS"), DEFAULT_STRONG_KEYWORDS),
+        short_words=int(os.getenv("ROUTER_SHORT_WORDS", "12")),
+        max_fast_words=int(os.getenv("ROUTER_MAX_FAST_WORDS", "40")),
+        fast_max_turns=int(os.getenv("ROUTER_FAST_MAX_TURNS", "6")),
+        escalate=os.getenv("ROUTER_ESCALATE", "1").strip().lower() not in ("0", "false", "off", "no"),
+        prices=parse_prices(os.getenv("ROUTER_PRICES", "")),
+    )
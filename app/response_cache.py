@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from agents import FileSearchTool
+from agents.items import ToolCallItem
+
+# Tools whose results only depend on (slowly changing) stored data. An answer is only cached
+# when every tool it used is in this list; writes (write_file, write_query, ...) and
+# non-deterministic tools such as recommend_sport make the answer uncacheable.
+CACHEABLE_TOOLS = {
+    "file_search", "search_project_docs",
+    # filesystem MCP (read-only)
+    "read_file", "read_text_file", "read_media_file", "read_multiple_files",
+    "list_directory", "list_directory_with_sizes", "directory_tree",
+    "search_files", "get_file_info", "list_allowed_directories",
+    # in-process file index (app/fs_index.py)
+    "search_file_contents", "read_file_lines",
+    # SQLite MCP (read-only)
+    "read_query", "list_tables", "describe_table",
+}
+
+
+def normalize_message(message: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a user message."""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def agent_fingerprint(agent) -> str:
+    """Hash of everything in the agent config that changes the answer: model, settings,
+    instructions and the vector stores used for retrieval."""
+    vector_store_ids = sorted(
+        vs for tool in agent.tools if isinstance(tool, FileSearchTool) for vs in tool.vector_store_ids
+    )
+    config = {
+        "model": str(agent.model or os.getenv("OPENAI_MODEL") or ""),
+        "tools": sorted(getattr(tool, "name", type(tool).__name__) for tool in agent.tools),
+        "model_settings": agent.model_settings.to_json_dict(),
+        "instructions": hashlib.sha256(str(agent.instructions or "").encode("utf-8")).hexdigest(),
+        "vector_store_ids": vector_store_ids,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def make_key(agent, message: str) -> str:
+    raw = agent_fingerprint(agent) + "\n" + normalize_message(message)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def tool_names_used(result) -> set:
+    names = set()
+    for item in result.new_items:
+        if isinstance(item, ToolCallItem):
+            raw = item.raw_item
+            kind = raw.get("type") if isinstance(raw, dict) else getattr(raw, "type", None)
+            if kind == "file_search_call":
+                names.add("file_search")
+            else:
+                name = raw.get("name") if isinstance(raw, dict) else getattr(raw, "name", None)
+                names.add(name or kind or "unknown")
+    return names
+
+
+def is_cacheable(result) -> bool:
+    """True if the run only used read-only tools, i.e. replaying the answer has no side effects."""
+    return tool_names_used(result) <= CACHEABLE_TOOLS
+
+
+class ResponseCache:
+    """LRU + TTL cache of final replies, optionally backed by an SQLite file that survives restarts."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, reply TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM response_cache WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stores = 0
+        self.skipped = 0  # answers not stored because they used side-effecting tools
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, reply = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return reply
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reply, created FROM response_cache WHERE key = ? AND created >= ?", (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, reply: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, reply)
+            self.stores += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, reply, created) VALUES (?, ?, ?)", (key, reply, now)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, created: float, reply: str) -> None:
+        self._entries[key] = (created, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "skipped_side_effects": self.skipped,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def cache_from_env() -> ResponseCache:
+    """RESPONSE_CACHE_SIZE (0 disables), RESPONSE_CACHE_TTL seconds, RESPONSE_CACHE_DB optional SQLite file."""
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+    )
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English/German text)."""
+    return len(text) // 4 + 1
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+class ConversationSession:
+    """History of one conversation: a compacted summary of old turns plus the recent turns verbatim."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary_lines: List[str] = []
+        self.turns: List[Tuple[str, str]] = []  # (user, assistant)
+        self.lock = asyncio.Lock()  # one turn at a time per session
+        self.created = time.time()
+        self.last_used = self.created
+        # token accounting (input/output as reported by the model)
+        self.turn_count = 0
+        self.compactions = 0
+        self.input_tokens_total = 0
+        self.output_tokens_total = 0
+        self.last_input_tokens = 0
+        self.last_history_tokens = 0
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(line) for line in self.summary_lines) + sum(
+            estimate_tokens(u) + estimate_tokens(a) for u, a in self.turns
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "turns": self.turn_count,
+            "turns_verbatim": len(self.turns),
+            "compactions": self.compactions,
+            "history_tokens": self.history_tokens(),
+            "last_input_tokens": self.last_input_tokens,
+            "input_tokens_total": self.input_tokens_total,
+            "output_tokens_total": self.output_tokens_total,
+            "idle_s": round(time.time() - self.last_used, 1),
+        }
+
+
+class SessionStore:
+    """Server-side conversation store with per-session and total memory bounds.
+
+    Each session keeps its last `keep_turns` turns verbatim. Older turns are compacted into
+    one-line summaries, and the oldest summary lines are dropped once the history exceeds
+    `history_budget` tokens. This keeps the prompt size per turn roughly flat instead of
+    growing with the conversation. Idle sessions are evicted LRU-first when there are more
+    than `max_sessions`, when the total history exceeds `total_budget` tokens, or when a
+    session has been idle for longer than `idle_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        keep_turns: int = 4,
+        history_budget: int = 2000,
+        total_budget: int = 2_000_000,
+        idle_ttl: float = 3600,
+        summary_chars: int = 160,
+    ):
+        self.max_sessions = max_sessions
+        self.keep_turns = keep_turns
+        self.history_budget = history_budget
+        self.total_budget = total_budget
+        self.idle_ttl = idle_ttl
+        self.summary_chars = summary_chars
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> ConversationSession:
+        self._evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ConversationSession(session_id)
+            self._sessions[session_id] = session
+            self._enforce_limits(keep=session_id)
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def build_input(self, session: ConversationSession, message: str) -> List[Dict[str, str]]:
+        """Responses API input: compacted summary, recent turns, then the new user message."""
+        items: List[Dict[str, str]] = []
+        if session.summary_lines:
+            items.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation (oldest first):\n" + "\n".join(session.summary_lines),
+            })
+        for user, assistant in session.turns:
+            items.append({"role": "user", "content": user})
+            items.append({"role": "assistant", "content": assistant})
+        items.append({"role": "user", "content": message})
+        session.last_history_tokens = session.history_tokens()
+        return items
+
+    def record(self, session: ConversationSession, message: str, reply: str, usage=None) -> None:
+        session.turns.append((message, reply))
+        session.turn_count += 1
+        session.last_used = time.time()
+        if usage is not None:
+            session.last_input_tokens = usage.input_tokens
+            session.input_tokens_total += usage.input_tokens
+            session.output_tokens_total += usage.output_tokens
+        self._compact(session)
+        self._enforce_limits(keep=session.id)
+
+    def _compact(self, session: ConversationSession) -> None:
+        # Fold turns beyond the verbatim window into one-line summaries
+        while len(session.turns) > self.keep_turns:
+            user, assistant = session.turns.pop(0)
+            session.summary_lines.append(
+                f"- User: {_shorten(user, self.summary_chars)} | Assistant: {_shorten(assistant, self.summary_chars)}"
+            )
+            session.compactions += 1
+        # Then truncate: drop the oldest summary lines, and finally old verbatim turns
+        while session.history_tokens() > self.history_budget and session.summary_lines:
+            session.summary_lines.pop(0)
+        while session.history_tokens() > self.history_budget and len(session.turns) > 1:
+            session.turns.pop(0)
+            session.compactions += 1
+
+    def _evict_idle(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_used < cutoff and not s.lock.locked()]:
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def _enforce_limits(self, keep: str) -> None:
+        total = sum(s.history_tokens() for s in self._sessions.values())
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions and total <= self.total_budget:
+                break
+            session = self._sessions[session_id]
+            if session_id == keep or session.lock.locked():
+                continue
+            total -= session.history_tokens()
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "history_tokens_total": sum(s.history_tokens() for s in self._sessions.values()),
+            "evicted": self.evicted,
+        }
+
+
+def store_from_env() -> SessionStore:
+    return SessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+        keep_turns=int(os.getenv("SESSION_KEEP_TURNS", "4")),
+        history_budget=int(os.getenv("SESSION_HISTORY_TOKENS", "2000")),
+        total_budget=int(os.getenv("SESSION_TOTAL_TOKENS", "2000000")),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+    )
@@ -0,0 +1,98 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app import metrics
+from app.deadlines import Deadline
+
+
+class _Call:
+    def __init__(self, deadline: Optional[Deadline] = None):
+        self.task: Optional[asyncio.Task] = None
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical concurrent work: callers with the same key share one run.
+
+    The run executes in its own task, so it is not tied to the caller that started it. A caller
+    that goes away (client disconnect, its deadline) only stops waiting; the run is cancelled
+    once nobody is waiting for it any more. With deadlines, the run gets a Deadline of its own
+    that lasts as long as the latest of its callers' and cancels the run task when it expires.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[str, _Call] = {}
+        self.runs = 0
+        self.coalesced = 0
+        self.abandoned = 0  # runs cancelled because every caller left
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], deadline: Optional[Deadline] = None) -> Tuple[Any, bool]:
+        """Return (result of fn, shared) where shared is True if another caller's run was reused.
+
+        With a `deadline`, fn is called with the run's Deadline (for its budgets and hooks); when
+        that runs out, every caller gets DeadlineExceeded."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(deadline.for_run() if deadline is not None else None)
+            call.task = asyncio.create_task(self._run(call.deadline, fn) if call.deadline is not None else fn())
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.runs += 1
+        else:
+            self.coalesced += 1
+            if metrics.METRICS_ENABLED:
+                metrics.COALESCED.inc()
+            if call.deadline is not None and deadline is not None:
+                call.deadline.extend(deadline.expires)
+        if deadline is not None:
+            deadline.coalesced = True
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                if call.deadline is not None and deadline is not None and call.deadline.reason is None:
+                    call.deadline.reason = deadline.reason  # why the last caller left
+                call.task.cancel()
+                self.abandoned += 1
+
+    @staticmethod
+    async def _run(deadline: Deadline, fn: Callable[[Deadline], Awaitable[Any]]) -> Any:
+        task = asyncio.current_task()
+        deadline.arm(task.cancel)
+        try:
+            return await fn(deadline)
+        except asyncio.CancelledError:
+            if deadline.reason is not None and task.uncancel() == 0:
+                raise deadline.error() from None  # our own timer, not an abandoned run or shutdown
+            raise
+        finally:
+            deadline.disarm()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # an abandoned run's error has nobody left to read it
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "runs": self.runs,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+def singleflight_from_env() -> SingleFlight:
+    """CHAT_COALESCE=0 turns request coalescing off."""
+    return SingleFlight(enabled=os.getenv("CHAT_COALESCE", "1").strip().lower() not in ("0", "false", "off", "no"))
@@ -0,0 +1,422 @@
+"""Streaming speech input for /chat/speech: voice-activity detection and pluggable transcription.
+
+Audio arrives as a chunked upload (16-bit mono PCM, raw or as a WAV file). While it is still
+arriving, frames go through an energy VAD; every stretch of speech that ends in a short pause
+is handed to the transcription backend right away, so segments are transcribed in parallel
+with the rest of the upload. Once the VAD sees the end of speech, only the last segment is
+left to transcribe before the agent can start - the device may keep the upload open.
+"""
+import array
+import asyncio
+import io
+import operator
+import os
+import struct
+import sys
+import time
+import wave
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app import metrics
+
+SAMPLE_WIDTH = 2  # bytes per sample (PCM16)
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+MAX_HEADER_BYTES = 64 * 1024  # WAV chunks before "data" (fmt, LIST, ...)
+
+
+class SpeechFormatError(ValueError):
+    """The upload is not 16-bit mono PCM / WAV."""
+
+
+class SpeechHeaderError(SpeechFormatError):
+    """The WAV header is malformed or out of range (bad sample rate, truncated or oversized chunks)."""
+
+
+class EnergyVAD:
+    """Classifies fixed-size frames as speech when their RMS level is above `threshold_db` dBFS."""
+
+    def __init__(self, threshold_db: float = -45.0):
+        self.threshold_db = threshold_db
+        # compare squared RMS instead of taking a log per frame
+        self._threshold = (32768 * 10 ** (threshold_db / 20)) ** 2
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = array.array("h", frame)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        if not samples:
+            return False
+        return sum(map(operator.mul, samples, samples)) / len(samples) >= self._threshold
+
+
+def to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(SAMPLE_WIDTH)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class Transcriber:
+    """Backend interface. One instance per utterance; segments arrive in order but their
+    transcriptions may run concurrently."""
+
+    name = "none"
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        raise NotImplementedError
+
+    async def finish(self) -> str:
+        """Text not attributed to any segment yet (called once, after the last segment)."""
+        return ""
+
+
+class FakeTranscriber(Transcriber):
+    """Local stand-in for tests and benchmarks: hands out the words of a fixed text in proportion
+    to the audio of each segment and takes `rtf` seconds per second of audio (real-time factor)."""
+
+    name = "fake"
+
+    def __init__(self, text: str, rtf: float = 0.1, words_per_s: float = 2.5):
+        self._words = text.split()
+        self._heard = False
+        self.rtf = rtf
+        self.words_per_s = words_per_s
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        seconds = len(pcm) / (SAMPLE_WIDTH * sample_rate)
+        # take the words before sleeping so concurrent segments keep their order
+        count = max(1, round(seconds * self.words_per_s))
+        words, self._words = self._words[:count], self._words[count:]
+        self._heard = True
+        await asyncio.sleep(seconds * self.rtf)
+        return " ".join(words)
+
+    async def finish(self) -> str:
+        words, self._words = self._words, []
+        return " ".join(words) if self._heard else ""  # silence stays silence
+
+
+_openai_client = None
+
+
+class OpenAITranscriber(Transcriber):
+    """OpenAI speech-to-text; every segment is sent as a small WAV file."""
+
+    name = "openai"
+
+    def __init__(self, model: str, language: Optional[str] = None):
+        self.model = model
+        self.language = language
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        global _openai_client
+        if _openai_client is None:
+            from openai import AsyncOpenAI  # reads OPENAI_API_KEY / OPENAI_BASE_URL
+            _openai_client = AsyncOpenAI()
+        options = {"language": self.language} if self.language else {}
+        result = await _openai_client.audio.transcriptions.create(
+            model=self.model, file=("segment.wav", to_wav(pcm, sample_rate), "audio/wav"), **options
+        )
+        return result.text
+
+
+class SpeechPipeline:
+    """One utterance: consumes upload chunks until the end of speech and returns the transcript."""
+
+    def __init__(
+        self,
+        transcriber: Transcriber,
+        vad: EnergyVAD,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        start_ms: int = 60,
+        segment_silence_ms: int = 300,
+        end_silence_ms: int = 700,
+        max_speech_s: float = 30.0,
+        max_audio_s: float = 60.0,
+        preroll_ms: int = 200,
+    ):
+        self.transcriber = transcriber
+        self.vad = vad
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.segment_silence_frames = max(1, segment_silence_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.max_speech_frames = int(max_speech_s * 1000 / frame_ms)
+        self.max_audio_frames = int(max_audio_s * 1000 / frame_ms)  # silence included
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}  # event -> seconds since start
+        self.ended_by: Optional[str] = None
+        self.audio_frames = 0
+        self.speech_frames = 0
+        self.vad_s = 0.0
+        self.transcribe_s = 0.0
+        self._header: Optional[bytearray] = bytearray()  # until the WAV header (if any) is parsed
+        self._pcm = bytearray()
+        self._preroll: Deque[bytes] = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._segment = bytearray()
+        self._segment_voiced = False
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silence_run = 0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.sample_rate * self.frame_ms // 1000 * SAMPLE_WIDTH
+
+    def _mark(self, event: str) -> None:
+        self.marks.setdefault(event, time.perf_counter() - self.started)
+
+    async def listen(self, chunks: AsyncIterator[bytes]) -> str:
+        """Read audio until the VAD detects the end of speech (or the upload ends); the rest of
+        the upload is left unread. Segments are transcribed while reading continues."""
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                self._mark("first_audio")
+                start = time.perf_counter()
+                self._feed(chunk)
+                self.vad_s += time.perf_counter() - start
+                if self.ended_by is not None:
+                    break
+            else:
+                self._mark("upload_end")
+                if self._header is not None and self._header:
+                    self._header, raw = None, bytes(self._header)  # too short for a header: raw PCM
+                    self._feed(raw)
+                if self.ended_by is None:
+                    self._end("upload_end")
+            texts = list(await asyncio.gather(*self._tasks))
+            texts.append(await self.transcriber.finish())
+        except BaseException:
+            for task in self._tasks:
+                task.cancel()
+            raise
+        self._mark("transcript")
+        return " ".join(t.strip() for t in texts if t and t.strip())
+
+    def _feed(self, chunk: bytes) -> None:
+        if self._header is not None:
+            self._header += chunk
+            chunk = self._parse_header()
+            if chunk is None:
+                return
+        self._pcm += chunk
+        size = self.frame_bytes
+        offset = 0
+        while len(self._pcm) - offset >= size and self.ended_by is None:
+            self._frame(bytes(self._pcm[offset:offset + size]))
+            offset += size
+        del self._pcm[:offset]
+
+    def _parse_header(self) -> Optional[bytes]:
+        """Strip a WAV header (and take its sample rate); None while more bytes are needed."""
+        data = self._header
+        if len(data) < 12:
+            return None
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            self._header = None
+            return bytes(data)
+        offset = 12
+        while len(data) >= offset + 8:
+            kind, size = data[offset:offset + 4], struct.unpack_from("<I", data, offset + 4)[0]
+            if kind == b"data":
+                self._header = None
+                return bytes(data[offset + 8:])
+            if offset + 8 + size > MAX_HEADER_BYTES:
+                raise SpeechHeaderError(f"WAV chunk {bytes(kind)!r} of {size} bytes: header larger than {MAX_HEADER_BYTES} bytes")
+            if len(data) < offset + 8 + size:
+                return None
+            if kind == b"fmt ":
+                if size < 16:
+                    raise SpeechHeaderError(f"WAV fmt chunk of {size} bytes, expected at least 16")
+                tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, offset + 8)
+                if tag not in (1, 0xFFFE) or channels != 1 or bits != 16:
+                    raise SpeechFormatError(f"expected 16-bit mono PCM, got format {tag}, {channels} channel(s), {bits} bits")
+                if not MIN_SAMPLE_RATE <= rate <= MAX_SAMPLE_RATE:
+                    raise SpeechHeaderError(f"WAV sample rate {rate} outside {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz")
+                self.sample_rate = rate
+            offset += 8 + size + (size & 1)
+        return None
+
+    def _frame(self, frame: bytes) -> None:
+        self.audio_frames += 1
+        if self.audio_frames >= self.max_audio_frames:
+            self._end("max_audio")  # e.g. a device that keeps sending silence
+            return
+        voiced = self.vad.is_speech(frame)
+        if not self._in_speech:
+            self._preroll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_frames:
+                self._in_speech = True
+                self._mark("speech_start")
+                self._segment += b"".join(self._preroll)
+                self._segment_voiced = True
+                self.speech_frames += len(self._preroll)
+                self._preroll.clear()
+            return
+        self._segment += frame
+        self.speech_frames += 1
+        if voiced:
+            self._silence_run = 0
+            self._segment_voiced = True
+        else:
+            self._silence_run += 1
+        if self._silence_run >= self.end_silence_frames:
+            self._end("silence")
+        elif self.speech_frames >= self.max_speech_frames:
+            self._end("max_length")
+        elif self._silence_run >= self.segment_silence_frames and self._segment_voiced:
+            self._flush_segment()
+
+    def _flush_segment(self) -> None:
+        pcm = bytes(self._segment)
+        self._segment.clear()
+        self._segment_voiced = False
+        self._tasks.append(asyncio.create_task(self._transcribe(pcm)))
+
+    async def _transcribe(self, pcm: bytes) -> str:
+        start = time.perf_counter()
+        try:
+            return await self.transcriber.transcribe(pcm, self.sample_rate)
+        finally:
+            self.transcribe_s += time.perf_counter() - start
+
+    def _end(self, reason: str) -> None:
+        if self._segment_voiced:
+            self._flush_segment()
+        self.ended_by = reason
+        self._mark("speech_end")
+
+    def stages(self) -> Dict[str, float]:
+        """Seconds per stage, for RequestTimings / Server-Timing.
+
+        speech_listen: request start -> end of speech detected (upload while the user talks)
+        speech_vad: time spent framing and classifying audio
+        speech_transcribe: backend time summed over segments (mostly overlapped with the upload)
+        speech_tail: end of speech -> transcript ready (the transcription cost left on the critical path)
+        """
+        end = self.marks.get("speech_end", self.marks.get("upload_end", 0.0))
+        data = {"speech_listen": end, "speech_vad": self.vad_s, "speech_transcribe": self.transcribe_s}
+        if "transcript" in self.marks:
+            data["speech_tail"] = max(0.0, self.marks["transcript"] - end)
+        return data
+
+    def info(self) -> Dict[str, Any]:
+        timing = {event: round(seconds * 1000, 1) for event, seconds in self.marks.items()}
+        timing.update({stage: round(seconds * 1000, 1) for stage, seconds in self.stages().items()})
+        return {
+            "backend": self.transcriber.name,
+            "ended_by": self.ended_by,
+            "segments": len(self._tasks),
+            "audio_ms": self.audio_frames * self.frame_ms,
+            "speech_ms": self.speech_frames * self.frame_ms,
+            "timing_ms": timing,
+        }
+
+
+class SpeechFrontEnd:
+    """Settings shared by all utterances plus running totals for /stats."""
+
+    def __init__(
+        self,
+        backend: str = "openai",
+        model: str = "gpt-4o-mini-transcribe",
+        language: Optional[str] = None,
+        vad_db: float = -45.0,
+        segment_silence_ms: int = 300,
+        end_silence_ms: int = 700,
+        max_speech_s: float = 30.0,
+        max_audio_s: float = 60.0,
+        fake_text: str = "recommend me a sport for today",
+        fake_rtf: float = 0.1,
+    ):
+        if backend not in ("openai", "fake"):
+            raise ValueError(f"SPEECH_BACKEND must be 'openai' or 'fake', got {backend!r}")
+        self.backend = backend
+        self.model = model
+        self.language = language
+        self.vad = EnergyVAD(vad_db)
+        self.segment_silence_ms = segment_silence_ms
+        self.end_silence_ms = end_silence_ms
+        self.max_speech_s = max_speech_s
+        self.max_audio_s = max_audio_s
+        self.fake_text = fake_text
+        self.fake_rtf = fake_rtf
+        self.utterances = 0
+        self.no_speech = 0
+        self.ended_by: Dict[str, int] = {}
+        self.audio_s = 0.0
+        self.listen_s = 0.0
+        self.tail_s = 0.0
+        self.transcribe_s = 0.0
+
+    def pipeline(self, sample_rate: int = 16000, fake_text: Optional[str] = None) -> SpeechPipeline:
+        """A pipeline for one upload; `fake_text` (X-Speech-Text) is only used by the fake backend."""
+        if self.backend == "fake":
+            transcriber: Transcriber = FakeTranscriber(fake_text or self.fake_text, rtf=self.fake_rtf)
+        else:
+            transcriber = OpenAITranscriber(self.model, self.language)
+        return SpeechPipeline(
+            transcriber,
+            self.vad,
+            sample_rate=sample_rate,
+            segment_silence_ms=self.segment_silence_ms,
+            end_silence_ms=self.end_silence_ms,
+            max_speech_s=self.max_speech_s,
+            max_audio_s=self.max_audio_s,
+        )
+
+    def record(self, pipeline: SpeechPipeline, transcript: str) -> None:
+        self.utterances += 1
+        if not transcript:
+            self.no_speech += 1
+        reason = pipeline.ended_by or "unknown"
+        self.ended_by[reason] = self.ended_by.get(reason, 0) + 1
+        stages = pipeline.stages()
+        self.audio_s += pipeline.audio_frames * pipeline.frame_ms / 1000
+        self.listen_s += stages["speech_listen"]
+        self.tail_s += stages.get("speech_tail", 0.0)
+        self.transcribe_s += stages["speech_transcribe"]
+        if metrics.METRICS_ENABLED:
+            metrics.SPEECH_UTTERANCES.inc(1, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        n = max(1, self.utterances)
+        return {
+            "backend": self.backend,
+            "utterances": self.utterances,
+            "no_speech": self.no_speech,
+            "ended_by": dict(self.ended_by),
+            "audio_s": round(self.audio_s, 1),
+            "avg_listen_ms": round(self.listen_s / n * 1000, 1),
+            "avg_transcribe_ms": round(self.transcribe_s / n * 1000, 1),
+            "avg_tail_ms": round(self.tail_s / n * 1000, 1),
+        }
+
+
+def speech_from_env() -> SpeechFrontEnd:
+    """SPEECH_BACKEND (openai|fake), SPEECH_MODEL, SPEECH_LANGUAGE, SPEECH_VAD_DB,
+    SPEECH_SEGMENT_SILENCE_MS, SPEECH_END_SILENCE_MS, SPEECH_MAX_SECONDS, SPEECH_MAX_AUDIO_SECONDS,
+    SPEECH_FAKE_TEXT, SPEECH_FAKE_RTF."""
+    return SpeechFrontEnd(
+        backend=os.getenv("SPEECH_BACKEND", "openai").strip().lower(),
+        model=os.getenv("SPEECH_MODEL", "gpt-4o-mini-transcribe"),
+        language=os.getenv("SPEECH_LANGUAGE") or None,
+        vad_db=float(os.getenv("SPEECH_VAD_DB", "-45")),
+        segment_silence_ms=int(os.getenv("SPEECH_SEGMENT_SILENCE_MS", "300")),
+        end_silence_ms=int(os.getenv("SPEECH_END_SILENCE_MS", "700")),
+        max_speech_s=float(os.getenv("SPEECH_MAX_SECONDS", "30")),
+        max_audio_s=float(os.getenv("SPEECH_MAX_AUDIO_SECONDS", "60")),
+        fake_text=os.getenv("SPEECH_FAKE_TEXT", "recommend me a sport for today"),
+        fake_rtf=float(os.getenv("SPEECH_FAKE_RTF", "0.1")),
+    )
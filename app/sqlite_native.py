@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agents.mcp import MCPServer
+from mcp.types import CallToolResult, ListPromptsResult, TextContent, Tool, ToolAnnotations
+
+_READ_ONLY = ToolAnnotations(readOnlyHint=True)
+_QUERY = {"type": "string", "description": "A single SQL statement"}
+_PARAMS = {"type": "array", "description": "Values for the ? placeholders in the statement", "items": {}}
+
+TOOLS = [
+    Tool(
+        name="read_query",
+        description=(
+            "Run a SELECT query (use ? placeholders and params for values). Results come in pages; "
+            "if `next_offset` is set, call again with offset=next_offset for more rows."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": _QUERY,
+                "params": _PARAMS,
+                "offset": {"type": "integer", "description": "Rows to skip (from next_offset)", "minimum": 0},
+            },
+            "required": ["query"],
+        },
+        annotations=_READ_ONLY,
+    ),
+    Tool(
+        name="write_query",
+        description="Run an INSERT, UPDATE or DELETE statement (use ? placeholders and params for values).",
+        inputSchema={"type": "object", "properties": {"query": _QUERY, "params": _PARAMS}, "required": ["query"]},
+    ),
+    Tool(
+        name="create_table",
+        description="Create a table with a CREATE TABLE statement.",
+        inputSchema={"type": "object", "properties": {"query": _QUERY}, "required": ["query"]},
+    ),
+    Tool(
+        name="list_tables",
+        description="List the tables in the database.",
+        inputSchema={"type": "object", "properties": {}},
+        annotations=_READ_ONLY,
+    ),
+    Tool(
+        name="describe_table",
+        description="Columns of a table (name, type, notnull, default, pk).",
+        inputSchema={
+            "type": "object",
+            "properties": {"table_name": {"type": "string", "description": "Name of the table"}},
+            "required": ["table_name"],
+        },
+        annotations=_READ_ONLY,
+    ),
+]
+
+
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE")  # what write_query runs, as the stdio server did
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def _lstrip_sql(sql: str) -> str:
+    """`sql` without leading whitespace and comments."""
+    while True:
+        sql = sql.lstrip()
+        if sql.startswith("--"):
+            newline = sql.find("\n")
+            sql = "" if newline == -1 else sql[newline + 1:]
+        elif sql.startswith("/*"):
+            end = sql.find("*/", 2)
+            sql = "" if end == -1 else sql[end + 2:]
+        else:
+            return sql
+
+
+def _statement(sql: str, allowed: Tuple[str, ...], tool: str) -> str:
+    """A single statement whose first keyword is in `allowed` (comments may come first)."""
+    body = _lstrip_sql(sql)
+    match = re.match(r"[A-Za-z]+", body)
+    if match is None or match.group().upper() not in allowed:
+        raise ValueError(f"{tool} only accepts {'/'.join(allowed)} statements")
+    # complete_statement knows about string literals and comments, so a ';' inside them doesn't count
+    for i, char in enumerate(body):
+        if char == ";" and sqlite3.complete_statement(body[: i + 1]):
+            if _lstrip_sql(body[i + 1:]):
+                raise ValueError(f"{tool} runs a single statement")
+            break
+    return body
+
+
+def _cell(value: Any, max_chars: int) -> Any:
+    if isinstance(value, bytes):
+        return f"<blob, {len(value)} bytes>"
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"... [{len(value) - max_chars} more chars]"
+    return value
+
+
+class NativeSQLiteServer(MCPServer):
+    """The SQLite tools (read_query, write_query, create_table, list_tables, describe_table)
+    served in-process instead of by `mcp-server-sqlite-npx` over stdio.
+
+    Reads run on a pool of read-only connections (WAL mode, so they never block the writer or
+    each other), one per thread of a thread pool. Writes go through a single connection on its
+    own thread, which serializes them. Statements are parameterized and kept in each
+    connection's statement cache; a progress handler aborts queries past `query_timeout`.
+    Results are cut into pages of at most `max_rows` rows / `max_bytes` bytes of JSON.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        readers: int = 4,
+        query_timeout: float = 5,
+        max_rows: int = 200,
+        max_bytes: int = 64 * 1024,
+        max_cell_chars: int = 2000,
+        name: str = "sqlite",
+    ):
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.readers = max(1, readers)
+        self.query_timeout = query_timeout
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max_bytes
+        self.max_cell_chars = max_cell_chars
+        self._name = name
+        self._read_pool: Optional[ThreadPoolExecutor] = None
+        self._write_pool: Optional[ThreadPoolExecutor] = None
+        self._idle: Optional[asyncio.Queue] = None  # idle read-only connections
+        self._connections: List[sqlite3.Connection] = []
+        self._writer: Optional[sqlite3.Connection] = None
+        # stats
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.pages_truncated = 0
+        self.query_seconds = 0.0
+        self.read_wait_max = 0.0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, timeout=self.query_timeout, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode=WAL")  # persistent: readers and the writer stop blocking each other
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True, timeout=self.query_timeout, check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_pool = ThreadPoolExecutor(1, thread_name_prefix="sqlite-writer")
+        self._read_pool = ThreadPoolExecutor(self.readers, thread_name_prefix="sqlite-reader")
+        # The writer creates the database file if needed, so it opens first
+        self._writer = await loop.run_in_executor(self._write_pool, self._open_writer)
+        readers = await asyncio.gather(*(loop.run_in_executor(self._read_pool, self._open_reader) for _ in range(self.readers)))
+        self._connections = [self._writer, *readers]
+        self._idle = asyncio.Queue()
+        for conn in readers:
+            self._idle.put_nowait(conn)
+
+    async def cleanup(self):
+        for pool in (self._read_pool, self._write_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        for conn in self._connections:
+            conn.interrupt()
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._connections, self._writer, self._idle = [], None, None
+        self._read_pool = self._write_pool = None
+
+    def _timed(self, conn: sqlite3.Connection, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run `work` on the connection's thread; abort it once query_timeout has passed."""
+        deadline = time.monotonic() + self.query_timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            return work(conn)
+        except sqlite3.OperationalError as exception:
+            if str(exception) == "interrupted" and time.monotonic() > deadline:
+                raise QueryTimeout(f"query cancelled after {self.query_timeout:g}s") from None
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    async def _read(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        if self._idle is None:
+            raise ConnectionError("SQLite is not connected")
+        start = time.perf_counter()
+        idle = self._idle
+        conn = await idle.get()
+        self.read_wait_max = max(self.read_wait_max, time.perf_counter() - start)
+        loop = asyncio.get_running_loop()
+
+        def release(_) -> None:
+            # Runs on the reader thread once it is done with the connection, even after a cancel
+            try:
+                loop.call_soon_threadsafe(idle.put_nowait, conn)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+        job = self._read_pool.submit(self._timed, conn, work)
+        job.add_done_callback(release)
+        try:
+            return await asyncio.wrap_future(job)
+        except asyncio.CancelledError:
+            # Request cancelled mid-query: stop the query. The connection is not back in `idle`
+            # until release() runs, so no other request can get it while the thread still uses it.
+            if not job.done():
+                conn.interrupt()
+            raise
+
+    async def _write(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        if self._writer is None:
+            raise ConnectionError("SQLite is not connected")
+        # One writer thread: statements queue up in the executor and run one at a time
+        return await asyncio.get_running_loop().run_in_executor(self._write_pool, self._timed, self._writer, work)
+
+    def _page(self, conn: sqlite3.Connection, query: str, params: list, offset: int) -> Dict[str, Any]:
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description or ()]
+        skipped = 0
+        while skipped < offset:
+            batch = cursor.fetchmany(min(1000, offset - skipped))
+            if not batch:
+                break
+            skipped += len(batch)
+        rows: List[list] = []
+        size = 0
+        truncated = False
+        for row in cursor:
+            if len(rows) >= self.max_rows or size >= self.max_bytes:
+                truncated = True
+                break
+            cells = [_cell(v, self.max_cell_chars) for v in row]
+            size += len(json.dumps(cells, ensure_ascii=False, default=str))
+            rows.append(cells)
+        cursor.close()
+        page: Dict[str, Any] = {"columns": columns, "rows": rows, "offset": offset, "row_count": len(rows)}
+        if truncated:
+            self.pages_truncated += 1
+            page["next_offset"] = offset + len(rows)
+        return page
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, query: str, params: list) -> Dict[str, Any]:
+        cursor = conn.execute(query, params)
+        return {"affected_rows": cursor.rowcount, "last_row_id": cursor.lastrowid}
+
+    async def _call(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        query = str(arguments.get("query") or "").strip()
+        params = list(arguments.get("params") or [])
+        if tool_name == "read_query":
+            offset = max(0, int(arguments.get("offset") or 0))
+            return await self._read(lambda conn: self._page(conn, query, params, offset))
+        if tool_name == "list_tables":
+            sql = "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            return await self._read(lambda conn: [r[0] for r in conn.execute(sql)])
+        if tool_name == "describe_table":
+            sql = 'SELECT name, type, "notnull", dflt_value, pk FROM pragma_table_info(?)'
+            table = str(arguments.get("table_name") or "")
+            columns = await self._read(lambda conn: conn.execute(sql, [table]).fetchall())
+            if not columns:
+                raise ValueError(f"no such table: {table}")
+            return [dict(zip(("name", "type", "notnull", "default", "pk"), c)) for c in columns]
+        if tool_name == "write_query":
+            query = _statement(query, WRITE_KEYWORDS, tool_name)
+            return await self._write(lambda conn: self._execute(conn, query, params))
+        if tool_name == "create_table":
+            if not re.match(r"CREATE\s+TABLE\b", _lstrip_sql(query), re.IGNORECASE):
+                raise ValueError("create_table only accepts CREATE TABLE statements")
+            query = _statement(query, ("CREATE",), tool_name)
+            return await self._write(lambda conn: self._execute(conn, query, []))
+        raise ValueError(f"unknown tool: {tool_name}")
+
+    async def list_tools(self, run_context=None, agent=None):
+        return list(TOOLS)
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]) -> CallToolResult:
+        start = time.perf_counter()
+        try:
+            data = await self._call(tool_name, arguments or {})
+        except (sqlite3.Error, QueryTimeout, ValueError, TypeError) as exception:
+            # Reported to the model like an MCP tool error, so it can fix the query
+            self.errors += 1
+            self.timeouts += isinstance(exception, QueryTimeout)
+            return CallToolResult(content=[TextContent(type="text", text=f"Error: {exception}")], isError=True)
+        finally:
+            self.query_seconds += time.perf_counter() - start
+            if tool_name in ("write_query", "create_table"):
+                self.writes += 1
+            else:
+                self.reads += 1
+        text = json.dumps(data, ensure_ascii=False, default=str)
+        return CallToolResult(content=[TextContent(type="text", text=text)])
+
+    async def ping(self) -> None:
+        await self._read(lambda conn: conn.execute("SELECT 1").fetchone())
+
+    async def list_prompts(self):
+        return ListPromptsResult(prompts=[])
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        raise ValueError(f"{self.name} has no prompts")
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.reads + self.writes
+        return {
+            "db_path": str(self.db_path),
+            "readers": self.readers,
+            "idle_readers": self._idle.qsize() if self._idle is not None else 0,
+            "reads": self.reads,
+            "writes": self.writes,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "pages_truncated": self.pages_truncated,
+            "query_ms_avg": round(self.query_seconds / calls * 1000, 2) if calls else 0.0,
+            "read_wait_ms_max": round(self.read_wait_max * 1000, 2),
+        }
+
+
+def native_sqlite_from_env(db_path: Path) -> NativeSQLiteServer:
+    """SQLITE_READERS, SQLITE_QUERY_TIMEOUT, SQLITE_MAX_ROWS / SQLITE_MAX_BYTES per page, SQLITE_MAX_CELL_CHARS."""
+    return NativeSQLiteServer(
+        db_path,
+        readers=int(os.getenv("SQLITE_READERS", "4")),
+        query_timeout=float(os.getenv("SQLITE_QUERY_TIMEOUT", "5")),
+        max_rows=int(os.getenv("SQLITE_MAX_ROWS", "200")),
+        max_bytes=int(os.getenv("SQLITE_MAX_BYTES", str(64 * 1024))),
+        max_cell_chars=int(os.getenv("SQLITE_MAX_CELL_CHARS", "2000")),
+    )
@@ -0,0 +1,496 @@
+"""Telemetry ingestion into a SQLite database of its own (TELEMETRY_DB_PATH), off by default.
+
+Devices POST batches of readings to /telemetry, either as JSON lines
+
+    {"device": "watch-17", "metric": "heart_rate", "value": 72, "ts": 1767225600.5}
+    {"device": "watch-17", "ts": 1767225601, "values": {"heart_rate": 73, "spo2": 97}}
+
+or in the compact binary format (Content-Type: application/x-biot-telemetry, little-endian):
+
+    b"BTL1" | u16 n_devices | n_devices x (u8 length, UTF-8 name)
+            | u16 n_metrics | n_metrics x (u8 length, UTF-8 name)
+            | records of (u16 device index, u16 metric index, f64 unix seconds, f32 value)
+
+All batches go through one writer: whatever arrived while the previous transaction was
+committing is written in the next one (group commit), in WAL mode. The same transaction
+updates per-device, per-metric minute and hour aggregates (count/sum/min/max), so the agent
+can answer "average heart rate per hour today" from telemetry_hour instead of scanning
+telemetry_readings. The agent reads them through the telemetry_devices / telemetry_series
+tools; the database of the SQLite tools (SQLITE_DB_PATH) is not touched, so ingest load
+doesn't invalidate their result cache.
+"""
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app import metrics
+
+TELEMETRY = os.getenv("TELEMETRY", "0").strip().lower() not in ("0", "false", "off", "no")
+TELEMETRY_DB_PATH = Path(os.getenv("TELEMETRY_DB_PATH", "data/telemetry.db"))
+BINARY_TYPE = "application/x-biot-telemetry"
+MAGIC = b"BTL1"
+RECORD = struct.Struct("<HHdf")
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+MAX_TS = 253402300799.0  # 9999-12-31 23:59:59 UTC
+
+Reading = Tuple[str, str, float, float]  # device_id, metric, ts (unix seconds), value
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry_readings (
+    device_id TEXT NOT NULL, metric TEXT NOT NULL, ts REAL NOT NULL, value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS telemetry_readings_device ON telemetry_readings (device_id, metric, ts);
+CREATE TABLE IF NOT EXISTS telemetry_minute (
+    device_id TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL, sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL,
+    PRIMARY KEY (device_id, metric, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS telemetry_hour (
+    device_id TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL, sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL,
+    PRIMARY KEY (device_id, metric, bucket)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO {table} (device_id, metric, bucket, count, sum, min, max) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (device_id, metric, bucket) DO UPDATE SET
+    count = count + excluded.count, sum = sum + excluded.sum,
+    min = MIN(min, excluded.min), max = MAX(max, excluded.max)
+"""
+
+TELEMETRY_INSTRUCTIONS = (
+    "- For device telemetry (sensor readings such as heart rate), call telemetry_devices to see which "
+    "devices and metrics exist, then telemetry_series for hourly or per-minute count/avg/min/max; "
+    "raw readings only when single values are needed.\n"
+)
+
+
+class TelemetryFormatError(ValueError):
+    pass
+
+
+class TelemetryBusy(Exception):
+    """More rows are queued than TELEMETRY_MAX_QUEUE_ROWS; the device should retry later."""
+
+
+def _valid(ts: float, value: float) -> bool:
+    # NaN fails every comparison, so this also rejects NaN timestamps and values
+    return 0 <= ts <= MAX_TS and -math.inf < value < math.inf
+
+
+def _timestamp(value: Any, now: float) -> float:
+    if value is None:
+        return now
+    ts = float(value)
+    if ts > 1e11:
+        ts /= 1000  # milliseconds
+    if not 0 <= ts <= MAX_TS:
+        raise ValueError(f"ts {value!r} is not a unix time in seconds or milliseconds")
+    return ts
+
+
+def parse_jsonl(body: bytes, now: Optional[float] = None) -> Tuple[List[Reading], int, List[str]]:
+    """Readings, rejected line count and the first few errors from a JSON-lines body."""
+    now = time.time() if now is None else now
+    readings: List[Reading] = []
+    errors: List[str] = []
+    rejected = 0
+    for number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            device = str(item.get("device") or item.get("device_id") or "")
+            if not device:
+                raise ValueError("missing device")
+            ts = _timestamp(item.get("ts"), now)
+            values = item["values"] if "values" in item else {item["metric"]: item["value"]}
+            line_readings = []
+            for metric, value in values.items():
+                value = float(value)
+                if not math.isfinite(value):
+                    raise ValueError(f"{metric}: value is not a finite number")
+                line_readings.append((device, str(metric), ts, value))
+            readings.extend(line_readings)
+        except (ValueError, TypeError, KeyError, AttributeError) as exception:
+            rejected += 1
+            if len(errors) < 5:
+                errors.append(f"line {number}: {type(exception).__name__}: {exception}")
+    if rejected > len(errors):
+        errors.append(f"... {rejected - len(errors)} more")
+    return readings, rejected, errors
+
+
+def _names(body: bytes, offset: int) -> Tuple[List[str], int]:
+    (count,) = struct.unpack_from("<H", body, offset)
+    offset += 2
+    names = []
+    for _ in range(count):
+        size = body[offset]
+        names.append(body[offset + 1:offset + 1 + size].decode("utf-8"))
+        offset += 1 + size
+    return names, offset
+
+
+def parse_binary(body: bytes) -> Tuple[List[Reading], int, List[str]]:
+    """Readings from the compact binary format (see the module docstring)."""
+    if body[:4] != MAGIC:
+        raise TelemetryFormatError("binary telemetry must start with b'BTL1'")
+    try:
+        devices, offset = _names(body, 4)
+        metric_names, offset = _names(body, offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as exception:
+        raise TelemetryFormatError(f"bad binary header: {exception}") from None
+    if (len(body) - offset) % RECORD.size:
+        raise TelemetryFormatError(f"record section is not a multiple of {RECORD.size} bytes")
+    readings: List[Reading] = []
+    rejected = 0
+    for device, metric, ts, value in RECORD.iter_unpack(memoryview(body)[offset:]):
+        if device >= len(devices) or metric >= len(metric_names) or not _valid(ts, value):
+            rejected += 1
+            continue
+        readings.append((devices[device], metric_names[metric], ts, value))
+    errors = [f"{rejected} records with unknown device/metric index, bad timestamp or non-finite value"] if rejected else []
+    return readings, rejected, errors
+
+
+def encode_binary(readings: List[Reading]) -> bytes:
+    """Compact binary batch for devices and benchmarks (about 16 bytes per reading)."""
+    devices: Dict[str, int] = {}
+    metric_names: Dict[str, int] = {}
+    records = bytearray()
+    for device, metric, ts, value in readings:
+        records += RECORD.pack(devices.setdefault(device, len(devices)), metric_names.setdefault(metric, len(metric_names)), ts, value)
+    header = bytearray(MAGIC)
+    for names in (devices, metric_names):
+        header += struct.pack("<H", len(names))
+        for name in names:
+            raw = name.encode("utf-8")[:255]
+            header += bytes([len(raw)]) + raw
+    return bytes(header + records)
+
+
+def aggregate(readings: List[Reading], seconds: int) -> Dict[Tuple[str, str, int], List[float]]:
+    """(device, metric, bucket start) -> [count, sum, min, max]."""
+    buckets: Dict[Tuple[str, str, int], List[float]] = {}
+    for device, metric, ts, value in readings:
+        key = (device, metric, int(ts // seconds) * seconds)
+        entry = buckets.get(key)
+        if entry is None:
+            buckets[key] = [1, value, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            if value < entry[2]:
+                entry[2] = value
+            if value > entry[3]:
+                entry[3] = value
+    return buckets
+
+
+def _rollup(minutes: Dict[Tuple[str, str, int], List[float]], seconds: int) -> Dict[Tuple[str, str, int], List[float]]:
+    buckets: Dict[Tuple[str, str, int], List[float]] = {}
+    for (device, metric, bucket), (count, total, low, high) in minutes.items():
+        key = (device, metric, bucket // seconds * seconds)
+        entry = buckets.get(key)
+        if entry is None:
+            buckets[key] = [count, total, low, high]
+        else:
+            entry[0] += count
+            entry[1] += total
+            entry[2] = min(entry[2], low)
+            entry[3] = max(entry[3], high)
+    return buckets
+
+
+class TelemetryReader:
+    """Read-only queries over the aggregates (one connection per thread)."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._readers = threading.local()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=5)
+        return conn
+
+    def _series(self, device_id: str, metric: Optional[str], resolution: str, since: float, limit: int) -> List[Dict[str, Any]]:
+        where, params = "device_id = ? AND {column} >= ?", [device_id, since]
+        if metric:
+            where += " AND metric = ?"
+            params.append(metric)
+        if resolution == "raw":
+            sql = (f"SELECT metric, ts, value FROM telemetry_readings WHERE {where.format(column='ts')} "
+                   f"ORDER BY ts DESC LIMIT ?")
+            rows = self._reader().execute(sql, [*params, limit]).fetchall()
+            return [{"metric": m, "ts": ts, "value": value} for m, ts, value in rows]
+        sql = (f"SELECT metric, bucket, count, sum, min, max FROM telemetry_{resolution} "
+               f"WHERE {where.format(column='bucket')} ORDER BY bucket DESC LIMIT ?")
+        rows = self._reader().execute(sql, [*params, limit]).fetchall()
+        return [
+            {"metric": m, "bucket": bucket, "count": count, "avg": round(total / count, 3), "min": low, "max": high}
+            for m, bucket, count, total, low, high in rows
+        ]
+
+    async def series(self, device_id: str, metric: Optional[str] = None, resolution: str = "minute",
+                     since: float = 0.0, limit: int = 500) -> List[Dict[str, Any]]:
+        """Newest first: aggregates per minute/hour bucket, or raw readings."""
+        if resolution != "raw" and resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be raw, minute or hour, got {resolution!r}")
+        return await asyncio.to_thread(self._series, device_id, metric, resolution, since, limit)
+
+    def _devices(self, limit: int) -> List[Dict[str, Any]]:
+        sql = ("SELECT device_id, metric, SUM(count), MIN(bucket), MAX(bucket) FROM telemetry_hour "
+               "GROUP BY device_id, metric ORDER BY device_id, metric LIMIT ?")
+        return [
+            {"device_id": device, "metric": metric, "readings": count, "first_hour": first, "last_hour": last}
+            for device, metric, count, first, last in self._reader().execute(sql, [limit])
+        ]
+
+    async def devices(self, limit: int = 200) -> List[Dict[str, Any]]:
+        """Devices and metrics with their reading counts and first/last hour bucket."""
+        return await asyncio.to_thread(self._devices, limit)
+
+
+class TelemetryWriter(TelemetryReader):
+    """Single batched writer with group commits, plus the read-only queries of TelemetryReader."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_group_rows: int = 50000,
+        max_queue_rows: int = 500000,
+        synchronous: str = "NORMAL",
+        keep_raw: bool = True,
+        max_body_bytes: int = 16 * 1024 * 1024,
+    ):
+        super().__init__(db_path)
+        self.max_body_bytes = max_body_bytes
+        self.max_group_rows = max_group_rows
+        self.max_queue_rows = max_queue_rows
+        self.synchronous = synchronous
+        self.keep_raw = keep_raw
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._pending: Deque[Tuple[List[Reading], asyncio.Future]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.queued_rows = 0
+        self.rows = 0
+        self.rejected = 0
+        self.commits = 0
+        self.max_commit_rows = 0
+        self.commit_s = 0.0
+        self.busy = 0
+        self.started = time.monotonic()
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.executescript(SCHEMA)
+        return conn
+
+    async def start(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="telemetry-writer")
+        self._writer = await asyncio.get_running_loop().run_in_executor(self._pool, self._open_writer)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Commit what is queued (for at most `timeout` seconds), then stop; batches still
+        waiting after that fail with ConnectionError."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._pending and not self._task.done() and time.monotonic() < deadline:
+            self._wakeup.set()
+            await asyncio.sleep(0.01)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except BaseException as exception:
+            print(f"[telemetry] writer stopped with {type(exception).__name__}: {exception}", file=sys.stderr)
+        self._task = None
+        self._wakeup = None
+        self._fail_pending(ConnectionError("telemetry writer stopped before the batch was written"))
+        self._pool.submit(self._writer.close).result()
+        self._pool.shutdown()
+
+    def _fail_pending(self, exception: Exception) -> None:
+        while self._pending:
+            readings, future = self._pending.popleft()
+            self.queued_rows -= len(readings)
+            if not future.done():
+                future.set_exception(exception)
+
+    def submit(self, readings: List[Reading]) -> asyncio.Future:
+        """Queue a batch; the future resolves with the row count once its transaction committed."""
+        if self._wakeup is None or self._task.done():
+            raise ConnectionError("telemetry writer is not running")
+        if self.queued_rows + len(readings) > self.max_queue_rows:
+            self.busy += 1
+            raise TelemetryBusy(f"{self.queued_rows} rows waiting to be written")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((readings, future))
+        self.queued_rows += len(readings)
+        self._wakeup.set()
+        return future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                # Everything that queued up during the previous commit goes into this one
+                group, rows = [], []
+                while self._pending and (not rows or len(rows) + len(self._pending[0][0]) <= self.max_group_rows):
+                    readings, future = self._pending.popleft()
+                    group.append((readings, future))
+                    rows.extend(readings)
+                self.queued_rows -= len(rows)
+                start = time.perf_counter()
+                try:
+                    written = await loop.run_in_executor(self._pool, self._commit, [readings for readings, _ in group])
+                except BaseException as exception:
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(
+                                exception if isinstance(exception, Exception)
+                                else ConnectionError("telemetry writer stopped while the batch was being written")
+                            )
+                    if not isinstance(exception, Exception):
+                        raise
+                    continue
+                elapsed = time.perf_counter() - start
+                total = sum(written)
+                self.record_rejected(len(rows) - total)
+                self.commits += 1
+                self.rows += total
+                self.commit_s += elapsed
+                self.max_commit_rows = max(self.max_commit_rows, total)
+                if metrics.METRICS_ENABLED:
+                    metrics.TELEMETRY_COMMIT_SECONDS.observe(elapsed)
+                    metrics.TELEMETRY_ROWS.inc(total, "written")
+                for (_, future), count in zip(group, written):
+                    if not future.done():
+                        future.set_result(count)
+
+    def _commit(self, batches: List[List[Reading]]) -> List[int]:
+        """Write a group of batches in one transaction; returns the rows written per batch.
+
+        Readings with a bad timestamp or value (possible from in-process callers of submit())
+        are dropped here, so they cannot fail the other devices' batches in the group."""
+        rows: List[Reading] = []
+        written = []
+        for readings in batches:
+            valid = [reading for reading in readings if _valid(reading[2], reading[3])]
+            rows.extend(valid)
+            written.append(len(valid))
+        minutes = aggregate(rows, 60)
+        hours = _rollup(minutes, 3600)
+        conn = self._writer
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.keep_raw:
+                conn.executemany("INSERT INTO telemetry_readings (device_id, metric, ts, value) VALUES (?, ?, ?, ?)", rows)
+            conn.executemany(_UPSERT.format(table="telemetry_minute"), [(*key, *agg) for key, agg in minutes.items()])
+            conn.executemany(_UPSERT.format(table="telemetry_hour"), [(*key, *agg) for key, agg in hours.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass  # keep the original error
+            raise
+        return written
+
+    def record_rejected(self, count: int) -> None:
+        self.rejected += count
+        if count and metrics.METRICS_ENABLED:
+            metrics.TELEMETRY_ROWS.inc(count, "rejected")
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = max(1e-9, time.monotonic() - self.started)
+        return {
+            "rows_written": self.rows,
+            "rows_rejected": self.rejected,
+            "rows_queued": self.queued_rows,
+            "rejected_busy": self.busy,
+            "commits": self.commits,
+            "rows_per_commit": round(self.rows / self.commits, 1) if self.commits else 0.0,
+            "max_rows_per_commit": self.max_commit_rows,
+            "avg_commit_ms": round(self.commit_s / self.commits * 1000, 2) if self.commits else 0.0,
+            "rows_per_s": round(self.rows / uptime, 1),
+        }
+
+
+def telemetry_from_env(db_path: Optional[Path] = None) -> Optional[TelemetryWriter]:
+    """TELEMETRY=1 enables ingestion into TELEMETRY_DB_PATH; TELEMETRY_MAX_GROUP_ROWS,
+    TELEMETRY_MAX_QUEUE_ROWS, TELEMETRY_SYNCHRONOUS (NORMAL/FULL), TELEMETRY_KEEP_RAW=0
+    (aggregates only) and TELEMETRY_MAX_BODY_BYTES tune the writer."""
+    if not TELEMETRY:
+        return None
+    synchronous = os.getenv("TELEMETRY_SYNCHRONOUS", "NORMAL").strip().upper()
+    if synchronous not in ("OFF", "NORMAL", "FULL"):
+        raise ValueError(f"TELEMETRY_SYNCHRONOUS must be OFF, NORMAL or FULL, got {synchronous!r}")
+    return TelemetryWriter(
+        db_path or TELEMETRY_DB_PATH,
+        max_group_rows=int(os.getenv("TELEMETRY_MAX_GROUP_ROWS", "50000")),
+        max_queue_rows=int(os.getenv("TELEMETRY_MAX_QUEUE_ROWS", "500000")),
+        synchronous=synchronous,
+        keep_raw=os.getenv("TELEMETRY_KEEP_RAW", "1").strip().lower() not in ("0", "false", "off", "no"),
+        max_body_bytes=int(os.getenv("TELEMETRY_MAX_BODY_BYTES", str(16 * 1024 * 1024))),
+    )
+
+
+def make_telemetry_tools(reader: TelemetryReader) -> list:
+    """Read-only function tools over the telemetry database for the agent."""
+    from agents import function_tool
+
+    @function_tool
+    async def telemetry_devices() -> str:
+        """List the devices and metrics that have telemetry, with reading counts and the unix
+        seconds of their first and last hour."""
+        try:
+            return json.dumps(await reader.devices())
+        except sqlite3.Error as exception:
+            return f"Error: {exception}"
+
+    @function_tool
+    async def telemetry_series(device_id: str, metric: Optional[str] = None, resolution: str = "hour",
+                               since: float = 0.0, limit: int = 100) -> str:
+        """Newest-first telemetry of one device: per-bucket count/avg/min/max, or raw readings.
+
+        Args:
+            device_id: Device as listed by telemetry_devices.
+            metric: Only this metric (e.g. heart_rate); all metrics if omitted.
+            resolution: "hour", "minute" or "raw".
+            since: Only buckets/readings at or after this unix time (seconds).
+            limit: Maximum rows (1-1000).
+        """
+        try:
+            rows = await reader.series(device_id, metric, resolution, since, max(1, min(limit, 1000)))
+        except (ValueError, sqlite3.Error) as exception:
+            return f"Error: {exception}"
+        return json.dumps(rows)
+
+    return [telemetry_devices, telemetry_series]
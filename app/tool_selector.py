@@ -0,0 +1,153 @@
+import os
+import re
+from typing import Any, Dict, FrozenSet, Optional, Sequence, Tuple
+
+from app import metrics
+from app.model_router import match_keyword
+
+# Tool group -> MCP server providing it
+GROUP_SERVERS = {"sport": "sport_recommender", "filesystem": "filesystem", "sqlite": "sqlite"}
+DOCS = "docs"
+GROUPS = tuple(GROUP_SERVERS) + (DOCS,)
+# Function tools in agent.tools belong to "docs" (retrieval) unless listed here
+TOOL_GROUPS = {
+    "search_file_contents": "filesystem", "read_file_lines": "filesystem",
+    "telemetry_devices": "sqlite", "telemetry_series": "sqlite",
+}
+
+# Word prefixes as in app/model_router.py (keywords under 4 letters must match whole words)
+DEFAULT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "sport": ("sport", "workout", "exercis", "training", "fitness", "activit", "running", "jogging"),
+    "filesystem": (
+        "file", "folder", "director", "path", "txt", "csv", "json", "markdown", "md", "sample", "note", "log",
+        "search", "find", "mention", "contain",
+    ),
+    "sqlite": (
+        "table", "database", "sql", "sqlite", "db", "query", "row", "column", "schema", "record",
+        "insert", "select", "measurement", "telemetry", "reading", "average", "trend",
+        # vital signs come from device telemetry, not the sport recommender
+        "heart", "pulse", "bpm", "spo2", "oxygen", "temperatur", "vital",
+    ),
+    DOCS: (
+        "project", "concept", "biot", "biomed", "iot", "integration", "app", "sensor", "device",
+        "architect", "requirement", "pdf", "document", "smartdevice",
+    ),
+}
+
+
+def parse_keywords(raw: str) -> Dict[str, Tuple[str, ...]]:
+    """TOOL_SELECT_KEYWORDS: "group=word,word;group=word" adds keywords to the built-in lists."""
+    keywords = {group: tuple(words) for group, words in DEFAULT_KEYWORDS.items()}
+    for part in raw.split(";"):
+        if "=" not in part:
+            continue
+        group, words = part.split("=", 1)
+        group = group.strip().lower()
+        if group not in keywords:
+            raise ValueError(f"TOOL_SELECT_KEYWORDS: unknown tool group {group!r}, expected one of {GROUPS}")
+        keywords[group] += tuple(w.strip().lower() for w in words.split(",") if w.strip())
+    return keywords
+
+
+class _SelectionStats:
+    def __init__(self):
+        self.runs = 0
+        self.model_calls = 0
+        self.input_tokens = 0
+
+
+class ToolSelector:
+    """Gives each request an agent with only the tool groups its message is about.
+
+    Every model turn carries the JSON schemas of all tools the agent has, so a question about
+    the sport recommender would otherwise also pay for the filesystem, SQLite and retrieval
+    schemas. Groups are picked with keyword rules over the message and the user's last
+    `history_turns` messages in the session, so a follow-up ("and last week?") keeps the tools of
+    the topic it refers to without older topics sticking forever; when no group matches, the
+    full agent is used. Keyword rules can still miss a tool the model would
+    have used; TOOL_SELECT=0 sends every tool. Variants are cloned once per (agent, groups) and reused.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, Tuple[str, ...]]] = None, enabled: bool = True,
+                 history_turns: int = 2):
+        self.keywords = keywords or DEFAULT_KEYWORDS
+        self.enabled = enabled
+        self.history_turns = history_turns
+        self._variants: Dict[Tuple[int, FrozenSet[str]], Any] = {}
+        self._stats: Dict[str, _SelectionStats] = {}
+
+    def select(self, message: str, turns: Sequence[Tuple[str, str]] = ()) -> Optional[FrozenSet[str]]:
+        """Tool groups for a message and the session's (user, assistant) turns before it, or None for all of them."""
+        if not self.enabled:
+            return None
+        recent = [user for user, _ in turns[-self.history_turns:]] if self.history_turns > 0 else []
+        words = set(re.findall(r"\w+", " ".join((*recent, message)).lower()))
+        groups = frozenset(
+            group for group, keywords in self.keywords.items()
+            if any(match_keyword(w, keyword) for keyword in keywords for w in words)
+        )
+        if not groups or len(groups) == len(GROUPS):
+            return None
+        return groups
+
+    def agent_for(self, agent, groups: Optional[FrozenSet[str]]):
+        """The agent restricted to `groups`; cached per base agent (rebuilt agents get new variants)."""
+        if groups is None:
+            return agent
+        key = (id(agent), groups)
+        variant = self._variants.get(key)
+        if variant is None or variant[0] is not agent:
+            if len(self._variants) > 64:
+                self._variants.clear()  # old agents from supervisor rebuilds
+            servers = {GROUP_SERVERS[g] for g in groups if g in GROUP_SERVERS}
+            variant = self._variants[key] = (agent, agent.clone(
+                mcp_servers=[s for s in agent.mcp_servers if s.name in servers],
+                tools=[t for t in agent.tools if TOOL_GROUPS.get(getattr(t, "name", ""), DOCS) in groups],
+            ))
+        return variant[1]
+
+    @staticmethod
+    def label(groups: Optional[FrozenSet[str]]) -> str:
+        return "+".join(sorted(groups)) if groups is not None else "all"
+
+    def record(self, groups: Optional[FrozenSet[str]], usage) -> None:
+        """Input tokens of a finished run, per selection (for the all-tools vs subset comparison)."""
+        label = self.label(groups)
+        stats = self._stats.get(label)
+        if stats is None:
+            stats = self._stats[label] = _SelectionStats()
+        stats.runs += 1
+        if usage is not None:
+            stats.model_calls += usage.requests
+            stats.input_tokens += usage.input_tokens
+        if metrics.METRICS_ENABLED:
+            metrics.TOOL_SELECTIONS.inc(1, label)
+
+    def stats(self) -> Dict[str, Any]:
+        selections = {
+            label: {
+                "runs": s.runs,
+                "input_tokens_per_run": round(s.input_tokens / s.runs, 1) if s.runs else 0.0,
+                "input_tokens_per_model_call": round(s.input_tokens / s.model_calls, 1) if s.model_calls else 0.0,
+            }
+            for label, s in sorted(self._stats.items())
+        }
+        full = self._stats.get("all")
+        subset = [s for label, s in self._stats.items() if label != "all"]
+        subset_calls = sum(s.model_calls for s in subset)
+        data: Dict[str, Any] = {"enabled": self.enabled, "selections": selections}
+        if subset_calls:
+            data["subset_input_tokens_per_model_call"] = round(sum(s.input_tokens for s in subset) / subset_calls, 1)
+        if full is not None and full.model_calls:
+            data["all_tools_input_tokens_per_model_call"] = round(full.input_tokens / full.model_calls, 1)
+        return data
+
+
+def selector_from_env() -> ToolSelector:
+    """TOOL_SELECT=0 always sends every tool; TOOL_SELECT_KEYWORDS extends the keyword rules and
+    TOOL_SELECT_HISTORY_TURNS (default 2) sets how many earlier user messages count."""
+    return ToolSelector(
+        keywords=parse_keywords(os.getenv("TOOL_SELECT_KEYWORDS", "")),
+        enabled=os.getenv("TOOL_SELECT", "1").strip().lower() not in ("0", "false", "off", "no"),
+        history_turns=int(os.getenv("TOOL_SELECT_HISTORY_TURNS", "2")),
+    )
@@ -0,0 +1,113 @@
+"""Local stand-ins for the app's MCP servers, used by the benchmark (bench/run_bench.py).
+
+    python bench/fake_mcp.py sport --port 8000    # like mcp_server/dice_and_sport.py (streamable HTTP)
+    python bench/fake_mcp.py filesystem           # stdio, replaces @modelcontextprotocol/server-filesystem
+    python bench/fake_mcp.py sqlite               # stdio, replaces mcp-server-sqlite-npx
+
+Every tool sleeps FAKE_MCP_LATENCY_MS (default 20) before answering, so tool round trips
+cost roughly what a real local server costs without depending on npx or a database.
+"""
+import argparse
+import asyncio
+import os
+import random
+
+from mcp.server.fastmcp import FastMCP
+
+LATENCY_S = float(os.getenv("FAKE_MCP_LATENCY_MS", "20")) / 1000
+
+
+class SportRecommender:
+    def __init__(self):
+        self.sports = {
+            1: "walking",
+            2: "jogging",
+            3: "swimming",
+            4: "cycling",
+            5: "fitness studio"
+        }
+
+    def recommend(self) -> dict:
+        # No print here: logging on every call would distort the measurements
+        dice = random.randint(1, 5)
+        return {"sport": self.sports[dice], "dice_roll": dice}
+
+
+def make_sport(host: str, port: int) -> FastMCP:
+    mcp = FastMCP("StatefulServer", host=host, port=port, log_level="WARNING")
+    recommender = SportRecommender()
+
+    @mcp.tool()
+    async def recommend_sport() -> dict:
+        """Returns a sport recommendation (calls the dice simulator)."""
+        await asyncio.sleep(LATENCY_S)
+        return recommender.recommend()
+
+    return mcp
+
+
+def make_filesystem() -> FastMCP:
+    mcp = FastMCP("filesystem", log_level="WARNING")
+
+    @mcp.tool()
+    async def list_allowed_directories() -> str:
+        """List the directories this server may access."""
+        await asyncio.sleep(LATENCY_S)
+        return "Allowed directories:\n/bench/files"
+
+    @mcp.tool()
+    async def list_directory(path: str) -> str:
+        """List files and directories in a path."""
+        await asyncio.sleep(LATENCY_S)
+        return "\n".join(f"[FILE] notes_{i}.txt" for i in range(10))
+
+    @mcp.tool()
+    async def read_text_file(path: str) -> str:
+        """Read a text file."""
+        await asyncio.sleep(LATENCY_S)
+        return f"Contents of {path}\n" + "lorem ipsum dolor sit amet " * 40
+
+    return mcp
+
+
+def make_sqlite() -> FastMCP:
+    mcp = FastMCP("sqlite", log_level="WARNING")
+
+    @mcp.tool()
+    async def list_tables() -> list:
+        """List the tables in the database."""
+        await asyncio.sleep(LATENCY_S)
+        return ["patients", "measurements"]
+
+    @mcp.tool()
+    async def describe_table(table_name: str) -> list:
+        """Describe the columns of a table."""
+        await asyncio.sleep(LATENCY_S)
+        return [{"name": "id", "type": "INTEGER"}, {"name": "value", "type": "REAL"}]
+
+    @mcp.tool()
+    async def read_query(query: str) -> list:
+        """Run a SELECT query."""
+        await asyncio.sleep(LATENCY_S)
+        return [{"id": i, "value": round(random.uniform(36.0, 38.0), 1)} for i in range(20)]
+
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake MCP servers for benchmarking")
+    parser.add_argument("kind", choices=["sport", "filesystem", "sqlite"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP port (sport only)")
+    args = parser.parse_args()
+
+    if args.kind == "sport":
+        make_sport(args.host, args.port).run(transport="streamable-http")
+    elif args.kind == "filesystem":
+        make_filesystem().run(transport="stdio")
+    else:
+        make_sqlite().run(transport="stdio")
+
+
+if __name__ == "__main__":
+    main()
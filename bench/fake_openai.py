@@ -0,0 +1,241 @@
+"""Local stand-in for the OpenAI Responses API, used by the benchmark (bench/run_bench.py).
+
+    python bench/fake_openai.py --port 9101 --ttft-ms 300 --tokens-per-s 80 --output-tokens 60 [--rpm-limit 600]
+    OPENAI_BASE_URL=http://127.0.0.1:9101/v1 OPENAI_API_KEY=fake uv run uvicorn app.main:app
+
+POST /v1/responses answers after `ttft` plus `output_tokens / tokens_per_s` seconds (streamed
+token by token when stream=true). Messages mentioning "find", "sport", "table" or "file" first get
+a function call for the matching tool, so a run also exercises the MCP and file index paths.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TTFT_S = float(os.getenv("FAKE_OPENAI_TTFT_MS", "300")) / 1000
+TOKENS_PER_S = float(os.getenv("FAKE_OPENAI_TOKENS_PER_S", "80"))
+OUTPUT_TOKENS = int(os.getenv("FAKE_OPENAI_OUTPUT_TOKENS", "60"))
+RPM_LIMIT = float(os.getenv("FAKE_OPENAI_RPM_LIMIT", "0"))  # > 0: answer 429 + Retry-After above this rate
+# Requests for these models fail with a 400 (e.g. to exercise the model router's escalation)
+FAIL_MODELS = {m.strip() for m in os.getenv("FAKE_OPENAI_FAIL_MODELS", "").split(",") if m.strip()}
+
+# keyword in the user message -> (tool name, arguments)
+TOOL_RULES = [
+    ("find", "search_file_contents", {"query": "heart rate", "max_results": 5}),
+    ("sport", "recommend_sport", {}),
+    ("table", "list_tables", {}),
+    ("file", "list_directory", {"path": "/bench/files"}),
+]
+WORDS = "the sensor reports heart rate and temperature values to the app every few seconds".split()
+
+app = FastAPI(title="Fake OpenAI Responses API")
+app.state.requests = 0
+app.state.rate_limited = 0
+app.state.failed = 0
+app.state.models = {}
+app.state.input_tokens = 0
+_bucket = {"level": 0.0, "updated": time.monotonic()}
+
+
+def _over_limit() -> float:
+    """0 if the request may pass, else seconds until the next one would (token bucket, 1 s burst)."""
+    if RPM_LIMIT <= 0:
+        return 0.0
+    rate = RPM_LIMIT / 60
+    now = time.monotonic()
+    _bucket["level"] = min(max(rate, 1.0), _bucket["level"] + (now - _bucket["updated"]) * rate)
+    _bucket["updated"] = now
+    if _bucket["level"] >= 1:
+        _bucket["level"] -= 1
+        return 0.0
+    return (1 - _bucket["level"]) / rate
+
+
+def _text_of(item: Dict[str, Any]) -> str:
+    content = item.get("content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _plan(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Function call to emit for this turn, or None to answer with text."""
+    items = body.get("input")
+    if isinstance(items, str):
+        items = [{"role": "user", "content": items}]
+    last_user = max((i for i, item in enumerate(items) if item.get("role") == "user"), default=-1)
+    if any(item.get("type") == "function_call_output" for item in items[last_user + 1:]):
+        return None  # tool result is in: answer
+    message = _text_of(items[last_user]).lower() if last_user >= 0 else ""
+    tool_names = {t.get("name") for t in body.get("tools") or [] if t.get("type") == "function"}
+    for keyword, name, arguments in TOOL_RULES:
+        if keyword in message and name in tool_names:
+            return {
+                "type": "function_call",
+                "id": f"fc_{uuid.uuid4().hex}",
+                "call_id": f"call_{uuid.uuid4().hex[:24]}",
+                "name": name,
+                "arguments": json.dumps(arguments),
+                "status": "completed",
+            }
+    return None
+
+
+def _message(item_id: str, text: str) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "id": item_id,
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def _input_tokens(body: Dict[str, Any]) -> int:
+    """Rough count (4 characters per token) of what the real API bills: input, instructions and tool schemas."""
+    return (len(json.dumps(body.get("input", ""))) + len(body.get("instructions") or "")
+            + len(json.dumps(body.get("tools") or []))) // 4
+
+
+def _response(body: Dict[str, Any], response_id: str, output: List[Dict[str, Any]], status: str, output_tokens: int) -> Dict[str, Any]:
+    input_tokens = _input_tokens(body)
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model") or "fake-model",
+        "status": status,
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "temperature": body.get("temperature"),
+        "top_p": None,
+        "error": None,
+        "incomplete_details": None,
+        "instructions": body.get("instructions"),
+        "metadata": {},
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _tokens(n: int) -> List[str]:
+    return [("" if i == 0 else " ") + WORDS[i % len(WORDS)] for i in range(n)]
+
+
+def _sse(seq: List[int], event: Dict[str, Any]) -> str:
+    event["sequence_number"] = seq[0]
+    seq[0] += 1
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _stream(body: Dict[str, Any], response_id: str, call: Optional[Dict[str, Any]]):
+    seq = [0]
+    yield _sse(seq, {"type": "response.created", "response": _response(body, response_id, [], "in_progress", 0)})
+    await asyncio.sleep(TTFT_S)
+    if call is not None:
+        yield _sse(seq, {"type": "response.output_item.added", "output_index": 0, "item": call})
+        yield _sse(seq, {"type": "response.output_item.done", "output_index": 0, "item": call})
+        final = _response(body, response_id, [call], "completed", 20)
+        yield _sse(seq, {"type": "response.completed", "response": final})
+        return
+
+    item_id = f"msg_{uuid.uuid4().hex}"
+    empty = _message(item_id, "")
+    empty["status"] = "in_progress"
+    yield _sse(seq, {"type": "response.output_item.added", "output_index": 0, "item": empty})
+    yield _sse(seq, {"type": "response.content_part.added", "item_id": item_id, "output_index": 0, "content_index": 0,
+                     "part": {"type": "output_text", "text": "", "annotations": []}})
+    tokens = _tokens(OUTPUT_TOKENS)
+    for token in tokens:
+        yield _sse(seq, {"type": "response.output_text.delta", "item_id": item_id, "output_index": 0,
+                         "content_index": 0, "delta": token, "logprobs": []})
+        await asyncio.sleep(1 / TOKENS_PER_S)
+    text = "".join(tokens)
+    yield _sse(seq, {"type": "response.output_text.done", "item_id": item_id, "output_index": 0, "content_index": 0,
+                     "text": text, "logprobs": []})
+    yield _sse(seq, {"type": "response.content_part.done", "item_id": item_id, "output_index": 0, "content_index": 0,
+                     "part": {"type": "output_text", "text": text, "annotations": []}})
+    done = _message(item_id, text)
+    yield _sse(seq, {"type": "response.output_item.done", "output_index": 0, "item": done})
+    final = _response(body, response_id, [done], "completed", OUTPUT_TOKENS)
+    yield _sse(seq, {"type": "response.completed", "response": final})
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    wait = _over_limit()
+    if wait:
+        app.state.rate_limited += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded", "param": None}},
+            status_code=429,
+            headers={"retry-after-ms": str(int(wait * 1000) + 1)},
+        )
+    if body.get("model") in FAIL_MODELS:
+        app.state.failed += 1
+        return JSONResponse(
+            {"error": {"message": f"The model {body.get('model')} failed (fake)", "type": "invalid_request_error",
+                       "code": "model_failed", "param": "model"}},
+            status_code=400,
+        )
+    app.state.requests += 1
+    app.state.models[body.get("model")] = app.state.models.get(body.get("model"), 0) + 1
+    app.state.input_tokens += _input_tokens(body)
+    response_id = f"resp_{uuid.uuid4().hex}"
+    call = _plan(body)
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, response_id, call), media_type="text/event-stream")
+    if call is not None:
+        await asyncio.sleep(TTFT_S)
+        return _response(body, response_id, [call], "completed", 20)
+    await asyncio.sleep(TTFT_S + OUTPUT_TOKENS / TOKENS_PER_S)
+    text = "".join(_tokens(OUTPUT_TOKENS))
+    return _response(body, response_id, [_message(f"msg_{uuid.uuid4().hex}", text)], "completed", OUTPUT_TOKENS)
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": app.state.requests,
+        "rate_limited": app.state.rate_limited,
+        "failed": app.state.failed,
+        "models": app.state.models,
+        "input_tokens": app.state.input_tokens,
+        "input_tokens_per_request": round(app.state.input_tokens / app.state.requests, 1) if app.state.requests else 0.0,
+    }
+
+
+def main():
+    global TTFT_S, TOKENS_PER_S, OUTPUT_TOKENS, RPM_LIMIT, FAIL_MODELS
+    parser = argparse.ArgumentParser(description="Fake OpenAI Responses endpoint for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--ttft-ms", type=float, default=TTFT_S * 1000, help="delay before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=TOKENS_PER_S, help="output token rate")
+    parser.add_argument("--output-tokens", type=int, default=OUTPUT_TOKENS, help="tokens per text answer")
+    parser.add_argument("--rpm-limit", type=float, default=RPM_LIMIT, help="answer 429 above this request rate (0 = off)")
+    parser.add_argument("--fail-models", default=",".join(sorted(FAIL_MODELS)), help="comma-separated models that answer 400")
+    args = parser.parse_args()
+    TTFT_S, TOKENS_PER_S, OUTPUT_TOKENS = args.ttft_ms / 1000, args.tokens_per_s, args.output_tokens
+    RPM_LIMIT = args.rpm_limit
+    FAIL_MODELS = {m.strip() for m in args.fail_models.split(",") if m.strip()}
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Load test for the /chat server (app/main.py) against local stand-ins for OpenAI and MCP.
+
+    uv run python bench/run_bench.py                                  # defaults: concurrency 1,4,16 x 100 requests
+    uv run python bench/run_bench.py --concurrency 8,32 --requests 200 --stream
+    uv run python bench/run_bench.py --ttft-ms 800 --tokens-per-s 40 --baseline bench/results/<older>.json
+    uv run python bench/run_bench.py --app-url http://127.0.0.1:8080  # drive an already running server
+    uv run python bench/run_bench.py --workers 4 --out bench/results/w4-local.json
+    uv run python bench/run_bench.py --workers 4 --gateway --baseline bench/results/w4-local.json
+
+Starts bench/fake_openai.py (via OPENAI_BASE_URL), the fake sport MCP server (SPORT_MCP_URL),
+the fake filesystem/SQLite stdio servers (MCP_FS_COMMAND / MCP_SQLITE_COMMAND) and the app itself,
+then sends requests at each concurrency level and reports throughput and p50/p95/p99 latency.
+With --workers the app runs as several uvicorn workers; --gateway makes them share one MCP gateway
+process (mcp_server/gateway.py) instead of each spawning its own stdio servers. Startup time and
+the resident memory of all stack processes (Linux) are reported as well.
+Results are written to bench/results/bench-<timestamp>.json.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import shlex
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Message mix; the fake model turns "sport" / "table" / "file" messages into MCP tool calls
+MESSAGES = {
+    "plain": "Explain in two sentences what the BioMed IoT app does.",
+    "sport": "Give me a sport recommendation for today.",
+    "table": "Which tables are in the database?",
+    "file": "Which files are in the sample folder?",
+    "search": "Find the notes that mention heart rate.",
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(p / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def one_request(client: httpx.AsyncClient, url: str, message: str, stream: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post(url, json={"message": message})
+        response.raise_for_status()
+        return {"latency": time.perf_counter() - start}
+
+    ttft = None
+    async with client.stream("POST", url + "/stream", json={"message": message}) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "delta" and ttft is None:
+                    ttft = time.perf_counter() - start
+                elif event == "error":
+                    raise RuntimeError("server sent an error event")
+    return {"latency": time.perf_counter() - start, "ttft": ttft}
+
+
+async def run_level(url: str, concurrency: int, requests: int, mix: List[str], stream: bool, timeout: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+    run_id = time.time_ns()
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            # Unique suffix so the response cache never answers
+            message = f"{MESSAGES[mix[i % len(mix)]]} (request {run_id}-{i})"
+            try:
+                result = await one_request(client, url, message, stream)
+            except Exception as e:
+                key = type(e).__name__
+                if isinstance(e, httpx.HTTPStatusError):
+                    key = f"HTTP {e.response.status_code}"
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append(result["latency"])
+            if result.get("ttft") is not None:
+                ttfts.append(result["ttft"])
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    level = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+    }
+    if stream:
+        level["ttft"] = summarize(ttfts)
+    return level
+
+
+def _spawn(args: List[str], env: Dict[str, str], log) -> subprocess.Popen:
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _wait_http(url: str, timeout: float, ok=lambda r: r.status_code < 500) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if ok(httpx.get(url, timeout=2)):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout:g}s")
+
+
+def _all_ready(response) -> bool:
+    body = response.json()
+    return body.get("status") == "ok" and all(s.get("state") == "ready" for s in body.get("servers", {}).values())
+
+
+def _wait_workers(url: str, workers: int, timeout: float) -> None:
+    """Each probe may land on any worker, so require a run of ready answers before trusting it."""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < 3 * workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} workers not ready after {timeout:g}s")
+        try:
+            streak = streak + 1 if _all_ready(httpx.get(url, timeout=2)) else 0
+        except httpx.HTTPError:
+            streak = 0
+        time.sleep(0.05 if streak else 0.2)
+
+
+def _seed_sqlite(path: Path) -> None:
+    """Small demo database for --sqlite-native (the fake stdio server answers without one)."""
+    import sqlite3
+    path.unlink(missing_ok=True)
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE patients (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.execute("CREATE TABLE measurements (id INTEGER PRIMARY KEY, patient_id INTEGER, value REAL)")
+        conn.executemany("INSERT INTO patients (name) VALUES (?)", [(f"patient {i}",) for i in range(100)])
+        conn.executemany("INSERT INTO measurements (patient_id, value) VALUES (?, ?)",
+                         [(i % 100, 36.0 + (i % 20) / 10) for i in range(10000)])
+    conn.close()
+
+
+def start_stack(args, log) -> List[subprocess.Popen]:
+    """Fake OpenAI + fake MCP servers (+ MCP gateway) + the app; returns the processes to stop afterwards.
+
+    The app process is always last; with --gateway the gateway comes right before it.
+    """
+    py = sys.executable
+    fake_mcp = str(BENCH_DIR / "fake_mcp.py")
+    workers = getattr(args, "workers", 1)
+    gateway = getattr(args, "gateway", False)
+    base_env = dict(os.environ, FAKE_MCP_LATENCY_MS=str(args.mcp_latency_ms))
+    procs = [
+        _spawn([py, str(BENCH_DIR / "fake_openai.py"), "--port", str(args.openai_port), "--ttft-ms", str(args.ttft_ms),
+                "--tokens-per-s", str(args.tokens_per_s), "--output-tokens", str(args.output_tokens)], base_env, log),
+        _spawn([py, fake_mcp, "sport", "--port", str(args.sport_port)], base_env, log),
+    ]
+    mcp_env = dict(
+        base_env,
+        MCP_FS_COMMAND=f"{shlex.quote(py)} {shlex.quote(fake_mcp)} filesystem",
+        MCP_SQLITE_COMMAND=f"{shlex.quote(py)} {shlex.quote(fake_mcp)} sqlite",
+        MCP_POOL_SIZE=str(getattr(args, "pool_size", 1)),
+        MCP_GATEWAY_URL="",
+    )
+    if getattr(args, "sqlite_native", False):
+        db_path = RESULTS_DIR / "bench.db"
+        _seed_sqlite(db_path)
+        mcp_env.update(SQLITE_MODE="native", SQLITE_DB_PATH=str(db_path))
+    app_env = dict(
+        mcp_env,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+        OPENAI_API_KEY="bench-fake-key",
+        OPENAI_AGENTS_DISABLE_TRACING="1",
+        SPORT_MCP_URL=f"http://127.0.0.1:{args.sport_port}/mcp",
+        RESPONSE_CACHE_SIZE=os.getenv("RESPONSE_CACHE_SIZE", "0"),
+        RESPONSE_CACHE_DB="",
+    )
+    try:
+        _wait_http(f"http://127.0.0.1:{args.openai_port}/stats", 30)
+        _wait_http(f"http://127.0.0.1:{args.sport_port}/mcp", 30)
+        start = time.perf_counter()
+        if gateway:
+            gateway_url = f"http://127.0.0.1:{args.gateway_port}"
+            procs.append(_spawn([py, "-m", "mcp_server.gateway", "--port", str(args.gateway_port)], mcp_env, log))
+            _wait_http(gateway_url + "/health", 90, ok=_all_ready)
+            app_env["MCP_GATEWAY_URL"] = gateway_url
+        procs.append(_spawn([py, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+                             "--workers", str(workers), "--log-level", "warning"], app_env, log))
+        # wait until every MCP server is connected in every worker, not just until the port is open
+        _wait_workers(f"http://127.0.0.1:{args.app_port}/health", workers, 90)
+        args.startup_s = round(time.perf_counter() - start, 2)
+    except Exception:
+        stop_stack(procs)
+        raise
+    return procs
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _children() -> Dict[int, List[int]]:
+    tree: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        tree.setdefault(ppid, []).append(int(entry))
+    return tree
+
+
+def memory_report(procs: List[subprocess.Popen], gateway: bool) -> Optional[Dict[str, Any]]:
+    """Resident memory (MB) of the app (all workers + their MCP subprocesses) and the gateway tree.
+
+    RSS counts shared pages once per process, so totals are an upper bound; Linux only.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    tree = _children()
+
+    def measure(root: int) -> Dict[str, Any]:
+        pids, stack = [], [root]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(tree.get(pid, []))
+        return {"rss_mb": round(sum(_rss_kb(p) for p in pids) / 1024, 1), "processes": len(pids)}
+
+    report = {"app": measure(procs[-1].pid)}
+    if gateway:
+        report["gateway"] = measure(procs[-2].pid)
+    report["total_rss_mb"] = round(sum(part["rss_mb"] for part in report.values()), 1)
+    return report
+
+
+def stop_stack(procs: List[subprocess.Popen]) -> None:
+    # app first, so it can still close its MCP sessions cleanly
+    for proc in reversed(procs):
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def compare(current: Dict[str, Any], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    old = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nvs. {baseline_path.name}:")
+    for level in current["levels"]:
+        before = old.get(level["concurrency"])
+        if before is None:
+            continue
+        print(
+            f"  c={level['concurrency']:<4} rps {before['throughput_rps']:>7} -> {level['throughput_rps']:<7}"
+            f" p50 {before['latency']['p50_ms']:>7} -> {level['latency']['p50_ms']:<7}"
+            f" p99 {before['latency']['p99_ms']:>7} -> {level['latency']['p99_ms']} ms"
+        )
+    if baseline.get("memory") and current.get("memory"):
+        print(f"  memory {baseline['memory']['total_rss_mb']} -> {current['memory']['total_rss_mb']} MB"
+              f"  startup {baseline.get('startup_s')} -> {current.get('startup_s')} s")
+    if baseline.get("input_tokens_per_model_call") and current.get("input_tokens_per_model_call"):
+        print(f"  input tokens per model call {baseline['input_tokens_per_model_call']}"
+              f" -> {current['input_tokens_per_model_call']}")
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /chat against local fake OpenAI and MCP servers")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=4, help="unmeasured requests before the first level")
+    parser.add_argument("--mix", default="plain,sport,table,file", help=f"message kinds to rotate through ({', '.join(MESSAGES)})")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and also report time to first token")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout (seconds)")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="fake model: delay before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=80, help="fake model: output token rate")
+    parser.add_argument("--output-tokens", type=int, default=60, help="fake model: tokens per answer")
+    parser.add_argument("--mcp-latency-ms", type=float, default=20, help="fake MCP servers: latency per tool call")
+    parser.add_argument("--app-port", type=int, default=9100)
+    parser.add_argument("--openai-port", type=int, default=9101)
+    parser.add_argument("--sport-port", type=int, default=9102)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument("--gateway", action="store_true", help="workers share one MCP gateway process for filesystem/SQLite")
+    parser.add_argument("--gateway-port", type=int, default=9103)
+    parser.add_argument("--pool-size", type=int, default=1, help="MCP_POOL_SIZE per stdio server (per worker, or in the gateway)")
+    parser.add_argument("--sqlite-native", action="store_true", help="in-process SQLite tools on a seeded database instead of the stdio MCP server")
+    parser.add_argument("--app-url", default=None, help="benchmark a running server instead of starting the stack")
+    parser.add_argument("--out", default=None, help="result file (default: bench/results/bench-<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    mix = [m.strip() for m in args.mix.split(",") if m.strip()]
+    unknown = [m for m in mix if m not in MESSAGES]
+    if unknown:
+        parser.error(f"unknown message kinds: {', '.join(unknown)}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    log_path = RESULTS_DIR / "stack.log"
+    procs: List[subprocess.Popen] = []
+    memory = None
+    input_tokens = None
+    with open(log_path, "w") as log:
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+        else:
+            mode = f"{args.workers} worker(s)" + (" + MCP gateway" if args.gateway else "")
+            print(f"[bench] starting fake OpenAI, fake MCP servers and the app, {mode} (logs: {log_path})")
+            procs = start_stack(args, log)
+            print(f"[bench] stack ready in {args.startup_s:.2f} s")
+            base_url = f"http://127.0.0.1:{args.app_port}"
+        chat_url = base_url + "/chat"
+        try:
+            if args.warmup:
+                asyncio.run(run_level(chat_url, min(args.warmup, 4), args.warmup, mix, args.stream, args.timeout))
+            results = []
+            for concurrency in levels:
+                level = asyncio.run(run_level(chat_url, concurrency, args.requests, mix, args.stream, args.timeout))
+                lat = level["latency"]
+                print(
+                    f"[bench] c={concurrency:<4} {level['throughput_rps']:>7.2f} req/s  p50 {lat['p50_ms']:>8.1f} ms"
+                    f"  p95 {lat['p95_ms']:>8.1f} ms  p99 {lat['p99_ms']:>8.1f} ms  errors {sum(level['errors'].values())}"
+                )
+                results.append(level)
+            try:
+                server_stats = httpx.get(base_url + "/stats", timeout=5).json()
+            except (httpx.HTTPError, ValueError):
+                server_stats = None
+            if procs:
+                # Input tokens as billed by the fake model, including tool schemas (compare with TOOL_SELECT=0)
+                model_stats = httpx.get(f"http://127.0.0.1:{args.openai_port}/stats", timeout=5).json()
+                input_tokens = model_stats.get("input_tokens_per_request")
+                print(f"[bench] model calls {model_stats['requests']}, {input_tokens} input tokens per call")
+                memory = memory_report(procs, args.gateway)
+                if memory:
+                    parts = "  ".join(f"{name} {part['rss_mb']} MB / {part['processes']} proc"
+                                      for name, part in memory.items() if isinstance(part, dict))
+                    print(f"[bench] memory (RSS after load): {parts}  total {memory['total_rss_mb']} MB")
+        finally:
+            stop_stack(procs)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "config": {
+            "app_url": args.app_url,
+            "stream": args.stream,
+            "mix": mix,
+            "requests_per_level": args.requests,
+            "fake_openai": None if args.app_url else {
+                "ttft_ms": args.ttft_ms, "tokens_per_s": args.tokens_per_s, "output_tokens": args.output_tokens,
+            },
+            "fake_mcp_latency_ms": None if args.app_url else args.mcp_latency_ms,
+            "workers": None if args.app_url else args.workers,
+            "gateway": None if args.app_url else args.gateway,
+            "pool_size": None if args.app_url else args.pool_size,
+            "sqlite_native": None if args.app_url else args.sqlite_native,
+        },
+        "startup_s": getattr(args, "startup_s", None),
+        "memory": memory,
+        "input_tokens_per_model_call": input_tokens,
+        "levels": results,
+        "server_stats": server_stats,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[bench] results written to {out}")
+    if args.baseline:
+        compare(report, Path(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Latency of spoken questions: streaming /chat/speech vs. record -> transcribe -> /chat/stream.
+
+    uv run python bench/speech_bench.py                          # 5 utterances, fake transcription at 0.1x real time
+    uv run python bench/speech_bench.py --rtf 0.3 --runs 10
+    uv run python bench/speech_bench.py --app-url http://127.0.0.1:9100   # server already running with SPEECH_BACKEND=fake
+
+Starts the same fake stack as bench/run_bench.py with SPEECH_BACKEND=fake and plays a synthetic
+utterance (tone bursts for words, pauses between phrases, trailing silence) into /chat/speech
+at real-time pace. The figure that matters is the time from the end of speech to the first
+answer token. The sequential baseline waits for the same end-of-speech silence, transcribes
+the whole recording in one call (fake backend, same real-time factor) and then calls
+/chat/stream with the text.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from app.speech import FakeTranscriber  # noqa: E402
+from bench.run_bench import percentile, start_stack, stop_stack  # noqa: E402
+
+RATE = 16000
+QUESTION = "Give me a sport recommendation for today please"
+
+
+def synth_utterance(phrases: List[int], word_ms: int = 280, gap_ms: int = 120, pause_ms: int = 450,
+                    tail_ms: int = 1500) -> Tuple[bytes, float]:
+    """PCM16 audio with `phrases[i]` words per phrase; returns (audio, seconds until the end of speech)."""
+    out = bytearray()
+
+    def tone(ms: int, freq: float) -> None:
+        n = RATE * ms // 1000
+        out.extend(struct.pack(f"<{n}h", *(int(6000 * math.sin(2 * math.pi * freq * i / RATE)) for i in range(n))))
+
+    def silence(ms: int) -> None:
+        out.extend(bytes(RATE * ms // 1000 * 2))
+
+    silence(300)
+    for p, words in enumerate(phrases):
+        for w in range(words):
+            tone(word_ms, 180 + 40 * ((p + w) % 4))
+            if w < words - 1:
+                silence(gap_ms)
+        if p < len(phrases) - 1:
+            silence(pause_ms)
+    speech_end = len(out) / (2 * RATE)
+    silence(tail_ms)
+    return bytes(out), speech_end
+
+
+def wav_header(rate: int) -> bytes:
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVEfmt " +
+            struct.pack("<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16) + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+
+async def _paced(audio: bytes, chunk_ms: int, start: float):
+    yield wav_header(RATE)
+    step = RATE * chunk_ms // 1000 * 2
+    for i, offset in enumerate(range(0, len(audio), step)):
+        await asyncio.sleep(max(0.0, start + i * chunk_ms / 1000 - time.perf_counter()))
+        yield audio[offset:offset + step]
+
+
+async def _read_stream(response: httpx.Response, start: float) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    event = "message"
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            if event == "transcript":
+                result["transcript_s"] = time.perf_counter() - start
+                result["speech"] = json.loads(line[5:])
+            elif event == "delta" and "first_token_s" not in result:
+                result["first_token_s"] = time.perf_counter() - start
+            elif event == "done":
+                result["done_s"] = time.perf_counter() - start
+                result["timing_ms"] = json.loads(line[5:]).get("timing_ms")
+            elif event == "error":
+                raise RuntimeError(line[5:])
+    return result
+
+
+async def streaming_run(client: httpx.AsyncClient, base: str, audio: bytes, speech_end: float, chunk_ms: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    async with client.stream("POST", base + "/chat/speech", content=_paced(audio, chunk_ms, start),
+                             headers={"Content-Type": "audio/wav", "X-Speech-Text": QUESTION}) as response:
+        response.raise_for_status()
+        result = await _read_stream(response, start)
+    result["after_speech_s"] = result["first_token_s"] - speech_end
+    return result
+
+
+async def sequential_run(client: httpx.AsyncClient, base: str, audio: bytes, speech_end: float, end_silence_s: float,
+                         rtf: float) -> Dict[str, Any]:
+    # The recording stops after the same end-of-speech silence; nothing is done while it is recorded
+    speech = audio[:int((speech_end + end_silence_s) * RATE) * 2]
+    start = time.perf_counter()
+    text = await FakeTranscriber(QUESTION, rtf=rtf).transcribe(speech, RATE)
+    text = text or QUESTION
+    transcribed = time.perf_counter() - start
+    async with client.stream("POST", base + "/chat/stream", json={"message": text}) as response:
+        response.raise_for_status()
+        result = await _read_stream(response, start)
+    result["transcribe_s"] = transcribed
+    result["after_speech_s"] = end_silence_s + result["first_token_s"]
+    return result
+
+
+def _ms(values: List[float]) -> Dict[str, float]:
+    return {"p50": round(percentile(values, 50) * 1000, 1), "max": round(max(values) * 1000, 1)}
+
+
+async def run(base: str, runs: int, rtf: float, end_silence_s: float, chunk_ms: int) -> Dict[str, Any]:
+    audio, speech_end = synth_utterance([3, 2, 3])
+    streaming: List[Dict[str, Any]] = []
+    sequential: List[Dict[str, Any]] = []
+    async with httpx.AsyncClient(timeout=120) as client:
+        for _ in range(runs):
+            streaming.append(await streaming_run(client, base, audio, speech_end, chunk_ms))
+            sequential.append(await sequential_run(client, base, audio, speech_end, end_silence_s, rtf))
+    stages: Dict[str, List[float]] = {}
+    for r in streaming:
+        for stage, ms in (r.get("timing_ms") or r["speech"]["timing_ms"]).items():
+            stages.setdefault(stage, []).append(ms / 1000)
+    return {
+        "audio_s": round(len(audio) / (2 * RATE), 2),
+        "speech_s": round(speech_end, 2),
+        "segments": streaming[-1]["speech"]["segments"],
+        "streaming_first_token_after_speech_ms": _ms([r["after_speech_s"] for r in streaming]),
+        "sequential_first_token_after_speech_ms": _ms([r["after_speech_s"] for r in sequential]),
+        "sequential_transcribe_ms": _ms([r["transcribe_s"] for r in sequential]),
+        "streaming_stages_p50_ms": {stage: _ms(values)["p50"] for stage, values in stages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech endpoint latency: streaming pipeline vs. sequential")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rtf", type=float, default=0.1, help="fake transcription: seconds per second of audio")
+    parser.add_argument("--end-silence-ms", type=int, default=700, help="silence that ends an utterance")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="audio per upload chunk")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="fake model: delay before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=80)
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--mcp-latency-ms", type=float, default=20)
+    parser.add_argument("--app-port", type=int, default=9100)
+    parser.add_argument("--openai-port", type=int, default=9101)
+    parser.add_argument("--sport-port", type=int, default=9102)
+    parser.add_argument("--app-url", default=None, help="use a running server (started with SPEECH_BACKEND=fake)")
+    args = parser.parse_args()
+
+    os.environ.update(SPEECH_BACKEND="fake", SPEECH_FAKE_RTF=str(args.rtf), SPEECH_END_SILENCE_MS=str(args.end_silence_ms))
+    procs = []
+    log_path = BENCH_DIR / "results" / "speech_bench.log"
+    log_path.parent.mkdir(exist_ok=True)
+    with open(log_path, "w") as log:
+        try:
+            if not args.app_url:
+                procs = start_stack(args, log)
+            base = args.app_url or f"http://127.0.0.1:{args.app_port}"
+            result = asyncio.run(run(base.rstrip("/"), args.runs, args.rtf, args.end_silence_ms / 1000, args.chunk_ms))
+        finally:
+            stop_stack(procs)
+    print(f"[speech-bench] first token after end of speech: streaming "
+          f"{result['streaming_first_token_after_speech_ms']['p50']} ms vs. sequential "
+          f"{result['sequential_first_token_after_speech_ms']['p50']} ms (p50, {args.runs} runs)")
+    print(json.dumps({"runs": args.runs, "rtf": args.rtf, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Throughput of the sport recommender MCP server on its own (mcp_server/dice_and_sport.py).
+
+    uv run python bench/sport_bench.py                                   # stateful vs. stateless x1 vs. stateless x4
+    uv run python bench/sport_bench.py --modes stateless:2 --batch 20    # recommend_sports(count=20) per call
+
+Each mode starts the server, opens `--clients` concurrent MCP clients (initialize handshake,
+then tool calls over streamable HTTP, like the agent's client) and reports calls/s, latency
+percentiles and recommendations/s.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+HEADERS = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json"}
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _message(response: httpx.Response) -> Dict[str, Any]:
+    """JSON-RPC reply from a JSON body (stateless) or an SSE stream (stateful)."""
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        for line in response.text.splitlines():
+            if line.startswith("data: "):
+                return json.loads(line[6:])
+        raise ValueError("empty event stream")
+    return response.json()
+
+
+async def _client(url: str, calls: int, tool: str, arguments: Dict[str, Any], latencies: List[float], errors: List[str]) -> int:
+    recommendations = 0
+    async with httpx.AsyncClient(timeout=30, headers=HEADERS) as http:
+        init = await http.post(url, json={
+            "jsonrpc": "2.0", "id": 0, "method": "initialize",
+            "params": {"protocolVersion": "2025-06-18", "capabilities": {}, "clientInfo": {"name": "sport-bench", "version": "1"}},
+        })
+        headers = {}
+        session_id = init.headers.get("mcp-session-id")
+        if session_id:
+            headers["mcp-session-id"] = session_id
+        await http.post(url, json={"jsonrpc": "2.0", "method": "notifications/initialized"}, headers=headers)
+        for i in range(calls):
+            start = time.perf_counter()
+            try:
+                response = await http.post(url, headers=headers, json={
+                    "jsonrpc": "2.0", "id": i + 1, "method": "tools/call", "params": {"name": tool, "arguments": arguments},
+                })
+                reply = _message(response)
+                result = reply.get("result") or {}
+                if result.get("isError") or "error" in reply:
+                    errors.append(str(reply.get("error") or result))
+                    continue
+                data = json.loads(result["content"][0]["text"])
+                recommendations += len(data["recommendations"]) if "recommendations" in data else 1
+                latencies.append(time.perf_counter() - start)
+            except (httpx.HTTPError, ValueError, KeyError) as exception:
+                errors.append(type(exception).__name__)
+    return recommendations
+
+
+async def run_load(url: str, clients: int, calls: int, batch: int) -> Dict[str, Any]:
+    tool, arguments = ("recommend_sports", {"count": batch}) if batch > 1 else ("recommend_sport", {})
+    latencies: List[float] = []
+    errors: List[str] = []
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(_client(url, calls, tool, arguments, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": len(latencies),
+        "errors": len(errors),
+        "calls_per_s": round(len(latencies) / elapsed, 1),
+        "recommendations_per_s": round(sum(counts) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _parse_mode(mode: str) -> Tuple[bool, int]:
+    """"stateful" or "stateless[:workers]"."""
+    name, _, workers = mode.partition(":")
+    if name not in ("stateful", "stateless"):
+        raise ValueError(f"unknown mode {mode!r}")
+    return name == "stateless", int(workers or 1)
+
+
+def start_server(port: int, stateless: bool, workers: int, log) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "mcp_server.dice_and_sport", "--port", str(port)]
+    if stateless:
+        cmd += ["--stateless", "--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/mcp", timeout=1)
+            time.sleep(0.5 * workers)  # let every worker finish starting
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"sport MCP server did not start on port {port}")
+
+
+def stop_server(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the sport recommender MCP server")
+    parser.add_argument("--modes", default="stateful,stateless,stateless:4", help="stateful and/or stateless[:workers]")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent MCP clients")
+    parser.add_argument("--calls", type=int, default=50, help="tool calls per client")
+    parser.add_argument("--batch", type=int, default=1, help="> 1: call recommend_sports(count=batch)")
+    parser.add_argument("--port", type=int, default=9110)
+    parser.add_argument("--url", default=None, help="benchmark a running server instead (e.g. http://127.0.0.1:8000/mcp)")
+    args = parser.parse_args()
+
+    if args.url:
+        print(json.dumps(asyncio.run(run_load(args.url, args.clients, args.calls, args.batch))))
+        return
+    results = {}
+    log_path = ROOT / "bench" / "results" / "sport_bench.log"
+    log_path.parent.mkdir(exist_ok=True)
+    with open(log_path, "w") as log:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            stateless, workers = _parse_mode(mode)
+            proc = None
+            try:
+                proc = start_server(args.port, stateless, workers, log)
+                asyncio.run(run_load(f"http://127.0.0.1:{args.port}/mcp", 4, 5, args.batch))  # warm-up
+                results[mode] = result = asyncio.run(
+                    run_load(f"http://127.0.0.1:{args.port}/mcp", args.clients, args.calls, args.batch)
+                )
+            finally:
+                stop_server(proc)
+            print(f"[sport-bench] {mode:<14} {result['calls_per_s']:>8} calls/s  {result['recommendations_per_s']:>9} rec/s"
+                  f"  p50 {result['p50_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  errors {result['errors']}")
+    print(json.dumps({"clients": args.clients, "calls": args.calls, "batch": args.batch, "cpus": os.cpu_count(),
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
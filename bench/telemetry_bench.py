@@ -0,0 +1,196 @@
+"""Telemetry ingestion rows/s and query latency (app/telemetry.py).
+
+    uv run python bench/telemetry_bench.py                                 # in-process writer, 20 devices x 24 h
+    uv run python bench/telemetry_bench.py --devices 50 --producers 32
+    uv run python bench/telemetry_bench.py --url http://127.0.0.1:8001     # POST /telemetry on a running server
+
+In-process it measures the writer itself: group commit vs. one commit per batch, the cost
+of parsing JSON lines vs. the binary format, and then the latency of typical agent queries
+answered from telemetry_hour / telemetry_minute vs. from the raw readings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from app.telemetry import BINARY_TYPE, TelemetryWriter, encode_binary, parse_binary, parse_jsonl  # noqa: E402
+from bench.run_bench import percentile  # noqa: E402
+
+METRICS = {"heart_rate": (72, 12), "spo2": (97, 1.5), "temperature": (36.8, 0.4), "steps": (40, 30)}
+START = 1767225600  # 2026-01-01 00:00 UTC
+
+
+def make_batches(devices: int, hours: float, interval: float, batch_rows: int) -> List[List[tuple]]:
+    """Each device sends its readings in time order, `batch_rows` at a time; devices interleave."""
+    rng = random.Random(7)
+    per_device = []
+    for d in range(devices):
+        rows = []
+        ts = START
+        while ts < START + hours * 3600:
+            for metric, (mean, spread) in METRICS.items():
+                rows.append((f"device-{d:03d}", metric, ts, round(rng.gauss(mean, spread), 2)))
+            ts += interval
+        per_device.append([rows[i:i + batch_rows] for i in range(0, len(rows), batch_rows)])
+    batches = []
+    for i in range(max(len(b) for b in per_device)):
+        batches.extend(b[i] for b in per_device if i < len(b))
+    return batches
+
+
+async def ingest(db_path: Path, batches: List[List[tuple]], producers: int, group: bool, synchronous: str) -> Dict[str, Any]:
+    writer = TelemetryWriter(db_path, max_group_rows=50000 if group else 1, synchronous=synchronous)
+    await writer.start()
+    queue = list(reversed(batches))
+    latencies: List[float] = []
+
+    async def producer():
+        while queue:
+            batch = queue.pop()
+            start = time.perf_counter()
+            await writer.submit(batch)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(producers)))
+    elapsed = time.perf_counter() - start
+    stats = writer.stats()
+    await writer.close()
+    return {
+        "rows_per_s": round(stats["rows_written"] / elapsed),
+        "commits": stats["commits"],
+        "rows_per_commit": stats["rows_per_commit"],
+        "batch_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "batch_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def parse_rates(batches: List[List[tuple]], sample: int = 200) -> Dict[str, Any]:
+    picked = batches[:sample]
+    jsonl = [b"\n".join(json.dumps({"device": d, "metric": m, "ts": ts, "value": v}).encode() for d, m, ts, v in b) for b in picked]
+    binary = [encode_binary(b) for b in picked]
+    rows = sum(len(b) for b in picked)
+    result = {}
+    for name, bodies, parse in (("jsonl", jsonl, parse_jsonl), ("binary", binary, parse_binary)):
+        start = time.perf_counter()
+        for body in bodies:
+            parse(body)
+        result[name] = {
+            "parse_rows_per_s": round(rows / (time.perf_counter() - start)),
+            "bytes_per_row": round(sum(map(len, bodies)) / rows, 1),
+        }
+    return result
+
+
+QUERIES = {
+    "hourly_avg_day": (
+        "SELECT bucket, sum / count FROM telemetry_hour WHERE device_id = ? AND metric = 'heart_rate' AND bucket >= ? ORDER BY bucket",
+        "SELECT CAST(ts / 3600 AS INTEGER) * 3600, AVG(value) FROM telemetry_readings "
+        "WHERE device_id = ? AND metric = 'heart_rate' AND ts >= ? GROUP BY 1 ORDER BY 1",
+    ),
+    "minute_max_last_hour": (
+        "SELECT bucket, max FROM telemetry_minute WHERE device_id = ? AND metric = 'heart_rate' AND bucket >= ? ORDER BY bucket",
+        "SELECT CAST(ts / 60 AS INTEGER) * 60, MAX(value) FROM telemetry_readings "
+        "WHERE device_id = ? AND metric = 'heart_rate' AND ts >= ? GROUP BY 1 ORDER BY 1",
+    ),
+    "fleet_daily_avg": (
+        "SELECT device_id, SUM(sum) / SUM(count) FROM telemetry_hour WHERE metric = 'spo2' AND bucket >= ? GROUP BY device_id",
+        "SELECT device_id, AVG(value) FROM telemetry_readings WHERE metric = 'spo2' AND ts >= ? GROUP BY device_id",
+    ),
+}
+
+
+def query_latency(db_path: Path, devices: int, hours: float, repeats: int) -> Dict[str, Any]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    end = START + hours * 3600
+    since = {"hourly_avg_day": end - 86400, "minute_max_last_hour": end - 3600, "fleet_daily_avg": end - 86400}
+    result = {}
+    for name, (aggregated, raw) in QUERIES.items():
+        timings = {}
+        for label, sql in (("aggregates", aggregated), ("raw", raw)):
+            samples = []
+            for i in range(repeats):
+                params = (since[name],) if name.startswith("fleet") else (f"device-{i % devices:03d}", since[name])
+                start = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append(time.perf_counter() - start)
+            timings[f"{label}_p50_ms"] = round(percentile(samples, 50) * 1000, 3)
+        result[name] = timings
+    conn.close()
+    return result
+
+
+async def http_ingest(url: str, batches: List[List[tuple]], producers: int, binary: bool) -> Dict[str, Any]:
+    import httpx
+
+    queue = list(reversed(batches))
+    latencies: List[float] = []
+    rows = 0
+    headers = {"Content-Type": BINARY_TYPE if binary else "application/x-ndjson"}
+
+    async def producer(client):
+        nonlocal rows
+        while queue:
+            batch = queue.pop()
+            body = encode_binary(batch) if binary else "\n".join(
+                json.dumps({"device": d, "metric": m, "ts": ts, "value": v}) for d, m, ts, v in batch)
+            start = time.perf_counter()
+            response = await client.post(url.rstrip("/") + "/telemetry", content=body, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            rows += response.json()["written"]
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*(producer(client) for _ in range(producers)))
+    elapsed = time.perf_counter() - start
+    return {"rows_per_s": round(rows / elapsed), "request_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "request_p99_ms": round(percentile(latencies, 99) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry ingestion and aggregate query benchmark")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--hours", type=float, default=24, help="simulated time span per device")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between readings (4 metrics each)")
+    parser.add_argument("--batch-rows", type=int, default=500, help="readings per device batch")
+    parser.add_argument("--producers", type=int, default=16, help="concurrent device batches in flight")
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous of the writer (NORMAL or FULL)")
+    parser.add_argument("--repeats", type=int, default=50, help="runs per query")
+    parser.add_argument("--url", default=None, help="POST to a running server instead of the in-process writer")
+    parser.add_argument("--binary", action="store_true", help="--url: send the binary format instead of JSON lines")
+    args = parser.parse_args()
+
+    batches = make_batches(args.devices, args.hours, args.interval, args.batch_rows)
+    rows = sum(map(len, batches))
+    if args.url:
+        result = asyncio.run(http_ingest(args.url, batches, args.producers, args.binary))
+        print(json.dumps({"rows": rows, "format": "binary" if args.binary else "jsonl", **result}, indent=2))
+        return
+
+    report: Dict[str, Any] = {"rows": rows, "batches": len(batches), "producers": args.producers,
+                              "synchronous": args.synchronous, "cpus": os.cpu_count()}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, group in (("commit_per_batch", False), ("group_commit", True)):
+            db_path = Path(tmp) / f"{mode}.db"
+            report[mode] = asyncio.run(ingest(db_path, batches, args.producers, group, args.synchronous))
+            print(f"[telemetry-bench] {mode:<17} {report[mode]['rows_per_s']:>9} rows/s  "
+                  f"{report[mode]['commits']:>6} commits  batch p50 {report[mode]['batch_p50_ms']} ms", file=sys.stderr)
+        report["parse"] = parse_rates(batches)
+        report["queries"] = query_latency(Path(tmp) / "group_commit.db", args.devices, args.hours, args.repeats)
+        report["db_mb"] = round(os.path.getsize(Path(tmp) / "group_commit.db") / 1e6, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
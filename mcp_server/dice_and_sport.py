@@ -1,5 +1,52 @@
-from mcp.server.fastmcp import FastMCP
+"""Sport recommender MCP server (streamable HTTP on http://127.0.0.1:8000/mcp).
+
+    uv run python mcp_server/dice_and_sport.py                                # one stateful process (default)
+    uv run python mcp_server/dice_and_sport.py --stateless --workers 4        # N stateless processes, one port
+
+Stateless mode answers every request with plain JSON and keeps no session state, so any
+worker can serve any request and the workers share one port without session affinity.
+"""
+import argparse
+import atexit
+import logging
+import os
 import random
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+from mcp.server.fastmcp import FastMCP
+
+MAX_BATCH = 100
+STATELESS = os.getenv("SPORT_MCP_STATELESS", "0").strip().lower() in ("1", "true", "on", "yes")
+LOG_LEVEL = os.getenv("SPORT_MCP_LOG_LEVEL", "INFO").strip().upper()  # DEBUG logs every roll
+HOST = os.getenv("SPORT_MCP_HOST", "127.0.0.1")  # also decides which Host headers are accepted
+
+log = logging.getLogger("sport_recommender")
+
+
+class _DropClosedStreamErrors(logging.Filter):
+    """In stateless mode the MCP SDK logs a ClosedResourceError traceback after every request
+    (its per-request stream is closed on purpose); formatting those would cost more than the tool."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not (record.exc_info and record.exc_info[0] is not None
+                    and record.exc_info[0].__name__ == "ClosedResourceError")
+
+
+def _setup_logging(level: str) -> None:
+    """Log records are only queued by the request handlers; a background thread writes them."""
+    log.setLevel(level)
+    if log.handlers:
+        return  # module imported twice (as __main__ and by uvicorn)
+    queue: SimpleQueue = SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s [SportRecommender] %(message)s"))
+    listener = QueueListener(queue, console)
+    listener.start()
+    atexit.register(listener.stop)
+    log.addHandler(QueueHandler(queue))
+    log.propagate = False
+
 
 class SportRecommender:
     def __init__(self):
@@ -13,10 +60,19 @@ class SportRecommender:
 
     def recommend(self) -> dict:
         dice = random.randint(1, 5)
-        print(f"[SportRecommender] Rolled a {dice}, recommending {self.sports[dice]}")
+        log.debug("Rolled a %d, recommending %s", dice, self.sports[dice])
         return {"sport": self.sports[dice], "dice_roll": dice}
 
-mcp = FastMCP("StatefulServer")
+
+_setup_logging(LOG_LEVEL)
+logging.getLogger("mcp.server.streamable_http").addFilter(_DropClosedStreamErrors())
+mcp = FastMCP(
+    "StatelessServer" if STATELESS else "StatefulServer",
+    stateless_http=STATELESS,
+    json_response=STATELESS,
+    host=HOST,
+    log_level="WARNING",
+)
 recommender = SportRecommender()
 
 @mcp.tool()
@@ -24,6 +80,41 @@ def recommend_sport() -> dict:
     """Returns a sport recommendation (calls the dice simulator)."""
     return recommender.recommend()
 
+@mcp.tool()
+def recommend_sports(count: int = 5) -> dict:
+    """Returns `count` sport recommendations (1-100) in one call, e.g. for a weekly plan."""
+    return {"recommendations": [recommender.recommend() for _ in range(max(1, min(MAX_BATCH, count)))]}
+
+
+def create_app():
+    """ASGI app for uvicorn (each worker process imports this module and builds its own)."""
+    return mcp.streamable_http_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sport recommender MCP server (streamable HTTP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stateless", action="store_true", help="JSON responses, no sessions (required for --workers > 1)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes sharing the port")
+    parser.add_argument("--log-level", default=None, help="DEBUG logs every recommendation")
+    args = parser.parse_args()
+    if args.workers > 1 and not args.stateless:
+        parser.error("--workers > 1 needs --stateless: stateful sessions live in one process")
+
+    import uvicorn
+
+    # Worker processes re-import this module and read their settings from the environment
+    os.environ["SPORT_MCP_STATELESS"] = "1" if args.stateless else "0"
+    os.environ["SPORT_MCP_HOST"] = args.host
+    if args.log_level:
+        os.environ["SPORT_MCP_LOG_LEVEL"] = args.log_level.upper()
+    module = __spec__.name if __spec__ is not None else "dice_and_sport"
+    mode = f"stateless, {args.workers} worker(s)" if args.stateless else "stateful"
+    print(f"[sport] MCP server on http://{args.host}:{args.port}/mcp ({mode})")
+    uvicorn.run(f"{module}:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                log_level="warning")
+
+
 if __name__ == "__main__":
-    # Run server with streamable_http transport
-    mcp.run(transport="streamable-http")
\ No newline at end of file
+    main()
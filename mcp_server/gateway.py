@@ -0,0 +1,126 @@
+"""Shared MCP gateway: one process hosts the filesystem and SQLite MCP servers for all app workers.
+
+    uv run python -m mcp_server.gateway --port 8100
+    MCP_GATEWAY_URL=http://127.0.0.1:8100 uv run uvicorn app.main:app --port 8001 --workers 4
+
+The stdio servers are started exactly as in single-process mode (app/agent_cli_mcp.py): each is a
+pool of MCP_POOL_SIZE sessions (app/mcp_pool.py) behind the read-only result cache
+(app/mcp_cache.py). They are exposed over streamable HTTP at /<name>/mcp, so N workers share one
+set of npx subprocesses, one pool and one cache instead of spawning N of each.
+"""
+import argparse
+import asyncio
+import contextlib
+import sys
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from mcp import types
+from mcp.server.lowlevel import Server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+from app import metrics
+from app.agent_cli_mcp import MCP_SERVERS, make_stdio_servers, mcp_cache_stats, mcp_pool_stats, mcp_server_status
+from app.mcp_startup import READY, ManagedMCPServer, start_all
+from app.mcp_supervisor import supervisor_from_env
+
+
+def make_proxy(server: ManagedMCPServer) -> Server:
+    """MCP server that forwards tools/list and tools/call to the pooled, cached stdio server."""
+    proxy = Server(server.name)
+
+    @proxy.list_tools()
+    async def list_tools() -> List[types.Tool]:
+        return await server.list_tools()
+
+    # Arguments are validated by the stdio server itself
+    @proxy.call_tool(validate_input=False)
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> types.CallToolResult:
+        return await server.call_tool(name, arguments)
+
+    return proxy
+
+
+class _MCPEndpoint:
+    """ASGI app handing requests to a session manager (Starlette treats plain callables as views)."""
+
+    def __init__(self, manager: StreamableHTTPSessionManager):
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        await self.manager.handle_request(scope, receive, send)
+
+
+def create_app() -> FastAPI:
+    MCP_SERVERS.clear()
+    MCP_SERVERS.update(make_stdio_servers())
+    # One long-lived session per worker; JSON responses keep each call a plain POST/response
+    managers = {
+        name: StreamableHTTPSessionManager(make_proxy(server), json_response=True)
+        for name, server in MCP_SERVERS.items()
+    }
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_: FastAPI):
+        async with contextlib.AsyncExitStack() as stack:
+            for manager in managers.values():
+                await stack.enter_async_context(manager.run())
+            started = await start_all(MCP_SERVERS)
+            for server in started.values():
+                if server.state == READY:
+                    tools = await server.list_tools()
+                    print(f"[gateway] /{server.name}/mcp:", ", ".join(t.name for t in tools[:8]) or "(none)")
+            # Restart crashed stdio sessions; there is no agent to rebuild here
+            supervisor = supervisor_from_env(MCP_SERVERS)
+            if supervisor is not None:
+                supervisor.start()
+            gateway.state.mcp_supervisor = supervisor
+            try:
+                yield
+            finally:
+                if supervisor is not None:
+                    await supervisor.stop()
+                for server in MCP_SERVERS.values():
+                    try:
+                        await asyncio.wait_for(server.cleanup(), timeout=5)
+                    except Exception as e:
+                        print(f"[gateway] error during cleanup: {e}", file=sys.stderr)
+
+    gateway = FastAPI(title="MCP gateway", lifespan=lifespan)
+    for name, manager in managers.items():
+        gateway.router.add_route(f"/{name}/mcp", _MCPEndpoint(manager), methods=["GET", "POST", "DELETE"])
+
+    @gateway.get("/health")
+    async def health():
+        servers = mcp_server_status()
+        ready = all(s["state"] == READY for s in servers.values())
+        return {"status": "ok" if ready else "starting", "servers": servers}
+
+    @gateway.get("/stats")
+    async def stats():
+        supervisor = gateway.state.mcp_supervisor
+        return {
+            "mcp_pools": mcp_pool_stats(),
+            "mcp_cache": mcp_cache_stats(),
+            "mcp_supervisor": supervisor.stats() if supervisor else None,
+        }
+
+    @gateway.get("/metrics")
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return gateway
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared MCP gateway for multi-worker deployments")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
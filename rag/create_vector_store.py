@@ -1,8 +1,9 @@
 import os
-import time
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from ingest import poll_with_backoff
+
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
@@ -21,7 +22,11 @@ def create_vector_store(store_name: str, file_id: str) -> None:
     )
     print(result)
 
-    time.sleep(8)  # wait a moment for processing
+    # wait for processing instead of a fixed sleep
+    poll_with_backoff(
+        lambda: client.vector_stores.files.retrieve(file_id=file_id, vector_store_id=vector_store.id),
+        lambda f: f.status != "in_progress",
+    )
     result = client.vector_stores.files.list(
         vector_store_id=vector_store.id
     )
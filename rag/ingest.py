@@ -0,0 +1,277 @@
+"""Sync a directory of documents into an OpenAI vector store.
+
+Replaces the manual upload_file.py -> create_vector_store.py steps:
+    uv run python rag/ingest.py --dir rag                       # create a new store, upload everything
+    uv run python rag/ingest.py --dir rag --vector-store vs_... # later runs: only new/changed files
+Unchanged files are skipped using a content-hash manifest (<dir>/.ingest_manifest.json).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Document types synced by default (all accepted by the OpenAI file search tool)
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md", ".docx", ".doc", ".pptx", ".html", ".json", ".tex"}
+# Source code is accepted by file search too, but only synced when asked for with --include
+# (the default directory rag/ holds this script and the other upload helpers)
+SOURCE_SUFFIXES = {".c", ".cpp", ".cs", ".css", ".go", ".java", ".js", ".php", ".py", ".rb", ".sh", ".ts"}
+MANIFEST_NAME = ".ingest_manifest.json"
+BATCH_SIZE = 100  # file ids per file_batches.create call (API maximum is 500)
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def poll_with_backoff(
+    check: Callable[[], Any],
+    done: Callable[[Any], bool],
+    initial: float = 0.5,
+    maximum: float = 10.0,
+    timeout: float = 600.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    """Call check() until done(result); waits grow exponentially (with jitter) up to `maximum`."""
+    deadline = time.monotonic() + timeout
+    delay = initial
+    while True:
+        result = check()
+        if done(result):
+            return result
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError("processing did not finish in time")
+        sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, maximum)
+
+
+class Ingestor:
+    """Uploads new/changed files concurrently, attaches them in batches and waits for processing.
+
+    `client` is anything with the OpenAI client's `files` and `vector_stores` API surface,
+    so the pipeline can run against a local fake.
+    """
+
+    def __init__(
+        self,
+        client,
+        directory: Path,
+        vector_store_id: Optional[str] = None,
+        store_name: str = "Integration Project BioMed IoT App Concept",
+        workers: int = 4,
+        manifest_path: Optional[Path] = None,
+        prune: bool = False,
+        poll_timeout: float = 600.0,
+        sleep: Callable[[float], None] = time.sleep,
+        suffixes: Optional[Iterable[str]] = None,
+    ):
+        self.client = client
+        self.directory = Path(directory)
+        self.vector_store_id = vector_store_id
+        self.store_name = store_name
+        self.workers = max(1, workers)
+        self.manifest_path = manifest_path or self.directory / MANIFEST_NAME
+        self.prune = prune
+        self.poll_timeout = poll_timeout
+        self.sleep = sleep
+        self.suffixes = {x.lower() for x in suffixes} if suffixes is not None else set(SUPPORTED_SUFFIXES)
+        self.manifest: Dict[str, Any] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if self.manifest_path.exists():
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        return {"vector_store_id": None, "files": {}}
+
+    def _save_manifest(self) -> None:
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def scan(self) -> Dict[str, Path]:
+        """Relative path -> file for every document with one of `suffixes` in the directory (recursive)."""
+        return {
+            p.relative_to(self.directory).as_posix(): p
+            for p in sorted(self.directory.rglob("*"))
+            if p.is_file() and p.suffix.lower() in self.suffixes and not p.name.startswith(".")
+            and not any(part.startswith(".") for part in p.relative_to(self.directory).parts)
+        }
+
+    def _ensure_store(self) -> str:
+        store_id = self.vector_store_id or self.manifest.get("vector_store_id")
+        if not store_id:
+            store_id = self.client.vector_stores.create(name=self.store_name).id
+            print(f"[ingest] created vector store {store_id}")
+        if self.manifest.get("vector_store_id") not in (None, store_id):
+            # Different store than last time: everything has to be attached again
+            self.manifest["files"] = {}
+        self.manifest["vector_store_id"] = store_id
+        self.vector_store_id = store_id
+        return store_id
+
+    def _upload(self, rel: str, path: Path) -> str:
+        with open(path, "rb") as f:
+            return self.client.files.create(file=(path.name, f), purpose="assistants").id
+
+    def _attach(self, store_id: str, file_ids: List[str]) -> Iterator[Tuple[List[str], Dict[str, Any]]]:
+        """Attach in batches; yields each batch's file ids and counts once its processing ended."""
+        for start in range(0, len(file_ids), BATCH_SIZE):
+            ids = file_ids[start:start + BATCH_SIZE]
+            batch = self.client.vector_stores.file_batches.create(vector_store_id=store_id, file_ids=ids)
+            batch = poll_with_backoff(
+                lambda: self.client.vector_stores.file_batches.retrieve(batch_id=batch.id, vector_store_id=store_id),
+                lambda b: b.status != "in_progress",
+                timeout=self.poll_timeout,
+                sleep=self.sleep,
+            )
+            counts: Dict[str, Any] = {key: getattr(batch.file_counts, key, 0) for key in ("completed", "failed", "cancelled")}
+            counts["failed_ids"] = self._failed_ids(store_id, batch.id) if batch.file_counts.failed else []
+            print(f"[ingest] batch {batch.id}: {batch.status} ({batch.file_counts.completed}/{batch.file_counts.total} completed)")
+            yield ids, counts
+
+    def _failed_ids(self, store_id: str, batch_id: str) -> List[str]:
+        """Ids of the batch's failed files, following the list cursor over all pages."""
+        ids: List[str] = []
+        after: Optional[str] = None
+        while True:
+            page = self.client.vector_stores.file_batches.list_files(
+                batch_id=batch_id, vector_store_id=store_id, filter="failed", limit=100,
+                **({"after": after} if after else {}),
+            )
+            ids.extend(f.id for f in page.data)
+            if not page.data or not getattr(page, "has_more", False):
+                return ids
+            after = page.data[-1].id
+
+    def _detach(self, store_id: str, file_id: str) -> None:
+        """Remove a file from the store and delete it (either may already be gone)."""
+        try:
+            self.client.vector_stores.files.delete(file_id=file_id, vector_store_id=store_id)
+        except Exception as e:
+            print(f"[ingest] could not detach {file_id}: {e}", file=sys.stderr)
+        try:
+            self.client.files.delete(file_id=file_id)
+        except Exception as e:
+            print(f"[ingest] could not delete {file_id}: {e}", file=sys.stderr)
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        store_id = self._ensure_store()
+        files = self.scan()
+        known: Dict[str, Any] = self.manifest["files"]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            hashes = dict(zip(files, pool.map(sha256_file, files.values())))
+            changed = {rel: path for rel, path in files.items() if known.get(rel, {}).get("sha256") != hashes[rel]}
+            print(f"[ingest] {len(files)} files, {len(changed)} new or changed, {len(files) - len(changed)} unchanged")
+
+            uploaded: Dict[str, str] = {}
+            errors: Dict[str, str] = {}
+            futures = {pool.submit(self._upload, rel, path): rel for rel, path in changed.items()}
+            for future in as_completed(futures):
+                rel = futures[future]
+                try:
+                    uploaded[rel] = future.result()
+                    print(f"[ingest] uploaded {rel} -> {uploaded[rel]}")
+                except Exception as e:
+                    errors[rel] = str(e)
+                    print(f"[ingest] upload failed for {rel}: {e}", file=sys.stderr)
+
+        counts: Dict[str, Any] = {"completed": 0, "failed": 0, "cancelled": 0, "failed_ids": []}
+        rels = {file_id: rel for rel, file_id in uploaded.items()}
+        pending = dict(uploaded)  # uploads not recorded yet
+        try:
+            for ids, batch in self._attach(store_id, list(uploaded.values())):
+                for key in ("completed", "failed", "cancelled"):
+                    counts[key] += batch[key]
+                counts["failed_ids"] += batch["failed_ids"]
+                failed = set(batch["failed_ids"])
+                # Record new versions, then drop the versions they replace. Files that failed
+                # processing are removed and stay out of the manifest, so the next run retries them.
+                for file_id in ids:
+                    rel = rels[file_id]
+                    del pending[rel]
+                    if file_id in failed:
+                        errors[rel] = "processing failed"
+                        self._detach(store_id, file_id)
+                        continue
+                    old = known.get(rel, {}).get("file_id")
+                    known[rel] = {"sha256": hashes[rel], "file_id": file_id, "size": files[rel].stat().st_size, "synced_at": time.time()}
+                    if old and old != file_id:
+                        self._detach(store_id, old)
+                self._save_manifest()  # batches done so far survive a later failure
+        finally:
+            # Uploads whose batch never finished (API error, timeout) would be orphaned: remove them
+            for rel, file_id in pending.items():
+                errors.setdefault(rel, "not attached")
+                self._detach(store_id, file_id)
+            self._save_manifest()
+
+        removed = [rel for rel in known if rel not in files]
+        if self.prune:
+            for rel in removed:
+                self._detach(store_id, known.pop(rel)["file_id"])
+        self._save_manifest()
+
+        summary = {
+            "vector_store_id": store_id,
+            "files": len(files),
+            "uploaded": len(uploaded),
+            "skipped_unchanged": len(files) - len(changed),
+            "upload_errors": errors,
+            "processing": counts,
+            "removed": removed if self.prune else [],
+            "missing_not_pruned": [] if self.prune else removed,
+            "elapsed_s": round(time.perf_counter() - start, 2),
+        }
+        return summary
+
+
+def _suffixes(raw: str) -> Set[str]:
+    """--include value ("py, .js") -> {".py", ".js"}"""
+    return {("." + x.strip().lstrip(".")).lower() for x in raw.split(",") if x.strip()}
+
+
+def main():
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    parser = argparse.ArgumentParser(description="Sync a directory of documents into an OpenAI vector store")
+    parser.add_argument("--dir", default=str(Path(__file__).parent), help="directory to sync (default: rag/)")
+    parser.add_argument("--vector-store", default=None, help="existing vector store id (default: from manifest or create one)")
+    parser.add_argument("--name", default="Integration Project BioMed IoT App Concept", help="name for a new vector store")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent uploads")
+    parser.add_argument("--prune", action="store_true", help="remove files from the store that were deleted locally")
+    parser.add_argument("--timeout", type=float, default=600.0, help="max seconds to wait for processing")
+    parser.add_argument(
+        "--include", default="",
+        help="extra comma-separated suffixes to sync, e.g. .py,.js (source code is skipped by default)",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("Missing OPENAI_API_KEY. Put it in a .env file or the environment.")
+    ingestor = Ingestor(
+        OpenAI(),
+        Path(args.dir),
+        vector_store_id=args.vector_store or os.getenv("OPENAI_VECTOR_STORE_ID"),
+        store_name=args.name,
+        workers=args.workers,
+        prune=args.prune,
+        poll_timeout=args.timeout,
+        suffixes=SUPPORTED_SUFFIXES | _suffixes(args.include),
+    )
+    print(json.dumps(ingestor.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
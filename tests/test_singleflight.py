@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+
+from app.deadlines import Deadline, DeadlineExceeded
+from app.singleflight import SingleFlight
+
+
+async def request(flights: SingleFlight, deadline: Deadline, fn):
+    """Like the /chat handler: the request's own deadline cancels its wait for the shared run."""
+    task = asyncio.current_task()
+    deadline.arm(task.cancel)
+    try:
+        return await flights.do("key", fn, deadline)
+    finally:
+        deadline.disarm()
+
+
+class CoalescedDeadlineTest(unittest.IsolatedAsyncioTestCase):
+    async def test_follower_outlives_leader_timeout(self):
+        flights = SingleFlight()
+        runs = []
+
+        async def fn(run_deadline):
+            runs.append(run_deadline)
+            await asyncio.sleep(0.4)
+            return "answer"
+
+        leader = asyncio.create_task(request(flights, Deadline(0.1, {}), fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(request(flights, Deadline(2, {}), fn))
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(await follower, ("answer", True))
+        self.assertEqual(len(runs), 1)
+        self.assertGreater(runs[0].seconds, 1.5)  # extended to the follower's deadline
+        self.assertEqual(flights.abandoned, 0)
+
+    async def test_budget_applies_after_leader_left(self):
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fn(run_deadline):
+            run_deadline.enter("tool", "tool")  # what DeadlineHooks does when a tool starts
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        leader = asyncio.create_task(request(flights, Deadline(0.1, {"tool": 0.5}), fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(request(flights, Deadline(10, {"tool": 0.5}), fn))
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        with self.assertRaises(DeadlineExceeded) as raised:
+            await asyncio.wait_for(follower, 2)
+        self.assertEqual(raised.exception.reason, "tool_budget")
+        self.assertTrue(cancelled.is_set())
+
+    async def test_run_cancelled_when_last_waiter_leaves(self):
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fn(run_deadline):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        leader = asyncio.create_task(request(flights, Deadline(0.1, {}), fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(request(flights, Deadline(0.2, {}), fn))
+        for task in (leader, follower):
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        await asyncio.sleep(0)
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(flights.abandoned, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from app.sqlite_native import NativeSQLiteServer
+
+# Counts to a large number in SQL; runs for minutes unless interrupted
+LONG_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+
+class ReadCancelTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.server = NativeSQLiteServer(Path(self.dir.name) / "t.db", readers=1, query_timeout=60)
+        await self.server.connect()
+
+    async def asyncTearDown(self):
+        await self.server.cleanup()
+        self.dir.cleanup()
+
+    async def test_connection_not_reused_before_thread_returns(self):
+        release = threading.Event()
+        busy = threading.Event()
+
+        def work(conn):
+            busy.set()
+            release.wait(5)  # not a query, so conn.interrupt() can't end it early
+            return conn.execute("SELECT 1").fetchone()
+
+        task = asyncio.create_task(self.server._read(work))
+        await asyncio.to_thread(busy.wait, 5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.server._idle.qsize(), 0)
+
+        second = asyncio.create_task(self.server.ping())
+        await asyncio.sleep(0.1)
+        self.assertFalse(second.done())  # waits for the only connection
+        release.set()
+        await asyncio.wait_for(second, 5)
+        self.assertEqual(self.server._idle.qsize(), 1)
+
+    async def test_cancel_interrupts_query(self):
+        task = asyncio.create_task(self.server.call_tool("read_query", {"query": LONG_QUERY}))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        start = time.monotonic()
+        await asyncio.wait_for(self.server.ping(), 5)
+        self.assertLess(time.monotonic() - start, 5)
+
+
+class WriteQueryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.server = NativeSQLiteServer(Path(self.dir.name) / "t.db", readers=1)
+        await self.server.connect()
+        await self.server.call_tool("create_table", {"query": "CREATE TABLE t (a TEXT)"})
+
+    async def asyncTearDown(self):
+        await self.server.cleanup()
+        self.dir.cleanup()
+
+    async def write(self, query):
+        return await self.server.call_tool("write_query", {"query": query})
+
+    async def test_rejects_other_statements(self):
+        for query in (
+            "DROP TABLE t",
+            "PRAGMA journal_mode=DELETE",
+            "ATTACH DATABASE 'x.db' AS x",
+            "WITH c AS (SELECT 1) SELECT * FROM c",
+            "  -- comment\n /* block */ DROP TABLE t",
+            "INSERT INTO t VALUES ('a'); DROP TABLE t",
+            "SELECT * FROM t",
+        ):
+            with self.subTest(query=query):
+                self.assertTrue((await self.write(query)).isError)
+        tables = await self.server.call_tool("list_tables", {})
+        self.assertIn('"t"', tables.content[0].text)
+
+    async def test_accepts_writes(self):
+        for query in (
+            "INSERT INTO t VALUES ('a;b');",
+            "-- note\n  update t SET a = 'c' WHERE a = 'a;b' -- trailing",
+            "/* x */ DELETE FROM t",
+        ):
+            with self.subTest(query=query):
+                self.assertFalse((await self.write(query)).isError)
+
+
+if __name__ == "__main__":
+    unittest.main()